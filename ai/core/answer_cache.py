@@ -0,0 +1,72 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from config import AI_ANSWER_CACHE_SIZE
+
+# 问题首尾的标点和语气词不影响答案
+_EDGE_PUNCTUATION = re.compile(r'^[\s,.!?;:，。！？；：、~～]+|[\s,.!?;:，。！？；：、~～呢呀啊吗]+$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_question(question: str) -> str:
+    """归一化问题：去掉首尾标点和语气词、全部空白，英文转小写"""
+    question = _EDGE_PUNCTUATION.sub('', question.strip())
+    return _WHITESPACE.sub('', question).lower()
+
+
+class AnswerCache:
+    """
+    AI分析回答的内存缓存
+    缓存键为(归一化的问题, 当天日期, 账本版本)，账本有新交易或跨天后旧的回答自然不再命中，
+    超过容量时淘汰最久未使用的回答
+    """
+
+    def __init__(self, max_entries: int = AI_ANSWER_CACHE_SIZE):
+        """
+        Args:
+            max_entries: 最多缓存的回答数，为0时不缓存
+        """
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[Tuple[str, str, Hashable], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hit": 0, "miss": 0, "evicted": 0}
+
+    @staticmethod
+    def build_key(question: str, day: str, version: Hashable) -> Tuple[str, str, Hashable]:
+        return normalize_question(question), day, version
+
+    def get(self, question: str, day: str, version: Hashable) -> Optional[str]:
+        """读取缓存的回答，未命中时返回None"""
+        key = self.build_key(question, day, version)
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is None:
+                self._counters["miss"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hit"] += 1
+            return answer
+
+    def put(self, question: str, day: str, version: Hashable, answer: str) -> None:
+        """缓存回答，空回答不缓存"""
+        if not self.max_entries or not answer:
+            return
+        key = self.build_key(question, day, version)
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evicted"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = dict(self._counters)
+            result["size"] = len(self._entries)
+        return result
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
 
 from openai.types.chat import ChatCompletion
 
@@ -8,12 +8,20 @@ from ai.core.config import AIConfig
 
 class AIResponse:
     """AI响应的统一封装类"""
-    def __init__(self, content: str, raw_response: Any = None):
+    def __init__(self, content: str, raw_response: Any = None, usage: Optional[Dict[str, int]] = None,
+                 complete: bool = True):
         self.content = content
         self.raw_response = raw_response
+        # token用量，例如{"input_tokens": 100, "output_tokens": 20}，服务不提供时为None
+        self.usage = usage
+        # 是否为完整的回答，例如工具调用达到轮数上限时为False，不完整的回答不应缓存
+        self.complete = complete
 
 class AIService(ABC):
     """AI服务的抽象基类"""
+    # 服务商名称，用于统计
+    name: str = "unknown"
+
     @abstractmethod
     def chat(self, content: str, sys_prompt: str = AIConfig.get_system_prompt(), json_format: bool = True, **kwargs) -> AIResponse:
         pass
@@ -24,4 +32,38 @@ class AIService(ABC):
 
     @abstractmethod
     def get_response(self, messages) -> ChatCompletion:
-        pass
\ No newline at end of file
+        pass
+
+    def stream_chat(self, content: str, on_text: Callable[[str], Any], sys_prompt: str = AIConfig.get_system_prompt(),
+                    json_format: bool = False, **kwargs) -> AIResponse:
+        """
+        流式对话，生成的文本片段依次传给on_text，并记录该服务商的首字耗时和总耗时
+
+        Args:
+            content: 内容
+            on_text: 接收文本片段的回调，例如StreamFlusher.feed
+            sys_prompt: 系统提示词
+            json_format: 是否输出JSON格式
+        Returns:
+            AIResponse: 完整的响应
+        """
+        from ai.core.stream import StreamTimer
+
+        timer = StreamTimer(self.name)
+
+        def emit(text: str) -> None:
+            if text:
+                timer.mark()
+                on_text(text)
+
+        try:
+            return self._stream(content, emit, sys_prompt, json_format, **kwargs)
+        finally:
+            timer.finish()
+
+    def _stream(self, content: str, on_text: Callable[[str], Any], sys_prompt: str, json_format: bool,
+                **kwargs) -> AIResponse:
+        """流式调用的具体实现，默认等待完整响应后一次性回调，支持流式的服务应重写"""
+        response = self.chat(content, sys_prompt, json_format, **kwargs)
+        on_text(response.content)
+        return response
@@ -0,0 +1,46 @@
+import hashlib
+import re
+from typing import Optional
+
+from ai.core.config import AIConfig
+
+_BETWEEN_TAGS = re.compile(r'>\s+<')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_content(content: str) -> str:
+    """归一化XML内容：去掉标签之间的空白，合并连续空白"""
+    content = _BETWEEN_TAGS.sub('><', content.strip())
+    return _WHITESPACE.sub(' ', content)
+
+
+class AIResponseCache:
+    """大模型返回结果的持久化缓存，按归一化内容和系统提示词版本生成缓存键"""
+
+    def __init__(self, service=None):
+        if service is None:
+            from db.services import LLMCacheService
+            service = LLMCacheService()
+        self.service = service
+
+    @staticmethod
+    def build_key(content: str, sys_prompt: str, json_format: bool = True) -> str:
+        version = AIConfig.get_prompt_version(sys_prompt)
+        raw = f'{version}|{int(json_format)}|{normalize_content(content)}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, content: str, sys_prompt: str, json_format: bool = True) -> Optional[str]:
+        """读取缓存，缓存异常时按未命中处理"""
+        try:
+            return self.service.get_content(self.build_key(content, sys_prompt, json_format))
+        except Exception as e:
+            print(f"读取AI缓存失败: {str(e)}")
+            return None
+
+    def put(self, content: str, sys_prompt: str, response: str, json_format: bool = True) -> None:
+        """写入缓存，缓存异常不影响主流程"""
+        try:
+            self.service.put(self.build_key(content, sys_prompt, json_format),
+                             AIConfig.get_prompt_version(sys_prompt), response)
+        except Exception as e:
+            print(f"写入AI缓存失败: {str(e)}")
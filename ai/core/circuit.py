@@ -0,0 +1,85 @@
+import threading
+import time
+from typing import Any, Dict
+
+from config import AI_BREAKER_FAILURES, AI_BREAKER_COOLDOWN
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    连续失败failure_threshold次后熔断，熔断期间直接跳过该服务；
+    冷却cooldown秒后进入半开状态，只放行一个探测请求，成功则恢复，失败则重新熔断
+    """
+
+    def __init__(self, name: str, failure_threshold: int = AI_BREAKER_FAILURES, cooldown: float = AI_BREAKER_COOLDOWN):
+        """
+        Args:
+            name: 名称，用于日志
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断后多少秒进入半开状态
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._counters = {"success": 0, "failure": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = STATE_HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self) -> bool:
+        """是否允许发起请求，半开状态下同一时间只允许一个探测请求"""
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._counters["success"] += 1
+            if self._state != STATE_CLOSED:
+                print(f"{self.name} 已恢复")
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._counters["failure"] += 1
+            self._failures += 1
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != STATE_OPEN:
+                    self._counters["opened"] += 1
+                    print(f"{self.name} 连续失败{self._failures}次，熔断{self.cooldown}秒")
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = dict(self._counters)
+            result["state"] = self._current_state()
+            result["consecutive_failures"] = self._failures
+        return result
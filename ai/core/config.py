@@ -1,3 +1,4 @@
+import hashlib
 import os
 from typing import Optional
 
@@ -16,6 +17,11 @@ class AIConfig:
     def get_deepseek_api_key() -> Optional[str]:
         return AIConfig.get_api_key("DEEPSEEK_API_KEY")
 
+    @staticmethod
+    def get_prompt_version(sys_prompt: str) -> str:
+        """系统提示词版本，提示词内容变化后版本随之变化"""
+        return hashlib.sha1(sys_prompt.encode('utf-8')).hexdigest()[:12]
+
     @staticmethod
     def get_system_prompt() -> str:
         system_prompt = '''
@@ -44,4 +50,35 @@ class AIConfig:
           "remark": " "
         }
         '''
-        return system_prompt
\ No newline at end of file
+        return system_prompt
+    @staticmethod
+    def get_batch_system_prompt() -> str:
+        """批量解析的系统提示词，解析规则与单条解析相同，一次返回所有消息的结果"""
+        system_prompt = '''
+        你是一名XML智能解析机器人,用户会一次上传多段XML内容,每段用<item index="序号">和</item>包裹,请你逐段按照如下要求去解析
+        1.解析出XML里面的，发布者，标题，交易时间，交易金额，交易类型，备注附言等（如有）
+        2.交易类型只有支出和收入两种，如果解析出这两种以外的类型，请你判断属于支出还是收入
+            -1.存入，汇入等都属于收入
+            -2.划扣，存出等都属于支出
+        3.每段的结果都要带上该段的index，各段之间互不影响，某一段无法解析时只返回它的index
+        4.按照JSON的格式进行输出，所有结果放在results数组中，我只需要最终的结果，不需要中间的过程
+
+        输出示例：
+        {
+          "results": [
+            {
+              "index": 0,
+              "标题": "xxx",
+              "amount": 199,
+              "transaction_time": "2025-01-28 13:23:08",
+              "publisher": "交通银行",
+              "type": "支出",
+              "remark": "网上支付 财付通 中铁网络"
+            },
+            {
+              "index": 1
+            }
+          ]
+        }
+        '''
+        return system_prompt
@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 列之间的分隔符，单元格内出现时替换为全角竖线
+COLUMN_SEPARATOR = "|"
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    text = str(value)
+    return text.replace(COLUMN_SEPARATOR, "｜").replace("\r", " ").replace("\n", " ").strip()
+
+
+def _short_dates(values: List[str]) -> Tuple[List[str], Optional[str]]:
+    """
+    缩短'YYYY-MM-DD HH:MM:SS'格式的时间：去掉秒，所有记录同一年时再去掉年份
+
+    Args:
+        values: 时间字符串列表
+    Returns:
+        Tuple[List[str], Optional[str]]: (缩短后的时间, 去掉的年份)，格式不符时原样返回且年份为None
+    """
+    if not values or not all(len(v) >= 16 and v[4] == '-' and v[10] == ' ' for v in values):
+        return values, None
+    years = {v[:4] for v in values}
+    if len(years) == 1:
+        return [v[5:16] for v in values], years.pop()
+    return [v[:16] for v in values], None
+
+
+def encode_table(records: Sequence[Dict[str, Any]], columns: Sequence[str] = None, date_column: str = "date") -> str:
+    """
+    把字典列表编码为紧凑的列式文本，表头只出现一次，之后每行一条记录，不重复键名
+
+    示例:
+        year=2025
+        date|type|amount|remark
+        03-01 10:00|支出|12.50|美团外卖
+
+    Args:
+        records: 记录列表
+        columns: 输出的列，不传则使用第一条记录的键
+        date_column: 需要缩短的时间列
+    Returns:
+        str: 编码后的文本，没有记录时返回"(无数据)"
+    """
+    if not records:
+        return "(无数据)"
+    if len(records) == 1 and set(records[0]) == {"error"}:
+        return f"error: {records[0]['error']}"
+    columns = list(columns or records[0].keys())
+    table = [[_cell(record.get(column)) for record in records] for column in columns]
+    lines = []
+    if date_column in columns:
+        index = columns.index(date_column)
+        table[index], year = _short_dates(table[index])
+        if year:
+            lines.append(f"year={year}")
+    lines.append(COLUMN_SEPARATOR.join(columns))
+    lines.extend(COLUMN_SEPARATOR.join(row) for row in zip(*table))
+    return "\n".join(lines)
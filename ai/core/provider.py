@@ -3,8 +3,12 @@ from enum import Enum
 class AIProvider(Enum):
     """AI服务提供商枚举"""
     DEEPSEEK = "deepseek"
+    CLAUDE = "claude"
     
     @classmethod
     def get_priority_list(cls) -> list['AIProvider']:
-        """获取优先级排序的提供商列表"""
+        """
+        获取解析银行消息时按优先级排序的提供商列表
+        Claude只用于@AI对话：它的对话接口总是带着数据查询工具，也不支持JSON输出，不能作为解析的备选
+        """
         return [cls.DEEPSEEK]  # 按优先级排序
\ No newline at end of file
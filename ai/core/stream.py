@@ -0,0 +1,129 @@
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from config import AI_STREAM_FLUSH_CHARS, AI_STREAM_MAX_BYTES
+from util.metrics import metrics
+from util.stats import StageStats
+
+# 句子结束的位置，流式输出在这些字符之后分段发送
+SENTENCE_ENDINGS = "。！？!?；;\n"
+
+
+class StreamFlusher:
+    """
+    流式输出的分段发送器
+    累积模型生成的文本片段，在句子边界且已累积足够的字数时发送一次，超过最大字节数时强制发送
+    """
+
+    def __init__(self, sink: Callable[[str], Any],
+                 flush_chars: int = AI_STREAM_FLUSH_CHARS,
+                 max_bytes: int = AI_STREAM_MAX_BYTES):
+        """
+        Args:
+            sink: 发送一段文本的函数，例如FinBot.send_text_msg或发送飞书消息
+            flush_chars: 至少累积多少个字符才在句子边界发送
+            max_bytes: 单次发送的最大字节数（UTF-8）
+        """
+        self.sink = sink
+        self.flush_chars = max(1, flush_chars)
+        self.max_bytes = max(4, max_bytes)
+        self._buffer = ""
+        self.sent = 0
+
+    def feed(self, text: str) -> None:
+        """追加生成的文本片段，满足条件时发送"""
+        self._buffer += text
+        while len(self._buffer.encode("utf-8")) > self.max_bytes:
+            cut = self._cut_at_bytes(self._buffer, self.max_bytes)
+            self._emit(self._buffer[:cut])
+            self._buffer = self._buffer[cut:]
+        if len(self._buffer) < self.flush_chars:
+            return
+        end = max(self._buffer.rfind(ch) for ch in SENTENCE_ENDINGS)
+        if end + 1 >= self.flush_chars:
+            self._emit(self._buffer[:end + 1])
+            self._buffer = self._buffer[end + 1:]
+
+    def close(self) -> None:
+        """发送剩余的文本"""
+        if self._buffer.strip():
+            self._emit(self._buffer)
+        self._buffer = ""
+
+    def _emit(self, text: str) -> None:
+        text = text.strip()
+        if text:
+            self.sink(text)
+            self.sent += 1
+
+    @staticmethod
+    def _cut_at_bytes(text: str, max_bytes: int) -> int:
+        """不超过max_bytes字节的最长前缀的字符数，优先在句子边界切分"""
+        size = 0
+        cut = 0
+        for i, ch in enumerate(text):
+            size += len(ch.encode("utf-8"))
+            if size > max_bytes:
+                break
+            cut = i + 1
+        prefix = text[:cut]
+        end = max(prefix.rfind(ch) for ch in SENTENCE_ENDINGS)
+        return end + 1 if end > 0 else max(cut, 1)
+
+
+class StreamMetrics:
+    """按服务商统计流式响应的首字耗时和总耗时"""
+    _lock = threading.Lock()
+    _ttft: Dict[str, StageStats] = {}
+    _total: Dict[str, StageStats] = {}
+
+    @classmethod
+    def record(cls, provider: str, ttft: float, total: float) -> None:
+        """
+        记录一次流式响应
+
+        Args:
+            provider: 服务商名称
+            ttft: 首个文本片段的耗时（秒），没有输出时为None
+            total: 总耗时（秒）
+        """
+        with cls._lock:
+            if ttft is not None:
+                cls._ttft.setdefault(provider, StageStats()).record(ttft)
+            cls._total.setdefault(provider, StageStats()).record(total)
+        if ttft is not None:
+            metrics.observe("ai_stream_ttft_seconds", ttft, "流式响应首字耗时", provider=provider)
+        metrics.observe("ai_stream_seconds", total, "流式响应总耗时", provider=provider)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, dict]]:
+        """各服务商的首字耗时(ttft)和总耗时(total)"""
+        with cls._lock:
+            return {
+                provider: {
+                    "ttft": cls._ttft[provider].to_dict() if provider in cls._ttft else StageStats().to_dict(),
+                    "total": total.to_dict(),
+                }
+                for provider, total in cls._total.items()
+            }
+
+
+class StreamTimer:
+    """记录单次流式调用的首字时间和总耗时"""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.started = time.perf_counter()
+        self.ttft = None
+
+    def mark(self) -> None:
+        """收到文本片段时调用，只记录第一次"""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def finish(self) -> None:
+        total = time.perf_counter() - self.started
+        StreamMetrics.record(self.provider, self.ttft, total)
+        ttft_ms = round(self.ttft * 1000) if self.ttft is not None else None
+        print(f'{self.provider} stream: ttft_ms={ttft_ms}, total_ms={round(total * 1000)}')
@@ -1,14 +1,20 @@
+import time
+
 import anthropic
 from openai.types.chat import ChatCompletion
 from typing import Dict, Any, Callable, List
 
 from ai.core.base import AIService, AIResponse
 from ai.core.config import AIConfig
-from config import CLAUDE
+from ai.core.encoding import encode_table
+from config import CLAUDE, CLAUDE_MAX_TOOL_ROUNDS
 from util import date_util
 
+CLAUDE_MODEL = "claude-3-7-sonnet-20250219"
+
 
 class ClaudeService(AIService):
+    name = "claude"
 
     def __init__(self):
         self.api_key = CLAUDE
@@ -26,11 +32,20 @@ class ClaudeService(AIService):
         self.tool_callbacks[tool_name] = {'method': callback, 'params': params}
 
     def chat(self, query: str, sys_prompt: str = AIConfig.get_system_prompt(), json_format: bool = True,
-             **kwargs) -> AIResponse:
+             on_text: Callable[[str], Any] = None, **kwargs) -> AIResponse:
+        """
+        对话，模型请求工具时调用注册的回调函数，最多CLAUDE_MAX_TOOL_ROUNDS轮
+
+        参数:
+            query (str): 问题
+            sys_prompt (str): 系统提示词
+            on_text (Callable, optional): 传入时以流式方式调用，生成的文本片段依次传给该函数
+        """
         tool_list = [
             {
                 "name": "get_date_transactions",
-                "description": "获取指定范围内的交易数据",
+                "description": "获取指定范围内的交易数据。结果为紧凑表格：可能以year=年份开头（此时时间省略了年份），"
+                               "之后第一行为表头date|type|amount|remark，其余每行一笔交易",
                 "input_schema": {
                     "type": "object",
                     "properties": {
@@ -50,50 +65,85 @@ class ClaudeService(AIService):
         print(f'query: {query}')
         # You have access to tools, but only use them when necessary. If a tool is not required, respond as normal
         messages = [{"role": "user", "content": query}]
-        response = self.client.messages.create(
-            model="claude-3-7-sonnet-20250219",
-            max_tokens=1024,
-            tools=tool_list,
-            system=sys_prompt,
-            messages=messages
-        )
-        if response.stop_reason == "tool_use":
+        usage = {"input_tokens": 0, "output_tokens": 0, "rounds": 0}
+        started = time.perf_counter()
+        response = None
+        # 每一轮的文本都已经流式发给了用户（包括调用工具前的说明），完整回答需要包含所有轮次
+        texts = []
+        for round_no in range(CLAUDE_MAX_TOOL_ROUNDS + 1):
+            response = self._create(on_text,
+                model=CLAUDE_MODEL,
+                max_tokens=kwargs.get("max_tokens", 1024),
+                tools=tool_list,
+                system=sys_prompt,
+                messages=messages
+            )
+            usage["rounds"] += 1
+            usage["input_tokens"] += response.usage.input_tokens
+            usage["output_tokens"] += response.usage.output_tokens
+            print(f'round {usage["rounds"]}: input_tokens={response.usage.input_tokens}, '
+                  f'output_tokens={response.usage.output_tokens}, stop_reason={response.stop_reason}')
+            texts.extend(block.text for block in response.content if block.type == "text")
+            if response.stop_reason != "tool_use":
+                break
+            if round_no == CLAUDE_MAX_TOOL_ROUNDS:
+                print(f'工具调用已达到{CLAUDE_MAX_TOOL_ROUNDS}轮上限')
+                break
             messages.append({"role": "assistant", "content": response.content})
-            tool_use = response.content[-1]
-            tool_name = tool_use.name
-            tool_input = tool_use.input
-            print(f'tool_name: {tool_name}, tool_input: {tool_input}')
-            
-            # 调用相应的回调函数处理工具请求
-            if tool_name in self.tool_callbacks:
-                func = self.tool_callbacks[tool_name]['method']
-                params = self.tool_callbacks[tool_name]['params']
-                p_dict = {}
-                for p in params:
-                    p_dict[p] = tool_input[p]
-                result = func(**p_dict)
-                too_response = {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": tool_use.id,
-                            "content": f'交易数据如下: {result}'
-                        }
-                    ]
-                }
-                messages.append(too_response)
-                response = self.client.messages.create(
-                    model="claude-3-7-sonnet-20250219",
-                    max_tokens=1024,
-                    tools=tool_list,
-                    system=sys_prompt,
-                    messages=messages
-                )
-            return AIResponse(content=response.content[0].text, raw_response=response)
+            # 一次回复中可能有多个tool_use，需要逐个返回结果
+            messages.append({
+                "role": "user",
+                "content": [self._run_tool(block) for block in response.content if block.type == "tool_use"]
+            })
+
+        usage["elapsed_ms"] = round((time.perf_counter() - started) * 1000)
+        print(f'claude usage: {usage}')
+        complete = response.stop_reason != "tool_use"
+        if not complete:
+            # 达到轮数上限时模型还在请求工具，没有给出结论
+            fallback = "问题涉及的数据较多，请把问题拆分后再试"
+            if on_text is not None:
+                on_text(fallback)
+            texts.append(fallback)
+        return AIResponse(content="".join(texts), raw_response=response, usage=usage, complete=complete)
+
+    def _create(self, on_text: Callable[[str], Any] = None, **params):
+        """调用接口，传入on_text时流式读取文本片段，返回完整的消息"""
+        if on_text is None:
+            return self.client.messages.create(**params)
+        with self.client.messages.stream(**params) as stream:
+            for text in stream.text_stream:
+                on_text(text)
+            return stream.get_final_message()
+
+    def _stream(self, content: str, on_text, sys_prompt: str, json_format: bool, **kwargs) -> AIResponse:
+        return self.chat(content, sys_prompt, json_format, on_text=on_text, **kwargs)
+
+    def _run_tool(self, tool_use) -> Dict[str, Any]:
+        """
+        调用注册的回调函数，结果编码为紧凑的列式文本
+
+        Args:
+            tool_use: 模型返回的tool_use块
+        Returns:
+            Dict[str, Any]: tool_result块
+        """
+        print(f'tool_name: {tool_use.name}, tool_input: {tool_use.input}')
+        callback = self.tool_callbacks.get(tool_use.name)
+        if callback is None:
+            return {"type": "tool_result", "tool_use_id": tool_use.id, "is_error": True,
+                    "content": f"未知的工具: {tool_use.name}"}
+        try:
+            result = callback['method'](**{p: tool_use.input.get(p) for p in callback['params']})
+        except Exception as e:
+            return {"type": "tool_result", "tool_use_id": tool_use.id, "is_error": True, "content": str(e)}
+        content = encode_table(result) if isinstance(result, list) else str(result)
+        print(f'tool result: {len(result) if isinstance(result, list) else 1} rows, '
+              f'{len(str(result))} chars as repr -> {len(content)} chars encoded')
+        return {"type": "tool_result", "tool_use_id": tool_use.id, "content": content}
 
     def is_available(self) -> bool:
-        pass
+        return bool(self.api_key)
 
     def get_response(self, messages) -> ChatCompletion:
         pass
@@ -10,15 +10,16 @@ from openai import OpenAI, NotGiven
 
 class DeepseekService(AIService):
     """Deepseek服务实现"""
+    name = "deepseek"
 
-    def get_response(self, messages, json_format: bool=True) -> ChatCompletion:
+    def get_response(self, messages, json_format: bool=True, stream: bool=False, max_tokens: int=1024) -> ChatCompletion:
         try:
             params = {
                 "model": "deepseek-chat",
                 "messages": messages,
-                "max_tokens": 1024,
+                "max_tokens": max_tokens,
                 "temperature": 1.0,
-                "stream": False,
+                "stream": stream,
             }
             
             if json_format:
@@ -44,10 +45,29 @@ class DeepseekService(AIService):
             {"role": "system", "content": sys_prompt},
             {"role": "user", "content": content},
         ]
-        response = self.get_response(msg, json_format=json_format)
+        response = self.get_response(msg, json_format=json_format, max_tokens=kwargs.get("max_tokens", 1024))
         return AIResponse(
             content=response.choices[0].message.content
         )
 
+    def _stream(self, content: str, on_text, sys_prompt: str, json_format: bool, **kwargs) -> AIResponse:
+        """逐个片段读取流式响应"""
+        if not self.is_available():
+            raise RuntimeError("Deepseek API key not found")
+
+        msg = [
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": content},
+        ]
+        parts = []
+        for chunk in self.get_response(msg, json_format=json_format, stream=True):
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                parts.append(text)
+                on_text(text)
+        return AIResponse(content="".join(parts))
+
     def is_available(self) -> bool:
         return bool(self.api_key)
@@ -1,14 +1,22 @@
+import threading
 from typing import Dict, Optional, Type
 from ..core.base import AIService
+from util.metrics import metrics
+from ..core.circuit import CircuitBreaker, STATE_CLOSED
 from ..core.provider import AIProvider
+from ..providers.claude_service import ClaudeService
 from ..providers.deepseek_service import DeepseekService
 
 class AIServiceFactory:
-    """AI服务工厂类"""
+    """AI服务工厂类，每个服务商只创建一个实例，复用其中的HTTP连接池"""
     _services: Dict[AIProvider, Type[AIService]] = {
         AIProvider.DEEPSEEK: DeepseekService,
+        AIProvider.CLAUDE: ClaudeService,
     }
-    
+    _instances: Dict[AIProvider, AIService] = {}
+    _breakers: Dict[AIProvider, CircuitBreaker] = {}
+    _lock = threading.Lock()
+
     @classmethod
     def get_service(cls, provider: Optional[AIProvider] = None) -> AIService:
         """
@@ -17,16 +25,51 @@ class AIServiceFactory:
         :return: AI服务实例
         """
         if provider:
-            service_class = cls._services.get(provider)
-            if not service_class:
-                raise ValueError(f"Unsupported AI provider: {provider}")
-            return service_class()
-        
+            return cls._get_instance(provider)
+
         # 如果没有指定provider，按优先级尝试
         for provider in AIProvider.get_priority_list():
-            service_class = cls._services[provider]
-            service = service_class()
+            service = cls._get_instance(provider)
             if service.is_available():
                 return service
-        
-        raise RuntimeError("No available AI service found") 
\ No newline at end of file
+
+        raise RuntimeError("No available AI service found")
+
+    @classmethod
+    def _get_instance(cls, provider: AIProvider) -> AIService:
+        service = cls._instances.get(provider)
+        if service is None:
+            with cls._lock:
+                service = cls._instances.get(provider)
+                if service is None:
+                    service_class = cls._services.get(provider)
+                    if not service_class:
+                        raise ValueError(f"Unsupported AI provider: {provider}")
+                    service = service_class()
+                    cls._instances[provider] = service
+        return service
+
+    @classmethod
+    def register_instance(cls, provider: AIProvider, service: AIService) -> None:
+        """替换服务商的实例，例如压测时接入本地桩服务"""
+        with cls._lock:
+            cls._instances[provider] = service
+
+    @classmethod
+    def get_breaker(cls, provider: AIProvider) -> CircuitBreaker:
+        """获取服务商的熔断器"""
+        breaker = cls._breakers.get(provider)
+        if breaker is None:
+            with cls._lock:
+                breaker = cls._breakers.get(provider)
+                if breaker is None:
+                    breaker = CircuitBreaker(provider.value)
+                    cls._breakers[provider] = breaker
+                    metrics.register_gauge("ai_breaker_open", lambda b=breaker: int(b.state != STATE_CLOSED),
+                                           "熔断器是否处于熔断或半开状态", provider=provider.value)
+        return breaker
+
+    @classmethod
+    def breaker_stats(cls) -> Dict[str, dict]:
+        """各服务商熔断器的状态和计数"""
+        return {provider.value: breaker.stats() for provider, breaker in list(cls._breakers.items())}
@@ -1,5 +1,9 @@
-from typing import Optional
+import json
+from typing import Dict, List, Optional
+from config import AI_BATCH_TOKENS_PER_ITEM, AI_BATCH_MAX_TOKENS
+from util.metrics import metrics
 from ..core.base import AIResponse
+from ..core.cache import AIResponseCache, normalize_content
 from ..core.config import AIConfig
 from ..core.provider import AIProvider
 from .factory import AIServiceFactory
@@ -7,37 +11,155 @@ from finbot import FinBot
 
 class AIManager:
     """AI服务管理器"""
-    def __init__(self, preferred_provider: Optional[AIProvider] = AIProvider.DEEPSEEK):
+    _cache: Optional[AIResponseCache] = None
+
+    def __init__(self, preferred_provider: Optional[AIProvider] = AIProvider.DEEPSEEK, notify: bool = True):
+        """
+        :param preferred_provider: 优先使用的服务商
+        :param notify: 调用失败时是否通过微信通知，离线重放时不需要
+        """
         self.preferred_provider = preferred_provider
-        self.robot = FinBot()  # 获取 FinBot 单例
+        self.robot = FinBot() if notify else None  # 获取 FinBot 单例
+
+    @classmethod
+    def get_cache(cls) -> AIResponseCache:
+        """进程内共享的结果缓存"""
+        if cls._cache is None:
+            cls._cache = AIResponseCache()
+        return cls._cache
         
-    def simple_chat(self, content: str, sys_prompt: str = AIConfig.get_system_prompt(), json_format: bool = True, **kwargs) -> AIResponse:
+    def simple_chat(self, content: str, sys_prompt: str = AIConfig.get_system_prompt(), json_format: bool = True,
+                    use_cache: bool = True, **kwargs) -> AIResponse:
         """
-        生成AI响应
+        生成AI响应，优先读取持久化缓存，相同内容和提示词版本不会重复调用模型
         :param json_format: 是否输出JSON格式
         :param sys_prompt: 系统提示词
         :param content: 内容
+        :param use_cache: 是否使用缓存
         :param kwargs: 其他参数
         :return: AI响应
         """
-        if self.preferred_provider:
+        if use_cache:
+            cached = self.get_cache().get(content, sys_prompt, json_format)
+            if cached is not None:
+                print("AI缓存命中")
+                return AIResponse(content=cached)
+        response = self._chat(content, sys_prompt, json_format, **kwargs)
+        # 要求JSON输出时，无法解析的回复不写入缓存，否则之后同一条消息会一直命中错误的结果
+        if use_cache and response.content and (not json_format or self._loads(response.content) is not None):
+            self.get_cache().put(content, sys_prompt, response.content, json_format)
+        return response
+
+    def batch_extract(self, contents: List[str], use_cache: bool = True) -> List[Optional[dict]]:
+        """
+        一次请求解析多条XML消息，结果与contents一一对应
+        先读取单条解析的缓存，未命中的消息合并为一个请求；批量结果中缺失或无法解析的消息再逐条解析，
+        单条消息解析失败时对应的结果为None，不影响其他消息
+        :param contents: XML内容列表
+        :param use_cache: 是否使用缓存
+        :return: 解析结果列表
+        """
+        sys_prompt = AIConfig.get_system_prompt()
+        results: List[Optional[dict]] = [None] * len(contents)
+        pending = []
+        for i, content in enumerate(contents):
+            cached = self.get_cache().get(content, sys_prompt) if use_cache else None
+            results[i] = self._loads(cached) if cached is not None else None
+            if results[i] is None:
+                pending.append(i)
+
+        if len(pending) > 1:
+            parsed = self._batch_chat([contents[i] for i in pending])
+            if parsed is None:
+                # 所有服务都不可用，逐条重试也只会再失败一遍
+                return results
+            for pos, i in enumerate(pending):
+                data = parsed.get(pos)
+                if data is None:
+                    continue
+                results[i] = data
+                if use_cache:
+                    # 按单条解析的缓存键写入，之后重放同一条消息时直接命中
+                    self.get_cache().put(contents[i], sys_prompt, json.dumps(data, ensure_ascii=False))
+            pending = [i for i in pending if results[i] is None]
+
+        for i in pending:
             try:
-                service = AIServiceFactory.get_service(self.preferred_provider)
-                return service.chat(content, sys_prompt, json_format, **kwargs)
+                results[i] = self._loads(self.simple_chat(contents[i], sys_prompt, use_cache=use_cache).content)
             except Exception as e:
-                if self.robot:
-                    self.robot.send_text_msg(str(e))
-                print(f"Error with preferred provider {self.preferred_provider}: {str(e)}")
-        
-        # 尝试所有可用的服务
+                print(f"解析第{i + 1}条消息失败: {str(e)}")
+        return results
+
+    def _batch_chat(self, contents: List[str]) -> Optional[Dict[int, dict]]:
+        """
+        把多条消息合并为一个请求
+        :return: 序号到解析结果的映射，缺少的序号需要逐条解析；所有服务都调用失败时返回None
+        """
+        content = "\n".join(f'<item index="{i}">\n{normalize_content(c)}\n</item>' for i, c in enumerate(contents))
+        max_tokens = min(AI_BATCH_MAX_TOKENS, AI_BATCH_TOKENS_PER_ITEM * len(contents))
+        try:
+            response = self._chat(content, AIConfig.get_batch_system_prompt(), True, max_tokens=max_tokens)
+        except RuntimeError as e:
+            print(f"批量解析失败: {str(e)}")
+            return None
+        print(f"批量解析{len(contents)}条消息:", response.content)
+        data = self._loads(response.content)
+        items = data.get("results") if data else None
+        if not isinstance(items, list):
+            print("批量解析结果格式错误，改为逐条解析")
+            return {}
+        parsed = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            index = item.pop("index", None)
+            if isinstance(index, int) and 0 <= index < len(contents) and item:
+                parsed[index] = item
+        return parsed
+
+    @staticmethod
+    def _loads(content: Optional[str]) -> Optional[dict]:
+        """解析JSON对象，格式错误时返回None"""
+        try:
+            data = json.loads(content)
+        except (TypeError, ValueError):
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _chat(self, content: str, sys_prompt: str, json_format: bool, **kwargs) -> AIResponse:
+        """按优先级调用AI服务，跳过未配置或已熔断的服务"""
+        providers = AIProvider.get_priority_list()
+        if self.preferred_provider:
+            providers = [self.preferred_provider] + [p for p in providers if p != self.preferred_provider]
+
         last_error = None
-        for provider in AIProvider.get_priority_list():
+        for provider in providers:
+            breaker = AIServiceFactory.get_breaker(provider)
             try:
                 service = AIServiceFactory.get_service(provider)
-                return service.chat(content, **kwargs)
+            except ValueError as e:
+                last_error = e
+                continue
+            if not service.is_available():
+                continue
+            # 熔断中的服务直接跳过，不再每条消息都等待它超时
+            if not breaker.allow():
+                print(f"{provider.value} 熔断中，跳过")
+                continue
+            try:
+                with metrics.timer("ai_request_seconds", "大模型请求耗时", provider=provider.value):
+                    response = service.chat(content, sys_prompt, json_format, **kwargs)
             except Exception as e:
+                breaker.record_failure()
                 print(f"Error with provider {provider}: {str(e)}")
+                if provider == self.preferred_provider and self.robot:
+                    self.robot.send_text_msg(str(e))
                 last_error = e
                 continue
-        self.robot.send_text_msg(str(last_error))
-        raise RuntimeError(f"All AI services failed. Last error: {str(last_error)}") 
\ No newline at end of file
+            breaker.record_success()
+            return response
+        if last_error is None:
+            last_error = RuntimeError("没有可用的AI服务")
+        if self.robot:
+            self.robot.send_text_msg(str(last_error))
+        raise RuntimeError(f"All AI services failed. Last error: {str(last_error)}")
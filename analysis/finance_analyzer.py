@@ -1,23 +1,28 @@
-from typing import List
+from typing import Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 import os
 import re
+import threading
 
-from config import APP_SECRET, APP_ID
-from feishu.table import FeishuTable
+from ai.core.answer_cache import AnswerCache
+from analysis.ledger_store import LedgerStore
 from util import date_util
+from util.metrics import metrics
 
 
 class FinanceAnalyzer:
-    """财务数据分析类，用于读取和分析账本CSV数据"""
+    """财务数据分析类，默认读取本地列式账本，也可以读取账本CSV数据"""
     
-    def __init__(self, file_path=None):
+    def __init__(self, file_path=None, store: LedgerStore = None, rollups=None):
         """
         初始化财务分析器
         
         参数:
-            file_path (str, optional): CSV文件路径
+            file_path (str, optional): CSV文件路径，指定时从CSV加载
+            store (LedgerStore, optional): 本地列式账本，未指定CSV时使用，默认新建
+            rollups (DailyRollupService, optional): 每日汇总服务，未指定CSV时用于收支汇总，默认新建
         """
         # 设置pandas显示选项，显示所有行和列
         pd.set_option('display.max_rows', None)  # 显示所有行
@@ -25,11 +30,21 @@ class FinanceAnalyzer:
         pd.set_option('display.width', None)  # 设置显示宽度为无限制
         pd.set_option('display.max_colwidth', None)  # 设置列宽为无限制
         self.df = None
+        self.store = None
+        self.rollups = None
+        self.file_path = None
+        self._file_stat = None
+        self._lock = threading.Lock()
+        self.answer_cache = AnswerCache()
         if file_path:
             self.load_data(file_path)
         else:
-            self.table = FeishuTable(APP_ID, APP_SECRET)
-            self.load_data(self.table.get_file_path())
+            from db.services import DailyRollupService
+            # 空账本的len为0，不能用or判断是否传入
+            self.store = store if store is not None else LedgerStore()
+            self.rollups = rollups if rollups is not None else DailyRollupService()
+            self.load_store()
+
     def load_data(self, file_path):
         """
         从CSV文件加载数据
@@ -41,37 +56,133 @@ class FinanceAnalyzer:
             pandas.DataFrame: 加载的数据
         """
         if not os.path.exists(file_path):
-            self.table.export_table()
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"文件不存在: {file_path}")
-        
-        # 读取CSV文件
-        self.df = pd.read_csv(file_path, encoding='utf-8')
+            raise FileNotFoundError(f"文件不存在: {file_path}")
         
-        # 清理数据
-        self._clean_data()
+        with self._lock:
+            stat = self._stat(file_path)
+            # 读取CSV文件
+            df = pd.read_csv(file_path, encoding='utf-8')
+
+            # 清理数据后整体替换，避免其他线程读到半成品
+            self.df = self._clean_data(df)
+            self.file_path = file_path
+            self._file_stat = stat
         
         return self.df
+
+    def load_store(self):
+        """
+        从本地列式账本加载数据，加载前先与数据库同步
+
+        返回:
+            pandas.DataFrame: 加载的数据
+        """
+        with self._lock:
+            self.store.refresh()
+            self.df = self._index_frame(self.store.to_frame())
+        return self.df
+
+    def reload_if_changed(self) -> bool:
+        """
+        账本有变化时重新加载：本地账本的交易有新增、修改或删除，或CSV文件的修改时间、大小发生变化
+
+        返回:
+            bool: 是否重新加载了数据
+        """
+        if self.store is not None:
+            with self._lock:
+                if not self.store.refresh():
+                    return False
+                self.df = self._index_frame(self.store.to_frame())
+            return True
+        if not self.file_path:
+            return False
+        stat = self._stat(self.file_path)
+        if stat is None or stat == self._file_stat:
+            return False
+        self.load_data(self.file_path)
+        return True
+
+    def ledger_version(self):
+        """
+        当前账本的版本，账本有变化时版本随之变化
+
+        返回:
+            本地账本为数据库中持久化的版本号，CSV为文件当前的修改时间和大小
+        """
+        if self.store is not None:
+            return self.store.service.ledger_version
+        # 读取文件当前的状态，而不是上次加载时的状态，文件被改写后缓存随之失效
+        return self._stat(self.file_path) if self.file_path else None
+
+    @staticmethod
+    def _stat(file_path):
+        """获取文件的修改时间和大小，文件不存在时返回None"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
     
-    def _clean_data(self):
+    @staticmethod
+    def _clean_data(df):
         """清理和转换数据"""
-        if self.df is None:
-            return
+        if df is None:
+            return None
         
         # 删除空列
-        self.df = self.df.iloc[:, :4]  # 只保留前4列
+        df = df.iloc[:, :4].copy()  # 只保留前4列
         
         # 重命名列
-        self.df.columns = ['时间', '类型', '金额', '备注']
+        df.columns = ['时间', '类型', '金额', '备注']
         
         # 转换时间列为日期时间格式,%Y年%m月%d日 %H:%M:%S
-        self.df['时间'] = pd.to_datetime(self.df['时间'], format='%Y年%m月%d日 %H:%M:%S')
+        df['时间'] = pd.to_datetime(df['时间'], format='%Y年%m月%d日 %H:%M:%S')
         
         # 转换金额为数值类型
-        self.df['金额'] = pd.to_numeric(self.df['金额'])
+        df['金额'] = pd.to_numeric(df['金额'])
         
         # 提取备注中的商家信息
+        return FinanceAnalyzer._index_frame(df)
+
+    @staticmethod
+    def _index_frame(df):
+        """按时间排序并以时间建立DatetimeIndex，日期范围查询通过二分查找切片，不再逐行比较日期"""
+        df = df.sort_values(by='时间', kind='stable')
+        df.index = pd.DatetimeIndex(df['时间'])
+        df['备注'] = df['备注'].fillna('')
+        return df
+
+    @staticmethod
+    def _slice_bounds(df, start_dates, end_dates):
+        """
+        批量计算日期范围在按时间排序的数据中的行号区间
+
+        参数:
+            start_dates (list): 开始日期列表
+            end_dates (list): 结束日期列表（包含当天）
+
+        返回:
+            tuple: (起始行号数组, 结束行号数组)，第k个范围对应df.iloc[starts[k]:ends[k]]
+        """
+        starts = pd.DatetimeIndex(pd.to_datetime(start_dates))
+        ends = pd.DatetimeIndex(pd.to_datetime(end_dates)) + pd.Timedelta(days=1)
+        return df.index.searchsorted(starts, side='left'), df.index.searchsorted(ends, side='left')
+
+    @staticmethod
+    def _to_records(df) -> List[dict]:
+        """把切片后的数据按列格式化并转换为交易字典列表，不逐行遍历DataFrame"""
+        if df.empty:
+            return []
+        times = np.datetime_as_string(df.index.to_numpy().astype('datetime64[s]'))
+        return pd.DataFrame({
+            'date': np.char.replace(times, 'T', ' '),
+            'type': df['类型'].to_numpy(),
+            'amount': np.char.mod('%.2f', df['金额'].to_numpy(dtype=float)),
+            'remark': df['备注'].to_numpy(),
+        }).to_dict('records')
 
+    @metrics.timed("analyzer_query_seconds", "分析器查询耗时", query="today_summary")
     def get_today_summary(self, date_str: str = None) -> List[dict]:
         """
         获取指定日期的收支情况和与前一天的支出差值
@@ -82,9 +193,6 @@ class FinanceAnalyzer:
         返回:
             List[dict]: 包含指定日期收支信息的字典列表
         """
-        if self.df is None:
-            return []
-        
         # 处理日期
         if date_str:
             try:
@@ -95,18 +203,13 @@ class FinanceAnalyzer:
             target_date = pd.Timestamp.now().date() - pd.Timedelta(days=1)
         
         previous_date = target_date - pd.Timedelta(days=1)
-        
-        # 添加日期列
-        self.df['日期'] = self.df['时间'].dt.date
-        
-        # 获取目标日期的数据
-        target_data = self.df[self.df['日期'] == target_date]
-        target_income = round(target_data[target_data['类型'] == '收入']['金额'].sum(), 2)
-        target_expense = round(target_data[target_data['类型'] == '支出']['金额'].sum(), 2)
-        
-        # 获取前一天的数据
-        previous_data = self.df[self.df['日期'] == previous_date]
-        previous_expense = round(previous_data[previous_data['类型'] == '支出']['金额'].sum(), 2)
+
+        totals = self._daily_totals([target_date, previous_date])
+        if totals is None:
+            return []
+        target_income = round(totals.get((target_date, '收入'), 0), 2)
+        target_expense = round(totals.get((target_date, '支出'), 0), 2)
+        previous_expense = round(totals.get((previous_date, '支出'), 0), 2)
         
         # 计算支出差值
         expense_diff = round(target_expense - previous_expense, 2)
@@ -118,6 +221,29 @@ class FinanceAnalyzer:
             "date": target_date.strftime('%Y-%m-%d')
         }]
     
+    def _daily_totals(self, days) -> Optional[Dict[tuple, float]]:
+        """
+        获取指定日期按类型的总金额，读取本地账本时直接查每日汇总表，与账本大小无关
+
+        参数:
+            days (list): 日期列表
+
+        返回:
+            dict: (日期, 类型) -> 总金额，CSV数据未加载时返回None
+        """
+        if self.rollups is not None:
+            return {key: cents / 100 for key, cents in self.rollups.get_totals(days).items()}
+        self.reload_if_changed()
+        df = self.df
+        if df is None:
+            return None
+        starts, ends = self._slice_bounds(df, days, days)
+        totals = {}
+        for day, start, end in zip(days, starts, ends):
+            for type_, amount in df.iloc[start:end].groupby('类型')['金额'].sum().items():
+                totals[(day, type_)] = amount
+        return totals
+    
     def get_date_transactions(self, start_time: str = None, end_time: str = None) -> List[dict]:
         """
         获取指定日期范围内的所有交易数据
@@ -129,71 +255,97 @@ class FinanceAnalyzer:
         返回:
             List[dict]: 包含指定日期范围内所有交易记录的字典列表
         """
-        if self.df is None:
-            return []
-        
-        # 确保日期列存在
-        if '日期' not in self.df.columns:
-            self.df['日期'] = self.df['时间'].dt.date
-        
+        return self.get_ranges_transactions([(start_time, end_time)])[0]
+
+    @metrics.timed("analyzer_query_seconds", "分析器查询耗时", query="ranges_transactions")
+    def get_ranges_transactions(self, ranges: List[tuple]) -> List[List[dict]]:
+        """
+        批量获取多个日期范围内的交易数据，所有范围通过一次二分查找定位
+
+        参数:
+            ranges (list): (开始日期, 结束日期)列表，格式与get_date_transactions的参数相同，结束日期可以为None
+
+        返回:
+            List[List[dict]]: 与ranges一一对应的交易记录列表，日期格式错误时为只包含错误信息的列表
+        """
+        self.reload_if_changed()
+        df = self.df
+        if df is None:
+            return [[] for _ in ranges]
+
+        parsed = [self._parse_range(start_time, end_time) for start_time, end_time in ranges]
+        results = [[item] if 'error' in item else [] for item in parsed]
+        valid = [k for k, item in enumerate(parsed) if 'error' not in item]
+        if valid:
+            starts, ends = self._slice_bounds(df, [parsed[k]['start'] for k in valid], [parsed[k]['end'] for k in valid])
+            for k, start, end in zip(valid, starts, ends):
+                results[k] = self._to_records(df.iloc[start:end])
+        return results
+
+    @staticmethod
+    def _parse_range(start_time: str = None, end_time: str = None) -> dict:
+        """
+        解析日期范围参数
+
+        返回:
+            dict: {'start': 开始日期, 'end': 结束日期}，格式错误时为{'error': 错误信息}
+        """
         # 处理开始日期
         if start_time:
             try:
                 start_date = pd.to_datetime(start_time, format='%Y%m%d').date()
             except ValueError:
-                return [{"error": "开始日期格式错误，请使用'YYYYMMDD'格式，例如'20250301'"}]
+                return {"error": "开始日期格式错误，请使用'YYYYMMDD'格式，例如'20250301'"}
         else:
             start_date = pd.Timestamp.now().date()
-        
-        # 处理结束日期
-        if end_time:
-            try:
-                end_date = pd.to_datetime(end_time, format='%Y%m%d').date()
-                if end_date < start_date:
-                    return [{"error": "结束日期不能早于开始日期"}]
-            except ValueError:
-                return [{"error": "结束日期格式错误，请使用'YYYYMMDD'格式，例如'20250305'"}]
-            
-            # 获取日期范围内的数据
-            target_data = self.df[(self.df['日期'] >= start_date) & (self.df['日期'] <= end_date)]
-        else:
-            # 如果没有指定结束日期，则只查询开始日期的数据
-            target_data = self.df[self.df['日期'] == start_date]
-        
-        # 如果没有数据，返回空列表
-        if target_data.empty:
-            return []
-        
-        # 按时间排序（从早到晚）
-        target_data = target_data.sort_values(by='时间')
-        
-        # 将数据转换为字典列表
-        transactions = []
-        for _, row in target_data.iterrows():
-            transactions.append({
-                "date": row['时间'],
-                "type": row['类型'],
-                "amount": f"{row['金额']:.2f}",
-                "remark": row['备注'] if '备注' in row else ""
-            })
-        
-        return transactions
 
-    def chat_with_ai(self, question: str):
-        from ai.services.manager import AIManager
-        from ai.providers.claude_service import ClaudeService
-        from finbot import FinBot
+        # 如果没有指定结束日期，则只查询开始日期的数据
+        if not end_time:
+            return {'start': start_date, 'end': start_date}
+        try:
+            end_date = pd.to_datetime(end_time, format='%Y%m%d').date()
+        except ValueError:
+            return {"error": "结束日期格式错误，请使用'YYYYMMDD'格式，例如'20250305'"}
+        if end_date < start_date:
+            return {"error": "结束日期不能早于开始日期"}
+        return {'start': start_date, 'end': end_date}
 
-        robot = FinBot()
-        
-        # 实例化Claude服务
-        claude_service = ClaudeService()
+    @metrics.timed("analyzer_query_seconds", "分析器查询耗时", query="chat_with_ai")
+    def chat_with_ai(self, question: str, sink=None):
+        """
+        使用Claude分析交易数据并回答问题，回答以流式方式按句子分段发送
+
+        参数:
+            question (str): 问题
+            sink (Callable, optional): 发送一段回答的函数，默认发送到微信
+        """
+        from ai.core.base import AIResponse
+        from ai.core.provider import AIProvider
+        from ai.core.stream import StreamFlusher
+        from ai.services.factory import AIServiceFactory
+
+        if sink is None:
+            from finbot import FinBot
+            sink = FinBot().send_text_msg
+
+        # 同一天内账本没有变化时，相同的问题直接返回上次的回答
+        today = date_util.get_date(format='%Y-%m-%d')
+        version = self.ledger_version()
+        cached = self.answer_cache.get(question, today, version)
+        if cached is not None:
+            flusher = StreamFlusher(sink)
+            flusher.feed(cached)
+            flusher.close()
+            return AIResponse(cached)
+        
+        # 复用Claude服务实例和其中的连接池
+        claude_service = AIServiceFactory.get_service(AIProvider.CLAUDE)
         
         # 注册工具回调函数
         claude_service.register_tool_callback("get_date_transactions", self.get_date_transactions, ['start_time', 'end_time'])
         sys_prompt = f'''
         你是一名智能数据分析助理,能够根据用户的交易数据来回答用户的问题。
-                            1.今天的日期是: {date_util.get_date(format='%Y-%m-%d')}
+                            1.今天的日期是: {today}
                             2.涉及到金额计算的,你应该多次验证,避免计算出错
                             3.同时规定每周一为一个星期的开始,每周日为一个星期的结束
                             4.你可以通过tools来获取记账数据
@@ -201,12 +353,25 @@ class FinanceAnalyzer:
                             6.仅服务于交易数据的分析查询，不回应其他无关问题
         '''
 
-        
-        # 使用complex_chat方法进行对话，该方法支持工具调用
-        response = claude_service.chat(query=question, sys_prompt=sys_prompt)
-        print(response)
-        # 发送响应
-        robot.send_text_msg(response.content)
+        breaker = AIServiceFactory.get_breaker(AIProvider.CLAUDE)
+        if not breaker.allow():
+            sink('AI服务暂时不可用，请稍后再试')
+            return None
+
+        # 边生成边发送，用户不必等待完整的回答
+        flusher = StreamFlusher(sink)
+        try:
+            response = claude_service.stream_chat(question, flusher.feed, sys_prompt=sys_prompt)
+        except Exception:
+            breaker.record_failure()
+            raise
+        finally:
+            flusher.close()
+        breaker.record_success()
+        print(response.usage)
+        if response.complete:
+            self.answer_cache.put(question, today, version, response.content)
+        return response
 
 if __name__ == '__main__':
     a = FinanceAnalyzer()
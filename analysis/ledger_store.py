@@ -0,0 +1,129 @@
+import os
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 本地账本快照文件
+LEDGER_FILE = os.path.join(BASE_DIR, 'ledger.npz')
+
+COLUMNS = ('id', 'time', 'type', 'amount_cents', 'remark')
+
+
+class LedgerStore:
+    """
+    本地列式账本
+    以data.db为数据源，按列保存为NumPy的npz快照，新的交易按ID增量追加，
+    加载时不需要解析CSV，也不依赖飞书
+    """
+
+    def __init__(self, path: str = LEDGER_FILE, service=None):
+        """
+        Args:
+            path: 快照文件路径
+            service: 交易记录服务，默认使用TransactionService
+        """
+        if service is None:
+            from db.services import TransactionService
+            service = TransactionService()
+        self.path = path
+        self.service = service
+        self.columns = self._empty_columns()
+        # 与数据库同步时的(版本号, 修改或删除的次数)，从未同步过时为None
+        self.stamp: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._load_snapshot()
+
+    @staticmethod
+    def _empty_columns() -> dict:
+        return {
+            'id': np.empty(0, dtype=np.int64),
+            'time': np.empty(0, dtype='datetime64[s]'),
+            'type': np.empty(0, dtype='U4'),
+            'amount_cents': np.empty(0, dtype=np.int64),
+            'remark': np.empty(0, dtype='U1'),
+        }
+
+    @staticmethod
+    def _to_columns(rows) -> dict:
+        if not rows:
+            return LedgerStore._empty_columns()
+        ids, times, types, cents, remarks = zip(*rows)
+        return {
+            'id': np.array(ids, dtype=np.int64),
+            'time': np.array(times, dtype='datetime64[s]'),
+            'type': np.array([t or '' for t in types]),
+            'amount_cents': np.array([c or 0 for c in cents], dtype=np.int64),
+            'remark': np.array([r or '' for r in remarks]),
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns['id'])
+
+    @property
+    def last_id(self) -> int:
+        return int(self.columns['id'][-1]) if len(self) else 0
+
+    def _load_snapshot(self) -> None:
+        """读取快照文件，文件不存在或损坏时保持为空，之后由refresh重建"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                self.columns = {name: data[name] for name in COLUMNS}
+                stamp = tuple(int(v) for v in data['stamp'])
+        except Exception as e:
+            print(f"读取账本快照失败，将重新构建: {str(e)}")
+            self.columns = self._empty_columns()
+            return
+        # 旧格式的快照没有版本号，下次refresh时重建
+        self.stamp = stamp if len(stamp) == 2 else None
+
+    def _save_snapshot(self) -> None:
+        """先写临时文件再替换，避免读到写了一半的快照"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, stamp=np.array(self.stamp, dtype=np.int64), **self.columns)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self) -> bool:
+        """
+        与数据库同步：版本号没变时不查询交易表；只有新增交易时按ID追加，记录被修改或删除时整体重建
+
+        Returns:
+            bool: 数据是否有变化
+        """
+        with self._lock:
+            stamp = tuple(self.service.get_ledger_stamp())
+            if stamp == self.stamp:
+                return False
+            if self.stamp is not None and stamp[1] == self.stamp[1]:
+                appended = self._to_columns(self.service.get_ledger_rows(after_id=self.last_id))
+                self.columns = {name: np.concatenate([self.columns[name], appended[name]]) for name in COLUMNS}
+            else:
+                self.columns = self._to_columns(self.service.get_ledger_rows())
+            self.stamp = stamp
+            self._save_snapshot()
+            return True
+
+    def rebuild(self) -> None:
+        """从数据库全量重建快照"""
+        with self._lock:
+            # 先读版本号，读取期间的写入会在下次refresh时同步
+            stamp = tuple(self.service.get_ledger_stamp())
+            self.columns = self._to_columns(self.service.get_ledger_rows())
+            self.stamp = stamp
+            self._save_snapshot()
+
+    def to_frame(self) -> pd.DataFrame:
+        """转换为FinanceAnalyzer使用的DataFrame：时间、类型、金额、备注，按时间排序"""
+        columns = self.columns
+        df = pd.DataFrame({
+            '时间': pd.to_datetime(columns['time']),
+            '类型': columns['type'].astype(object),
+            '金额': columns['amount_cents'] / 100,
+            '备注': columns['remark'].astype(object),
+        })
+        return df.sort_values(by='时间', kind='stable').reset_index(drop=True)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from config import APP_ID, APP_SECRET
+
+
+class AppContext:
+    """
+    应用上下文，持有进程内共享的长生命周期组件
+    各组件在第一次使用时创建，之后在微信消息、飞书事件和定时任务之间复用
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._initialized = False
+                    cls._instance = instance
+        return cls._instance
+
+    def __init__(self) -> None:
+        if self._initialized:
+            return
+        self._lock = threading.RLock()
+        self._feishu_table = None
+        self._sheet_writer = None
+        self._feishu_sender = None
+        self._feishu_events = None
+        self._card_pager = None
+        self._transaction_service = None
+        self._analyzer = None
+        self._msg_parser = None
+        self._raw_log = None
+        self._initialized = True
+
+    @property
+    def feishu_table(self):
+        """飞书表格"""
+        if self._feishu_table is None:
+            with self._lock:
+                if self._feishu_table is None:
+                    from feishu.table import FeishuTable
+                    self._feishu_table = FeishuTable(APP_ID, APP_SECRET)
+        return self._feishu_table
+
+    @property
+    def sheet_writer(self):
+        """飞书表格的缓冲写入器，创建时即启动后台线程写入遗留数据"""
+        if self._sheet_writer is None:
+            with self._lock:
+                if self._sheet_writer is None:
+                    from feishu.sheet_writer import BufferedSheetWriter
+                    writer = BufferedSheetWriter(self.feishu_table)
+                    writer.start()
+                    self._sheet_writer = writer
+        return self._sheet_writer
+
+    @property
+    def feishu_sender(self):
+        """飞书消息发送器"""
+        if self._feishu_sender is None:
+            with self._lock:
+                if self._feishu_sender is None:
+                    from feishu.message import FeishuMessageSender
+                    self._feishu_sender = FeishuMessageSender(APP_ID, APP_SECRET)
+        return self._feishu_sender
+
+    @property
+    def feishu_events(self):
+        """飞书菜单事件分发器"""
+        if self._feishu_events is None:
+            with self._lock:
+                if self._feishu_events is None:
+                    from feishu.event_dispatcher import FeishuEventDispatcher
+                    self._feishu_events = FeishuEventDispatcher(
+                        self.transaction_service, self.feishu_sender, self.card_pager)
+        return self._feishu_events
+
+    @property
+    def card_pager(self):
+        """交易卡片分页器，菜单事件和卡片翻页回调共用页面缓存"""
+        if self._card_pager is None:
+            with self._lock:
+                if self._card_pager is None:
+                    from feishu.card_pager import TransactionCardPager
+                    self._card_pager = TransactionCardPager(self.transaction_service)
+        return self._card_pager
+
+    @property
+    def transaction_service(self):
+        """交易记录服务"""
+        if self._transaction_service is None:
+            with self._lock:
+                if self._transaction_service is None:
+                    from db.services import TransactionService
+                    self._transaction_service = TransactionService()
+        return self._transaction_service
+
+    @property
+    def analyzer(self):
+        """财务分析器，读取本地列式账本，有新交易时自动增量加载"""
+        if self._analyzer is None:
+            with self._lock:
+                if self._analyzer is None:
+                    from analysis import FinanceAnalyzer
+                    self._analyzer = FinanceAnalyzer()
+        return self._analyzer
+
+    @property
+    def raw_log(self):
+        """原始消息日志"""
+        if self._raw_log is None:
+            with self._lock:
+                if self._raw_log is None:
+                    from raw_log import RawMessageLog
+                    self._raw_log = RawMessageLog()
+        return self._raw_log
+
+    @property
+    def msg_parser(self):
+        """消息解析器"""
+        if self._msg_parser is None:
+            with self._lock:
+                if self._msg_parser is None:
+                    from message_parser import MessageParser
+                    self._msg_parser = MessageParser(
+                        analyzer=self.analyzer,
+                        service=self.transaction_service,
+                        feishu_table=self.feishu_table,
+                        sheet_writer=self.sheet_writer,
+                        raw_log=self.raw_log
+                    )
+        return self._msg_parser
+
+    def shutdown(self) -> None:
+        """退出前调用，处理完已接收的事件并写入缓冲中的数据"""
+        if self._feishu_events is not None:
+            self._feishu_events.shutdown()
+        if self._msg_parser is not None:
+            # 等待攒批中的消息解析入库，之后再写入飞书
+            self._msg_parser.batcher.close()
+        if self._raw_log is not None:
+            self._raw_log.close()
+        if self._sheet_writer is not None:
+            self._sheet_writer.close()
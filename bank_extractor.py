@@ -0,0 +1,244 @@
+import html
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from message_filter import SOURCE_FIELDS, extract_appmsg_fields
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 人工确认过的模板，格式与内置模板一致，会追加在内置模板之后
+TEMPLATE_FILE = os.path.join(BASE_DIR, 'bank_templates.json')
+# 根据大模型解析结果自动生成的候选模板，需要人工确认后再拷贝到TEMPLATE_FILE
+PROPOSAL_FILE = os.path.join(BASE_DIR, 'bank_template_proposals.json')
+
+INCOME_KEYWORDS = ('收入', '存入', '汇入', '入账', '转入', '退款', '退货', '代发', '工资', '利息')
+EXPENSE_KEYWORDS = ('支出', '扣款', '消费', '支付', '划扣', '存出', '转出', '取款', '取现', '还款', '缴费')
+
+AMOUNT_REGEX = r'(?P<amount>[\d,]+(?:\.\d+)?)'
+
+
+def normalize_type(raw: Optional[str]) -> Optional[str]:
+    """把银行原始的交易类型归一为收入/支出，无法判断时返回None"""
+    if not raw:
+        return None
+    for keyword in INCOME_KEYWORDS:
+        if keyword in raw:
+            return '收入'
+    for keyword in EXPENSE_KEYWORDS:
+        if keyword in raw:
+            return '支出'
+    return None
+
+
+def parse_amount(raw: Optional[str]) -> Optional[float]:
+    """解析金额文本，去掉千分位"""
+    if not raw:
+        return None
+    try:
+        return round(float(raw.replace(',', '')), 2)
+    except ValueError:
+        return None
+
+
+@dataclass
+class BankTemplate:
+    """
+    银行交易提醒模板，每个字段是一个作用在appmsg des上的正则，取第一个分组（或同名命名分组）
+
+    amount为必填字段；type未匹配时会用整段des按关键字推断收支类型
+    """
+    bank: str
+    fields: Dict[str, str]
+    accounts: List[str] = field(default_factory=list)
+    _compiled: Dict[str, re.Pattern] = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self):
+        self._compiled = {name: re.compile(regex, re.S) for name, regex in self.fields.items()}
+
+    def matches_source(self, sources: List[str]) -> bool:
+        """消息来源是否属于该银行"""
+        return any(source == self.bank or source in self.accounts for source in sources)
+
+    def apply(self, des: str) -> Optional[Dict[str, str]]:
+        """在des上执行模板，金额未匹配到时返回None"""
+        values = {}
+        for name, pattern in self._compiled.items():
+            match = pattern.search(des)
+            if not match:
+                continue
+            if match.groupdict().get(name) is not None:
+                value = match.group(name)
+            elif match.groups():
+                value = match.group(1)
+            else:
+                value = match.group(0)
+            values[name] = value.strip() if value else value
+        if not values.get('amount'):
+            return None
+        return values
+
+    def to_dict(self) -> Dict:
+        return {'bank': self.bank, 'accounts': self.accounts, 'fields': self.fields}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BankTemplate':
+        return cls(bank=data['bank'], fields=data['fields'], accounts=data.get('accounts') or [])
+
+
+BUILTIN_TEMPLATES = [
+    # 交通银行：交易时间/交易类型/交易金额/交易说明 逐行展示
+    BankTemplate(bank='交通银行', fields={
+        'amount': r'(?:交易金额|金额)[：:]\s*(?:人民币|RMB)?\s*' + AMOUNT_REGEX,
+        'type': r'(?:交易类型|交易种类)[：:]\s*(?P<type>[^\n\r]+)',
+        'time': r'交易时间[：:]\s*(?P<time>[^\n\r]+)',
+        'remark': r'(?:交易说明|附言|备注|交易地点|对方户名)[：:]\s*(?P<remark>[^\n\r]+)',
+    }),
+    # 招商银行：您账户1234于03月01日12:00在【财付通-美团】快捷支付扣款人民币35.00，余额...
+    BankTemplate(bank='招商银行', fields={
+        'amount': r'(?:人民币|RMB)\s*' + AMOUNT_REGEX,
+        'type': r'(?P<type>快捷支付扣款|银联扣款|网联扣款|消费|转账汇入|转账转出|汇款汇入|入账|代发工资|退款|还款|取款|存入)',
+        'time': r'于(?P<time>\d{1,2}月\d{1,2}日\s*\d{1,2}:\d{2})',
+        'remark': r'【(?P<remark>[^】]+)】',
+    }),
+]
+
+
+class BankExtractor:
+    """
+    基于模板的银行交易提醒解析器，命中模板时无需调用大模型
+    未命中的消息交给大模型解析，成功的结果可以通过propose_template生成候选模板
+    """
+
+    def __init__(self, templates: List[BankTemplate] = None, template_file: str = TEMPLATE_FILE,
+                 proposal_file: str = PROPOSAL_FILE):
+        self.templates = list(BUILTIN_TEMPLATES if templates is None else templates)
+        self.templates.extend(self._load_templates(template_file))
+        self.proposal_file = proposal_file
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_templates(template_file: Optional[str]) -> List[BankTemplate]:
+        if not template_file or not os.path.exists(template_file):
+            return []
+        try:
+            with open(template_file, 'r', encoding='utf-8') as f:
+                return [BankTemplate.from_dict(item) for item in json.load(f)]
+        except Exception as e:
+            print(f"加载银行模板失败: {str(e)}")
+            return []
+
+    @staticmethod
+    def _get_sources(fields: Dict[str, str]) -> List[str]:
+        return [fields[name] for name in SOURCE_FIELDS if fields.get(name)]
+
+    def extract(self, content: str) -> Optional[dict]:
+        """
+        使用模板解析交易提醒
+
+        Args:
+            content: 原始XML内容
+        Returns:
+            Optional[dict]: 与大模型输出结构一致的字典，没有可用模板或解析失败时返回None
+        """
+        fields = extract_appmsg_fields(content)
+        des = html.unescape(fields.get('des') or '')
+        if not des:
+            return None
+        sources = self._get_sources(fields)
+        for template in self.templates:
+            if not template.matches_source(sources):
+                continue
+            values = template.apply(des)
+            if not values:
+                continue
+            amount = parse_amount(values.get('amount'))
+            type_ = normalize_type(values.get('type')) or normalize_type(des)
+            if amount is None or type_ is None:
+                continue
+            return {
+                '标题': fields.get('title'),
+                'amount': amount,
+                'transaction_time': values.get('time') or '',
+                'publisher': template.bank,
+                'type': type_,
+                'remark': values.get('remark') or ' ',
+            }
+        return None
+
+    def propose_template(self, content: str, data: dict) -> Optional[dict]:
+        """
+        根据大模型的解析结果生成候选模板：在des中定位金额和备注，用其前缀文本构造正则
+        只有能在原文上复现出相同金额的候选模板才会写入PROPOSAL_FILE
+
+        Args:
+            content: 原始XML内容
+            data: 大模型解析出的结果
+        Returns:
+            Optional[dict]: 候选模板，无法生成时返回None
+        """
+        fields = extract_appmsg_fields(content)
+        des = html.unescape(fields.get('des') or '')
+        publisher = data.get('publisher')
+        amount = parse_amount(str(data.get('amount', '')))
+        if not des or not publisher or amount is None:
+            return None
+
+        template_fields = {}
+        amount_regex = self._build_amount_regex(des, amount)
+        if not amount_regex:
+            return None
+        template_fields['amount'] = amount_regex
+        remark = (data.get('remark') or '').strip()
+        if remark and remark in des:
+            prefix = self._get_prefix(des, des.index(remark))
+            if prefix:
+                template_fields['remark'] = re.escape(prefix) + r'\s*(?P<remark>[^\n\r]+)'
+
+        template = BankTemplate(bank=publisher, fields=template_fields,
+                                accounts=[s for s in self._get_sources(fields) if s.startswith('gh_')])
+        values = template.apply(des)
+        if not values or parse_amount(values['amount']) != amount:
+            return None
+        proposal = template.to_dict()
+        proposal['sample'] = des
+        self._save_proposal(proposal)
+        return proposal
+
+    def _build_amount_regex(self, des: str, amount: float) -> Optional[str]:
+        for match in re.finditer(r'[\d,]+(?:\.\d+)?', des):
+            if parse_amount(match.group(0)) != amount:
+                continue
+            prefix = self._get_prefix(des, match.start())
+            if prefix:
+                return re.escape(prefix) + r'\s*' + AMOUNT_REGEX
+        return None
+
+    @staticmethod
+    def _get_prefix(des: str, end: int, max_len: int = 8) -> str:
+        """取值前面同一行内的固定文本作为锚点"""
+        line_start = max(des.rfind('\n', 0, end), des.rfind('，', 0, end), des.rfind(',', 0, end)) + 1
+        start = max(line_start, end - max_len)
+        return des[start:end].strip()
+
+    def _save_proposal(self, proposal: dict) -> None:
+        if not self.proposal_file:
+            return
+        with self._lock:
+            proposals = []
+            if os.path.exists(self.proposal_file):
+                try:
+                    with open(self.proposal_file, 'r', encoding='utf-8') as f:
+                        proposals = json.load(f)
+                except Exception as e:
+                    print(f"读取候选模板失败: {str(e)}")
+            key = (proposal['bank'], json.dumps(proposal['fields'], ensure_ascii=False, sort_keys=True))
+            for item in proposals:
+                if (item['bank'], json.dumps(item['fields'], ensure_ascii=False, sort_keys=True)) == key:
+                    return
+            proposals.append(proposal)
+            with open(self.proposal_file, 'w', encoding='utf-8') as f:
+                json.dump(proposals, f, ensure_ascii=False, indent=2)
+            print(f"新增候选模板: {proposal['bank']}")
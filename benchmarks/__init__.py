@@ -0,0 +1,3 @@
+"""
+性能基准测试，全部离线运行，不依赖微信、飞书和大模型
+"""
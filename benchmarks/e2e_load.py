@@ -0,0 +1,356 @@
+"""
+端到端压测：通过模拟传输层按设定速率投递消息，经FinBot.processMsg完整走一遍
+预过滤、原始日志、模板/大模型解析、入库、飞书缓冲写入和微信回复，AI和飞书接口替换为本地桩，
+统计吞吐量和各阶段的p50/p95/p99延迟
+
+用法:
+    python -m benchmarks.e2e_load --messages 2000 --rate 200 --llm-ratio 0.3
+    python -m benchmarks.e2e_load --raw-log raw_log --rate 0 --ai-latency-ms 800 --json e2e.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+import numpy as np
+from openai.types.chat import ChatCompletion
+
+from ai.core.base import AIResponse, AIService
+from benchmarks.ledger_gen import generate_frame, write_sqlite
+from config import WX_ID
+from wx_transport import SimMsg, SimulatedTransport
+
+_BATCH_ITEM = re.compile(r'<item index="(\d+)">(.*?)</item>', re.S)
+_STUB_DES = re.compile(r'(支出|收入)人民币([\d.]+)元，商户：([^。<]+)')
+_STUB_SOURCE = re.compile(r'<sourcedisplayname>([^<]+)</sourcedisplayname>')
+
+
+class LatencyRecorder:
+    """按阶段记录每次耗时，汇总为分位数"""
+
+    def __init__(self):
+        self._samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, elapsed: float) -> None:
+        with self._lock:
+            self._samples.setdefault(stage, []).append(elapsed)
+
+    def timed(self, stage: str, func: Callable) -> Callable:
+        """包装函数，每次调用记录一次耗时"""
+
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+
+        return wrapper
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+        result = {}
+        for stage, values in samples.items():
+            ms = np.asarray(values) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            result[stage] = {
+                'count': len(values),
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+                'max_ms': round(float(ms.max()), 3),
+            }
+        return result
+
+
+class StubAIService(AIService):
+    """本地AI桩：按固定格式解析消息，模拟每次请求和每条消息的耗时"""
+    name = "stub"
+
+    def __init__(self, latency: float = 0.5, per_item: float = 0.02, recorder: LatencyRecorder = None):
+        self.latency = latency
+        self.per_item = per_item
+        self.recorder = recorder
+
+    def is_available(self) -> bool:
+        return True
+
+    def get_response(self, messages) -> ChatCompletion:
+        """按OpenAI的消息格式调用chat，返回只有一个choice的ChatCompletion"""
+        sys_prompt = next((m["content"] for m in messages if m["role"] == "system"), "")
+        content = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        response = self.chat(content, sys_prompt)
+        return ChatCompletion.model_validate({
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": self.name,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": response.content}}],
+        })
+
+    def chat(self, content: str, sys_prompt: str = "", json_format: bool = True, **kwargs) -> AIResponse:
+        started = time.perf_counter()
+        items = _BATCH_ITEM.findall(content)
+        time.sleep(self.latency + self.per_item * max(1, len(items)))
+        if items:
+            results = [dict(self._parse(body), index=int(index)) for index, body in items]
+            response = AIResponse(json.dumps({"results": results}, ensure_ascii=False))
+        else:
+            response = AIResponse(json.dumps(self._parse(content), ensure_ascii=False))
+        if self.recorder:
+            self.recorder.record('ai.request', time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def _parse(content: str) -> dict:
+        match = _STUB_DES.search(content)
+        source = _STUB_SOURCE.search(content)
+        if not match or not source:
+            return {"标题": "", "publisher": ""}
+        return {
+            "标题": "交易提醒",
+            "amount": float(match.group(2)),
+            "transaction_time": "",
+            "publisher": source.group(1),
+            "type": match.group(1),
+            "remark": match.group(3),
+        }
+
+
+class StubFeishuTable:
+    """飞书表格桩，模拟一次写入请求的耗时"""
+
+    def __init__(self, latency: float = 0.1, recorder: LatencyRecorder = None):
+        self.latency = latency
+        self.recorder = recorder
+        self.rows = 0
+
+    def insert_data(self, values):
+        started = time.perf_counter()
+        time.sleep(self.latency)
+        self.rows += len(values)
+        if self.recorder:
+            self.recorder.record('feishu.insert', time.perf_counter() - started)
+        return {'code': 0}
+
+
+def _appmsg(source: str, title: str, des: str) -> str:
+    return (f'<msg><appmsg appid="" sdkver="0"><title>{title}</title><des>{des}</des><type>5</type></appmsg>'
+            f'<sourcedisplayname>{source}</sourcedisplayname></msg>')
+
+
+def generate_messages(count: int, llm_ratio: float = 0.3, noise_ratio: float = 0.2,
+                      command_ratio: float = 0.01, seed: int = 42) -> List[SimMsg]:
+    """
+    生成压测消息：模板可以解析的交通银行提醒、需要大模型解析的其他银行提醒、
+    非银行的分享消息，以及少量自己发送的查询命令
+
+    Args:
+        count: 消息数
+        llm_ratio: 银行提醒中需要大模型解析的比例
+        noise_ratio: 非银行消息的比例
+        command_ratio: 查询命令的比例
+        seed: 随机种子
+    """
+    rng = np.random.default_rng(seed)
+    kinds = rng.random(count)
+    paths = rng.random(count)
+    amounts = np.round(rng.lognormal(3.5, 1.0, count), 2)
+    messages = []
+    for i in range(count):
+        if kinds[i] < command_ratio:
+            messages.append(SimMsg(type=1, content='#今日数据', sender=WX_ID, id=i))
+        elif kinds[i] < command_ratio + noise_ratio:
+            messages.append(SimMsg(type=49, content=_appmsg('某某公众号', f'文章{i}', '分享一篇文章'),
+                                   sender='gh_article', id=i))
+        elif paths[i] < llm_ratio:
+            des = f'您尾号1234的账户于今日支出人民币{amounts[i]:.2f}元，商户：商户{i}。'
+            messages.append(SimMsg(type=49, content=_appmsg('示例农商银行', '交易提醒', des),
+                                   sender='gh_sim_rcb', id=i))
+        else:
+            des = f'交易时间：今日\n交易类型：消费\n交易金额：人民币{amounts[i]:.2f}\n交易说明：商户{i}'
+            messages.append(SimMsg(type=49, content=_appmsg('交通银行', '交易提醒', des),
+                                   sender='gh_sim_bocom', id=i))
+    return messages
+
+
+def run(messages: List[SimMsg], rate: float, tmp_dir: str, seed_rows: int = 10000,
+        ai_latency: float = 0.5, ai_per_item: float = 0.02, feishu_latency: float = 0.1,
+        send_latency: float = 0.0) -> dict:
+    """
+    在临时库上驱动一次完整的压测
+
+    Returns:
+        dict: 吞吐量、各阶段延迟分位数和各组件的统计
+    """
+    from ai.core.provider import AIProvider
+    from ai.services.factory import AIServiceFactory
+    from analysis.finance_analyzer import FinanceAnalyzer
+    from analysis.ledger_store import LedgerStore
+    from db.base import engine as default_engine
+    from db.services import DailyRollupService, TransactionService
+    from db.session import SessionLocal
+    from feishu.sheet_writer import BufferedSheetWriter
+    from finbot import FinBot
+    from message_parser import MessageParser
+    from raw_log import RawMessageLog
+
+    recorder = LatencyRecorder()
+    engine = write_sqlite(generate_frame(seed_rows), os.path.join(tmp_dir, 'e2e.db'))
+    # 所有服务都通过SessionLocal访问数据库，改为绑定到临时库
+    SessionLocal.configure(bind=engine)
+    try:
+        DailyRollupService().rebuild()
+        stub_ai = StubAIService(ai_latency, ai_per_item, recorder)
+        for provider in AIProvider.get_priority_list():
+            AIServiceFactory.register_instance(provider, stub_ai)
+
+        service = TransactionService()
+        table = StubFeishuTable(feishu_latency, recorder)
+        sheet_writer = BufferedSheetWriter(table)
+        analyzer = FinanceAnalyzer(store=LedgerStore(path=os.path.join(tmp_dir, 'ledger.npz'), service=service))
+        parser = MessageParser(analyzer=analyzer, service=service, feishu_table=table, sheet_writer=sheet_writer,
+                               raw_log=RawMessageLog(os.path.join(tmp_dir, 'raw_log')))
+        # 候选模板写入临时目录，不污染项目中的文件
+        parser.extractor.proposal_file = os.path.join(tmp_dir, 'bank_template_proposals.json')
+        transport = SimulatedTransport(messages, rate=rate, send_latency=send_latency)
+        bot = FinBot(transport=transport, msg_parser=parser)
+        if bot.wcf is not transport:
+            raise RuntimeError("FinBot已经以其他传输层初始化，压测需要在新进程中运行")
+
+        # 包装各阶段，记录每次调用的耗时
+        # 端到端延迟按消息ID记录投递时间，重放的日志中可能有内容完全相同的消息
+        delivered: Dict[int, float] = {}
+        # 处理线程当前处理的消息ID，模板解析在同一线程中同步完成
+        current = threading.local()
+        # 批量解析按提交顺序回调，依次对应提交时的消息ID
+        submitted = deque()
+        submit_lock = threading.Lock()
+        parser.msg_filter.accept = recorder.timed('filter', parser.msg_filter.accept)
+        parser.raw_log.append = recorder.timed('raw_log.append', parser.raw_log.append)
+        parser.extractor.extract = recorder.timed('template.extract', parser.extractor.extract)
+        parser.service.create = recorder.timed('db.create', parser.service.create)
+        parser.sheet_writer.append = recorder.timed('sheet.enqueue', parser.sheet_writer.append)
+        parser.batcher.extract_func = recorder.timed('llm.batch', parser.batcher.extract_func)
+        on_extracted = parser.batcher.on_result
+        submit = parser.batcher.submit
+        parse_msg_xml = parser.parse_msg_xml
+        process = bot.processMsg
+
+        def tracked_submit(content, *args):
+            # 记录ID和放入队列需要在同一把锁内完成，保证两者顺序一致
+            with submit_lock:
+                submitted.append(current.msg_id)
+                return submit(content, *args)
+
+        def timed_on_extracted(content, data, *args):
+            msg_id = submitted.popleft()
+            result = on_extracted(content, data, *args)
+            if result is not None:
+                recorder.record('e2e.llm', time.perf_counter() - delivered[msg_id])
+            return result
+
+        def timed_parse_msg_xml(content, *args):
+            result = parse_msg_xml(content, *args)
+            if result is not None:
+                recorder.record('e2e.template', time.perf_counter() - delivered[current.msg_id])
+            return result
+
+        def timed_process(msg):
+            started = time.perf_counter()
+            delivered[msg.id] = msg.delivered_at
+            current.msg_id = msg.id
+            recorder.record('queue', started - msg.delivered_at)
+            process(msg)
+            recorder.record('process', time.perf_counter() - started)
+
+        parser.batcher.submit = tracked_submit
+        parser.batcher.on_result = timed_on_extracted
+        parser.parse_msg_xml = timed_parse_msg_xml
+        bot.pool.handler = timed_process
+
+        started = time.perf_counter()
+        bot.enableReceivingMsg()
+        transport.wait_delivered()
+        while transport.pending():
+            time.sleep(0.01)
+        # 依次排空各级队列：处理线程池 -> 批量解析 -> 飞书写入 -> 微信发送
+        bot.pool.shutdown(wait=True, timeout=600)
+        parser.batcher.close(timeout=600)
+        elapsed = time.perf_counter() - started
+        sheet_writer.close()
+        bot.outbox.close(timeout=600)
+        transport.cleanup()
+        parser.raw_log.close()
+
+        stages = recorder.summary()
+        return {
+            'messages': len(messages),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_msg_s': round(len(messages) / elapsed, 1) if elapsed else 0.0,
+            'stages': stages,
+            'pool': bot.pool.stats(),
+            'batcher': parser.batcher.stats(),
+            'outbox': bot.outbox.stats(),
+            'feishu_rows': table.rows,
+            'wechat_sent': len(transport.sent),
+        }
+    finally:
+        SessionLocal.configure(bind=default_engine)
+        engine.dispose()
+
+
+def print_report(report: dict) -> None:
+    print(f"\n消息数 {report['messages']}，耗时 {report['elapsed_s']}s，吞吐量 {report['throughput_msg_s']} 条/秒")
+    print(f"飞书写入 {report['feishu_rows']} 行，微信发送 {report['wechat_sent']} 条，"
+          f"批量解析 {report['batcher']['batches']} 批（平均 {report['batcher']['avg_batch_size']} 条）")
+    print(f"\n{'阶段':<20}{'次数':>8}{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}")
+    for stage, stat in report['stages'].items():
+        print(f"{stage:<22}{stat['count']:>8}{stat['p50_ms']:>12.3f}{stat['p95_ms']:>12.3f}"
+              f"{stat['p99_ms']:>12.3f}{stat['max_ms']:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息链路端到端压测")
+    parser.add_argument('--messages', type=int, default=2000, help="生成的消息数")
+    parser.add_argument('--raw-log', help="使用原始消息日志目录中录制的消息，代替生成的消息")
+    parser.add_argument('--rate', type=float, default=200, help="每秒投递的消息数，0为不限速")
+    parser.add_argument('--llm-ratio', type=float, default=0.3, help="银行提醒中需要大模型解析的比例")
+    parser.add_argument('--noise-ratio', type=float, default=0.2, help="非银行消息的比例")
+    parser.add_argument('--command-ratio', type=float, default=0.01, help="查询命令的比例")
+    parser.add_argument('--seed-rows', type=int, default=10000, help="临时库中预置的交易笔数")
+    parser.add_argument('--ai-latency-ms', type=float, default=500, help="AI桩每次请求的耗时")
+    parser.add_argument('--ai-per-item-ms', type=float, default=20, help="AI桩每条消息增加的耗时")
+    parser.add_argument('--feishu-latency-ms', type=float, default=100, help="飞书桩每次写入的耗时")
+    parser.add_argument('--send-latency-ms', type=float, default=0, help="模拟微信发送的耗时")
+    parser.add_argument('--json', help="把结果写入JSON文件")
+    args = parser.parse_args()
+
+    if args.raw_log:
+        from raw_log import RawMessageLog
+        transport = SimulatedTransport.from_raw_log(RawMessageLog(args.raw_log, read_only=True).replay())
+        messages = transport.messages
+    else:
+        messages = generate_messages(args.messages, args.llm_ratio, args.noise_ratio, args.command_ratio)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report = run(messages, args.rate, tmp_dir, seed_rows=args.seed_rows,
+                     ai_latency=args.ai_latency_ms / 1000, ai_per_item=args.ai_per_item_ms / 1000,
+                     feishu_latency=args.feishu_latency_ms / 1000, send_latency=args.send_latency_ms / 1000)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
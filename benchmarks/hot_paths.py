@@ -0,0 +1,215 @@
+"""
+热点路径基准：在合成账本上计时分析器、交易查询、卡片模板和消息格式化，结果写入JSON基线，
+之后的提交可以与基线对比找出性能回退
+
+用法:
+    python -m benchmarks.hot_paths --rows 10000 100000 --save
+    python -m benchmarks.hot_paths --rows 10000 100000 --compare [--threshold 0.2] [--min-delta-ms 0.5]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+
+from benchmarks.ledger_gen import BASE_TIME, generate_frame, write_csv, write_sqlite
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+class _NullBot:
+    """代替FinBot接收格式化后的消息，只统计条数"""
+
+    def __init__(self):
+        self.sent = 0
+
+    def send_text_msg(self, msg: str, *args, **kwargs):
+        self.sent += 1
+
+
+def measure(func: Callable, repeat: int) -> Dict[str, float]:
+    """执行repeat次，返回耗时统计（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'repeat': repeat,
+    }
+
+
+def run_size(rows: int, repeat: int, tmp_dir: str) -> Dict[str, dict]:
+    """
+    在rows行的合成账本上计时全部热点路径
+
+    Args:
+        rows: 交易笔数
+        repeat: 每项重复次数，整体加载类的项目最多重复3次
+        tmp_dir: 存放合成数据的临时目录
+    Returns:
+        Dict[str, dict]: 项目名 -> 耗时统计
+    """
+    from db.base import engine as default_engine
+    from db.session import SessionLocal
+    from analysis.finance_analyzer import FinanceAnalyzer
+    from analysis.ledger_store import LedgerStore
+    from db.services import TransactionService, DailyRollupService
+    from message_parser import MessageParser
+
+    frame = generate_frame(rows)
+    csv_path = write_csv(frame, os.path.join(tmp_dir, f'ledger-{rows}.csv'))
+    engine = write_sqlite(frame, os.path.join(tmp_dir, f'ledger-{rows}.db'))
+    # 所有服务都通过SessionLocal访问数据库，改为绑定到合成库
+    SessionLocal.configure(bind=engine)
+    try:
+        rollups = DailyRollupService()
+        rollups.rebuild()
+        service = TransactionService()
+
+        middle = BASE_TIME + timedelta(days=180)
+        day = middle.strftime('%Y%m%d')
+        month_end = (middle + timedelta(days=29)).strftime('%Y%m%d')
+        cn_day = middle.strftime('%Y年%m月%d日')
+        cn_month_end = (middle + timedelta(days=30)).strftime('%Y年%m月%d日')
+        load_repeat = min(repeat, 3)
+
+        csv_analyzer = FinanceAnalyzer(csv_path)
+        store = LedgerStore(path=os.path.join(tmp_dir, f'ledger-{rows}.npz'), service=service)
+        store_analyzer = FinanceAnalyzer(store=store, rollups=rollups)
+        parser = MessageParser(analyzer=store_analyzer, service=service,
+                               feishu_table=object(), sheet_writer=object())
+        day_records = store_analyzer.get_date_transactions(day)
+        day_transactions = service.get_transactions_by_date(cn_day)
+        bot = _NullBot()
+
+        results = {
+            'analyzer.load_data': measure(lambda: csv_analyzer.load_data(csv_path), load_repeat),
+            'analyzer.rebuild_store': measure(lambda: (store.rebuild(), store_analyzer.load_store()), load_repeat),
+            'analyzer.get_today_summary[store]': measure(lambda: store_analyzer.get_today_summary(day), repeat),
+            'analyzer.get_today_summary[csv]': measure(lambda: csv_analyzer.get_today_summary(day), repeat),
+            'analyzer.get_date_transactions[day]': measure(lambda: store_analyzer.get_date_transactions(day), repeat),
+            'analyzer.get_date_transactions[30d]': measure(
+                lambda: store_analyzer.get_date_transactions(day, month_end), repeat),
+            'service.get_transactions_by_date[day]': measure(lambda: service.get_transactions_by_date(cn_day), repeat),
+            'service.get_transactions_by_date[30d]': measure(
+                lambda: service.get_transactions_by_date(cn_day, cn_month_end), repeat),
+            'service.get_transactions_summary_by_date[30d]': measure(
+                lambda: service.get_transactions_summary_by_date(cn_day, cn_month_end), repeat),
+            'service.get_ledger_stamp': measure(service.get_ledger_stamp, repeat),
+            'service.transfer_template.to_json[day]': measure(
+                lambda: service.transfer_template(day_transactions).to_json(), repeat),
+            'parser.send_batch_data[day]': measure(lambda: parser._send_batch_data(day_records, bot), repeat),
+        }
+    finally:
+        SessionLocal.configure(bind=default_engine)
+        engine.dispose()
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(BASELINE_FILE)).stdout.strip()
+    except OSError:
+        return ''
+
+
+def run(sizes, repeat: int) -> dict:
+    """依次在每个规模上运行，返回可写入基线文件的结果"""
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+        },
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in sizes:
+            print(f"运行 {rows} 行...")
+            report['results'][str(rows)] = run_size(rows, repeat, tmp_dir)
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float, min_delta_ms: float = 0.5) -> list:
+    """
+    与基线比较中位数耗时
+
+    Args:
+        report: 本次结果
+        baseline: 基线结果
+        threshold: 超过基线多少比例视为回退，例如0.2表示慢20%
+        min_delta_ms: 绝对差值小于该毫秒数时不视为回退，避免亚毫秒级项目的抖动误报
+    Returns:
+        list: 回退的项目，每项为(规模, 项目名, 基线毫秒, 本次毫秒)
+    """
+    regressions = []
+    for rows, items in report['results'].items():
+        base_items = baseline.get('results', {}).get(rows, {})
+        for name, stats in items.items():
+            base = base_items.get(name)
+            if not base:
+                continue
+            ratio = stats['median_ms'] / base['median_ms'] if base['median_ms'] else 1.0
+            slower = ratio > 1 + threshold and stats['median_ms'] - base['median_ms'] >= min_delta_ms
+            flag = '  <-- 回退' if slower else ''
+            print(f"{rows:>8} {name:<48}{base['median_ms']:>12.3f}{stats['median_ms']:>12.3f}{ratio:>8.2f}x{flag}")
+            if flag:
+                regressions.append((rows, name, base['median_ms'], stats['median_ms']))
+    return regressions
+
+
+def print_report(report: dict) -> None:
+    for rows, items in report['results'].items():
+        print(f"\n== {rows} 行 ==")
+        print(f"{'项目':<50}{'min(ms)':>12}{'median(ms)':>12}")
+        for name, stats in items.items():
+            print(f"{name:<50}{stats['min_ms']:>12.3f}{stats['median_ms']:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点路径基准")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                        help="账本规模，可指定多个，支持10000到5000000")
+    parser.add_argument('--repeat', type=int, default=10, help="每项重复次数")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="基线文件路径")
+    parser.add_argument('--save', action='store_true', help="把本次结果保存为基线")
+    parser.add_argument('--compare', action='store_true', help="与基线比较，出现回退时返回非零退出码")
+    parser.add_argument('--threshold', type=float, default=0.2, help="判定回退的比例")
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help="判定回退的最小绝对差值（毫秒）")
+    args = parser.parse_args()
+
+    report = run(args.rows, args.repeat)
+    print_report(report)
+    exit_code = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"基线文件不存在: {args.baseline}")
+            exit_code = 2
+        else:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+            print(f"\n与基线比较 (commit {baseline.get('meta', {}).get('commit', '')}):")
+            print(f"{'rows':>8} {'项目':<48}{'基线(ms)':>12}{'本次(ms)':>12}{'比例':>9}")
+            if compare(report, baseline, args.threshold, args.min_delta_ms):
+                exit_code = 1
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n已保存基线: {args.baseline}")
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+合成账本生成器：按固定随机种子生成交易数据，写入与db/models/transaction.py一致的SQLite库，
+或FinanceAnalyzer读取的CSV格式（时间、类型、金额、备注）
+
+用法:
+    python -m benchmarks.ledger_gen --rows 100000 --sqlite /tmp/ledger.db --csv /tmp/ledger.csv
+"""
+import argparse
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from db.base import Base, create_db_engine
+from db.models import Transaction
+from db.models.transaction import TIME_FORMAT
+
+BASE_TIME = datetime(2024, 1, 1)
+PUBLISHERS = ('交通银行', '招商银行')
+REMARKS = ('美团外卖', '滴滴出行', '盒马鲜生', '京东商城', '中国石化', '便利店', '工资', '转账')
+# 每批写入SQLite的行数
+INSERT_CHUNK = 50000
+
+
+def generate_frame(rows: int, days: int = 365, seed: int = 42) -> pd.DataFrame:
+    """
+    生成合成账本，交易时间在days天内随机分布并按时间排序，约15%为收入
+
+    Args:
+        rows: 交易笔数
+        days: 覆盖的天数
+        seed: 随机种子，相同参数生成相同数据
+    Returns:
+        pd.DataFrame: 列为transaction_at、type、amount_cents、remark、publisher
+    """
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.integers(0, days * 86400, rows))
+    return pd.DataFrame({
+        'transaction_at': pd.Timestamp(BASE_TIME) + pd.to_timedelta(seconds, unit='s'),
+        'type': np.where(rng.random(rows) < 0.15, '收入', '支出'),
+        'amount_cents': rng.integers(100, 50000, rows),
+        'remark': rng.choice(REMARKS, rows),
+        'publisher': rng.choice(PUBLISHERS, rows),
+    })
+
+
+def write_csv(frame: pd.DataFrame, path: str) -> str:
+    """按飞书导出的CSV布局写入：时间、类型、金额、备注，最新的交易在最上面"""
+    pd.DataFrame({
+        '时间': frame['transaction_at'].dt.strftime(TIME_FORMAT),
+        '类型': frame['type'],
+        '金额': np.char.mod('%.2f', frame['amount_cents'].to_numpy() / 100),
+        '备注': frame['remark'],
+    }).iloc[::-1].to_csv(path, index=False, encoding='utf-8')
+    return path
+
+
+def write_sqlite(frame: pd.DataFrame, path: str) -> Engine:
+    """
+    写入一个新的SQLite库，表结构与项目的模型一致，字符串列和类型化的列都会填充
+
+    Args:
+        frame: generate_frame生成的数据
+        path: 数据库文件路径，已存在时会被覆盖
+    Returns:
+        Engine: 使用config.SQLITE_PRAGMAS的数据库引擎
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    engine = create_db_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    table = Transaction.__table__
+    for start in range(0, len(frame), INSERT_CHUNK):
+        chunk = frame.iloc[start:start + INSERT_CHUNK]
+        times = chunk['transaction_at'].to_numpy().astype('datetime64[us]').tolist()
+        cents = chunk['amount_cents'].to_numpy()
+        rows = [
+            {
+                'amount': amount, 'amount_cents': int(cent),
+                'transaction_time': at.strftime(TIME_FORMAT), 'transaction_at': at,
+                'publisher': publisher, 'remark': remark, 'type': type_,
+            }
+            for at, cent, amount, type_, remark, publisher in zip(
+                times, cents, np.char.mod('%.2f', cents / 100),
+                chunk['type'], chunk['remark'], chunk['publisher'])
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(table), rows)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成账本")
+    parser.add_argument('--rows', type=int, default=100000, help="交易笔数")
+    parser.add_argument('--days', type=int, default=365, help="覆盖的天数")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子")
+    parser.add_argument('--sqlite', help="SQLite输出路径")
+    parser.add_argument('--csv', help="CSV输出路径")
+    args = parser.parse_args()
+
+    frame = generate_frame(args.rows, args.days, args.seed)
+    if args.csv:
+        write_csv(frame, args.csv)
+        print(f"已写入CSV: {args.csv}")
+    if args.sqlite:
+        write_sqlite(frame, args.sqlite).dispose()
+        print(f"已写入SQLite: {args.sqlite}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+SQLite性能参数对比：在临时数据库上分别用默认配置和config.SQLITE_PRAGMAS并发读写，输出吞吐量
+
+用法:
+    python -m benchmarks.sqlite_profile [--seconds 5] [--writers 2] [--readers 4]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, func, and_
+from sqlalchemy.exc import OperationalError
+
+from config import SQLITE_PRAGMAS
+from db.base import Base, create_db_engine
+from db.models import Transaction
+
+BASE_TIME = datetime(2025, 1, 1)
+
+
+def _writer(engine, stop: threading.Event, stats: dict, lock: threading.Lock):
+    table = Transaction.__table__
+    ops = errors = 0
+    while not stop.is_set():
+        at = BASE_TIME + timedelta(minutes=random.randint(0, 60 * 24 * 90))
+        cents = random.randint(100, 100000)
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(table).values(
+                    amount=f"{cents / 100:.2f}", amount_cents=cents,
+                    transaction_time=at.strftime('%Y年%m月%d日 %H:%M:%S'), transaction_at=at,
+                    publisher='交通银行', remark='benchmark', type=random.choice(('支出', '收入'))
+                ))
+            ops += 1
+        except OperationalError:
+            errors += 1
+    with lock:
+        stats['writes'] += ops
+        stats['write_errors'] += errors
+
+
+def _reader(engine, stop: threading.Event, stats: dict, lock: threading.Lock):
+    table = Transaction.__table__
+    ops = errors = 0
+    while not stop.is_set():
+        start = BASE_TIME + timedelta(days=random.randint(0, 89))
+        stmt = (
+            select(table.c.type, func.sum(table.c.amount_cents))
+            .where(and_(table.c.transaction_at >= start, table.c.transaction_at < start + timedelta(days=1)))
+            .group_by(table.c.type)
+        )
+        try:
+            with engine.connect() as conn:
+                conn.execute(stmt).all()
+            ops += 1
+        except OperationalError:
+            errors += 1
+    with lock:
+        stats['reads'] += ops
+        stats['read_errors'] += errors
+
+
+def run_profile(pragmas: dict, seconds: float, writers: int, readers: int, seed_rows: int = 5000) -> dict:
+    """在新的临时数据库上执行一轮并发读写，返回吞吐量统计"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}", pragmas=pragmas)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            rows = []
+            for i in range(seed_rows):
+                at = BASE_TIME + timedelta(minutes=i * 26)
+                rows.append({'amount': '1.00', 'amount_cents': 100, 'transaction_time': at.strftime('%Y年%m月%d日 %H:%M:%S'),
+                             'transaction_at': at, 'publisher': '交通银行', 'remark': 'seed', 'type': '支出'})
+            conn.execute(insert(Transaction.__table__), rows)
+
+        stats = {'writes': 0, 'reads': 0, 'write_errors': 0, 'read_errors': 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+        threads = [threading.Thread(target=_writer, args=(engine, stop, stats, lock)) for _ in range(writers)]
+        threads += [threading.Thread(target=_reader, args=(engine, stop, stats, lock)) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    stats['writes_per_sec'] = round(stats['writes'] / seconds, 1)
+    stats['reads_per_sec'] = round(stats['reads'] / seconds, 1)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite性能参数对比")
+    parser.add_argument('--seconds', type=float, default=5, help="每轮运行时长")
+    parser.add_argument('--writers', type=int, default=2, help="写线程数")
+    parser.add_argument('--readers', type=int, default=4, help="读线程数")
+    args = parser.parse_args()
+
+    results = {
+        'default': run_profile({}, args.seconds, args.writers, args.readers),
+        'tuned': run_profile(SQLITE_PRAGMAS, args.seconds, args.writers, args.readers),
+    }
+    print(f"{'profile':<10}{'writes/s':>12}{'reads/s':>12}{'write_err':>12}{'read_err':>12}")
+    for name, stats in results.items():
+        print(f"{name:<10}{stats['writes_per_sec']:>12}{stats['reads_per_sec']:>12}"
+              f"{stats['write_errors']:>12}{stats['read_errors']:>12}")
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -8,4 +8,97 @@ TEMPLATE_ID = ""
 WX_ID = ""
 OPEN_AI = ""
 DEEP_SEEK = ""
-CLAUDE = ""
\ No newline at end of file
+CLAUDE = ""
+
+# 银行服务号白名单，可填写公众号名称或gh_开头的原始ID；为空时按名称以"银行"结尾判断
+BANK_ACCOUNTS = []
+# 需要解析的银行消息标题
+BANK_MSG_TITLES = ["交易提醒"]
+
+# 消息处理线程数，同一发送者/群的消息始终由同一线程按顺序处理
+WORKER_POOL_SIZE = 4
+# 每个处理线程的队列长度
+WORKER_QUEUE_SIZE = 200
+# 队列满时的策略: block(阻塞接收线程) / drop(丢弃新消息) / spill(写入溢出文件，下次启动时重新处理)
+WORKER_FULL_POLICY = "block"
+
+# 大模型解析结果缓存，保存在data.db中
+LLM_CACHE_TTL_DAYS = 30
+LLM_CACHE_MAX_ENTRIES = 10000
+
+# SQLite性能参数，每次建立连接时执行对应的PRAGMA，置为空字典则使用SQLite默认配置
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,  # 256MB
+    "cache_size": -65536,  # 负数单位为KB，约64MB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # 毫秒
+}
+# 数据库连接池
+SQLITE_POOL_SIZE = 8
+SQLITE_MAX_OVERFLOW = 8
+
+# 飞书表格批量写入：满多少行或间隔多少秒写入一次，失败后按指数退避重试，
+# 连续失败FEISHU_RETRY_MAX_ATTEMPTS次后逐行重试一次，仍失败的行标记为失败不再重试，后面的数据继续写入
+FEISHU_BATCH_SIZE = 20
+FEISHU_FLUSH_INTERVAL = 2
+FEISHU_RETRY_MAX_BACKOFF = 300
+FEISHU_RETRY_MAX_ATTEMPTS = 8
+
+# 飞书HTTP连接池大小和请求超时（秒）
+FEISHU_HTTP_POOL_SIZE = 10
+FEISHU_HTTP_TIMEOUT = 10
+
+# 飞书菜单事件处理线程数、每个线程的队列长度（满时丢弃新事件）和处理器默认超时（秒，超时只告警）
+FEISHU_EVENT_WORKERS = 2
+FEISHU_EVENT_QUEUE_SIZE = 50
+FEISHU_EVENT_TIMEOUT = 10
+
+# 飞书交易卡片每页条数，以及缓存的已渲染页数（账本变化后缓存自动失效）
+FEISHU_CARD_PAGE_SIZE = 20
+FEISHU_CARD_CACHE_SIZE = 128
+
+# 微信发送队列：每秒最多发送的消息数、允许突发的消息数、队列长度、每条消息最多发送次数和首次重试间隔（秒）
+WX_SEND_RATE = 1.0
+WX_SEND_BURST = 3
+WX_SEND_QUEUE_SIZE = 500
+WX_SEND_RETRY = 3
+WX_SEND_RETRY_BACKOFF = 1
+# 多笔交易合并为一条消息时，单条消息的最大字节数（UTF-8）
+WX_MSG_MAX_BYTES = 2000
+
+# Claude工具调用的最大轮数，超过后不再执行工具
+CLAUDE_MAX_TOOL_ROUNDS = 5
+
+# AI流式回复：至少累积多少字才在句子结束处发送一段，以及单段的最大字节数（UTF-8）
+AI_STREAM_FLUSH_CHARS = 60
+AI_STREAM_MAX_BYTES = 2000
+
+# AI服务熔断：连续失败多少次后熔断，熔断多少秒后放行一个探测请求
+AI_BREAKER_FAILURES = 3
+AI_BREAKER_COOLDOWN = 60
+
+# @AI分析回答的缓存条数，同一天内账本没有变化时相同的问题直接返回缓存的回答，为0时不缓存
+AI_ANSWER_CACHE_SIZE = 64
+
+# 大模型批量解析交易提醒：最多攒多少条或等待多少毫秒后合并为一个请求
+AI_BATCH_SIZE = 10
+AI_BATCH_WAIT_MS = 300
+# 批量请求的输出token上限：每条消息预留的token数和总上限
+AI_BATCH_TOKENS_PER_ITEM = 256
+AI_BATCH_MAX_TOKENS = 8192
+
+# 原始消息日志：单个段的最大字节数，以及是否压缩已写满的段
+RAW_LOG_SEGMENT_BYTES = 16 * 1024 * 1024
+RAW_LOG_COMPRESS = True
+# 重放原始消息日志时并发处理的批数
+REPLAY_WORKERS = 4
+# 重放去重：交易按来源消息的标识精确去重；没有记录来源的旧交易，时间与消息接收时间相差不超过多少秒，
+# 且金额、类型、发布者和备注相同时视为已入库，每笔旧交易只匹配一条消息
+REPLAY_DEDUP_WINDOW = 120
+
+# 指标接口：Prometheus文本格式，监听地址和端口，端口为0时不启动；分位数按每个指标最近多少个样本计算
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+METRICS_WINDOW = 1024
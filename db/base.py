@@ -1,7 +1,10 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 import os
 
+from config import SQLITE_PRAGMAS, SQLITE_POOL_SIZE, SQLITE_MAX_OVERFLOW
+
 # 获取项目根目录
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # 数据库文件路径
@@ -22,17 +25,49 @@ def ensure_db_file_exists():
 # 确保数据库文件存在
 ensure_db_file_exists()
 
+def create_db_engine(url: str = DATABASE_URL, pragmas: dict = SQLITE_PRAGMAS,
+                     pool_size: int = SQLITE_POOL_SIZE, max_overflow: int = SQLITE_MAX_OVERFLOW) -> Engine:
+    """
+    创建数据库引擎，并在每个新连接上应用SQLite性能参数
+
+    Args:
+        url: 数据库连接地址
+        pragmas: 连接建立后执行的PRAGMA，为空则使用SQLite默认配置
+        pool_size: 连接池常驻连接数
+        max_overflow: 连接池允许临时超出的连接数
+    """
+    pragmas = dict(pragmas or {})
+    busy_timeout = pragmas.get("busy_timeout")
+    connect_args = {"check_same_thread": False}  # 允许多线程访问
+    if busy_timeout is not None:
+        connect_args["timeout"] = busy_timeout / 1000
+    db_engine = create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        echo=False  # 设置为True可以看到SQL语句
+    )
+    if pragmas:
+        @event.listens_for(db_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    return db_engine
+
 # 创建数据库引擎
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},  # 允许多线程访问
-    echo=False  # 设置为True可以看到SQL语句
-)
+engine = create_db_engine()
 
 # 创建declarative基类
 Base = declarative_base()
 
 def init_db():
     """初始化数据库（创建所有表）"""
+    import db.models  # 确保所有模型都已注册到Base.metadata
     Base.metadata.create_all(bind=engine)
+    # 旧数据库补充新增的列并回填数据
+    from db.migrate import migrate
+    migrate()
     print("数据库表已初始化") 
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+数据库迁移工具，可重复执行，中断后重新执行会从未完成的记录继续
+
+用法:
+    python -m db.migrate [--batch-size 500] [--rebuild-rollups]
+"""
+import argparse
+
+from sqlalchemy import text, update, bindparam
+
+from db.base import Base, engine
+
+# 需要补充的列: 列名 -> 列定义
+TRANSACTION_COLUMNS = {
+    'amount_cents': 'INTEGER',
+    'transaction_at': 'DATETIME',
+    'source_id': 'VARCHAR(32)',
+}
+SHEET_OUTBOX_COLUMNS = {
+    'failed': 'BOOLEAN NOT NULL DEFAULT 0',
+}
+
+
+def _add_columns(conn, table: str, columns: dict) -> None:
+    """为表补充缺少的列"""
+    existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+    for name, ddl in columns.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+            print(f"已添加列: {table}.{name}")
+
+
+def upgrade_schema() -> None:
+    """为旧的transactions表补充类型化的列、来源消息标识和索引，为发件箱补充失败标记"""
+    with engine.begin() as conn:
+        _add_columns(conn, 'transactions', TRANSACTION_COLUMNS)
+        _add_columns(conn, 'sheet_outbox', SHEET_OUTBOX_COLUMNS)
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_transactions_transaction_at_type "
+            "ON transactions (transaction_at, type)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_transactions_transaction_at_id "
+            "ON transactions (transaction_at, id)"
+        ))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_transactions_source_id "
+            "ON transactions (source_id)"
+        ))
+
+
+def backfill_typed_columns(batch_size: int = 500) -> int:
+    """
+    按批回填amount_cents和transaction_at，每批单独提交
+
+    Args:
+        batch_size: 每批处理的行数
+    Returns:
+        int: 本次回填的行数
+    """
+    from db.models.transaction import Transaction, to_cents, parse_time
+
+    table = Transaction.__table__
+    # 通过Core语句写入，保证DateTime的存储格式与ORM写入的一致
+    update_stmt = (
+        update(table)
+        .where(table.c.id == bindparam('b_id'))
+        .values(amount_cents=bindparam('b_amount_cents'), transaction_at=bindparam('b_transaction_at'))
+    )
+    total = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, amount, transaction_time FROM transactions "
+                "WHERE transaction_at IS NULL AND id > :last_id ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": batch_size}).all()
+            if not rows:
+                break
+            params = []
+            for id_, amount, transaction_time in rows:
+                transaction_at = parse_time(transaction_time)
+                if transaction_at is None:
+                    print(f"无法解析交易时间，跳过: id={id_}, transaction_time={transaction_time}")
+                    continue
+                params.append({"b_id": id_, "b_amount_cents": to_cents(amount), "b_transaction_at": transaction_at})
+            if params:
+                conn.execute(update_stmt, params)
+                # 已有记录被修改，本地账本快照需要重建
+                bump_table_version(conn, 'transactions', rewrite=True)
+            total += len(params)
+            last_id = rows[-1][0]
+    return total
+
+
+def bump_table_version(conn, name: str, rewrite: bool) -> None:
+    """
+    在当前事务中给table_versions中的版本号加一，绕过服务类直接写表时调用
+
+    Args:
+        conn: 数据库连接
+        name: 表名
+        rewrite: 是否修改或删除了已有记录
+    """
+    conn.execute(text(
+        "INSERT INTO table_versions (name, version, rewrites) VALUES (:name, 1, :rewrites) "
+        "ON CONFLICT(name) DO UPDATE SET version = version + 1, rewrites = rewrites + :rewrites"
+    ), {"name": name, "rewrites": int(rewrite)})
+
+
+def backfill_daily_rollups(force: bool = False) -> int:
+    """
+    根据已有的交易记录重建每日汇总表，之后由TransactionService在写入时增量维护
+
+    Args:
+        force: 汇总表已有数据时是否仍然重建
+    Returns:
+        int: 重建的汇总记录数，未重建时为0
+    """
+    from db.services import DailyRollupService
+
+    service = DailyRollupService()
+    if not force and not service.is_empty():
+        return 0
+    return service.rebuild()
+
+
+def migrate(batch_size: int = 500, rebuild_rollups: bool = False) -> None:
+    """执行全部迁移步骤，已完成的步骤不会重复执行"""
+    upgrade_schema()
+    count = backfill_typed_columns(batch_size)
+    if count:
+        print(f"已回填 {count} 条交易记录")
+    # 新回填的交易没有经过TransactionService，需要重建汇总
+    rollups = backfill_daily_rollups(force=rebuild_rollups or count > 0)
+    if rollups:
+        print(f"已重建 {rollups} 条每日汇总")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="FinBot数据库迁移")
+    parser.add_argument('--batch-size', type=int, default=500, help="每批处理的行数")
+    parser.add_argument('--rebuild-rollups', action='store_true', help="强制根据交易记录重建每日汇总表")
+    args = parser.parse_args()
+    import db.models  # 确保所有模型都已注册到Base.metadata
+    Base.metadata.create_all(bind=engine)
+    migrate(args.batch_size, rebuild_rollups=args.rebuild_rollups)
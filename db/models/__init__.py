@@ -1,3 +1,7 @@
 from db.models.transaction import Transaction
+from db.models.llm_cache import LLMCache
+from db.models.sheet_outbox import SheetOutbox
+from db.models.daily_rollup import DailyRollup
+from db.models.table_version import TableVersion
 
-__all__ = ['Transaction'] 
\ No newline at end of file
+__all__ = ['Transaction', 'LLMCache', 'SheetOutbox', 'DailyRollup', 'TableVersion']
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Date
+from db.base import Base
+
+
+class DailyRollup(Base):
+    """按天、按类型汇总的交易金额和笔数，随交易记录的增删改在同一事务中更新"""
+    __tablename__ = "daily_rollups"
+
+    day = Column(Date, primary_key=True, comment="交易日期")
+    type = Column(String(10), primary_key=True, comment="类型，类型为空的交易记为空字符串")
+    total_cents = Column(Integer, nullable=False, default=0, comment="总金额（分）")
+    count = Column(Integer, nullable=False, default=0, comment="交易笔数")
+
+    def __repr__(self):
+        return f"<DailyRollup(day={self.day}, type={self.type}, total_cents={self.total_cents}, count={self.count})>"
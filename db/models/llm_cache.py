@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from datetime import datetime
+from db.base import Base
+
+class LLMCache(Base):
+    """大模型解析结果缓存"""
+    __tablename__ = "llm_cache"
+
+    id = Column(String(64), primary_key=True, comment="内容哈希")
+    prompt_version = Column(String(16), nullable=False, comment="系统提示词版本")
+    content = Column(Text, nullable=False, comment="模型返回内容")
+    created_at = Column(DateTime, nullable=False, default=datetime.now, index=True, comment="创建时间")
+    last_hit_at = Column(DateTime, nullable=False, default=datetime.now, index=True, comment="最近命中时间")
+    hit_count = Column(Integer, nullable=False, default=0, comment="命中次数")
+
+    def __repr__(self):
+        return f"<LLMCache(id={self.id}, prompt_version={self.prompt_version}, hit_count={self.hit_count})>"
@@ -0,0 +1,18 @@
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text
+from datetime import datetime
+from db.base import Base
+
+class SheetOutbox(Base):
+    """待写入飞书表格的数据行"""
+    __tablename__ = "sheet_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="主键ID")
+    values = Column(Text, nullable=False, comment="单行数据，JSON数组")
+    created_at = Column(DateTime, nullable=False, default=datetime.now, comment="创建时间")
+    attempts = Column(Integer, nullable=False, default=0, comment="已重试次数")
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.now, comment="下次可写入时间")
+    last_error = Column(String(500), nullable=True, comment="最近一次失败原因")
+    failed = Column(Boolean, nullable=False, default=False, comment="重试次数用尽后标记为失败，不再写入")
+
+    def __repr__(self):
+        return f"<SheetOutbox(id={self.id}, attempts={self.attempts}, failed={self.failed}, values={self.values})>"
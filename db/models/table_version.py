@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String
+from db.base import Base
+
+
+class TableVersion(Base):
+    """各表的修改版本号，与修改在同一事务中提交，其他进程的写入也能被感知"""
+    __tablename__ = "table_versions"
+
+    name = Column(String(64), primary_key=True, comment="表名")
+    version = Column(Integer, nullable=False, default=0, comment="新增、修改或删除一次加一")
+    rewrites = Column(Integer, nullable=False, default=0, comment="修改或删除已有记录一次加一")
+
+    def __repr__(self):
+        return f"<TableVersion(name={self.name}, version={self.version}, rewrites={self.rewrites})>"
@@ -1,10 +1,43 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Optional
+
+from sqlalchemy import Column, Integer, String, DateTime, Index
 from datetime import datetime
 from db.base import Base
 
+# transaction_time字符串列的格式
+TIME_FORMAT = '%Y年%m月%d日 %H:%M:%S'
+
+
+def to_cents(amount: Any) -> Optional[int]:
+    """把金额转换为以分为单位的整数，无法解析时返回None"""
+    if amount is None:
+        return None
+    try:
+        value = Decimal(str(amount).replace(',', '').strip())
+    except InvalidOperation:
+        return None
+    return int((value * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """解析transaction_time字符串，无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, TIME_FORMAT)
+    except ValueError:
+        return None
+
+
 class Transaction(Base):
     """交易模型"""
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index('ix_transactions_transaction_at_type', 'transaction_at', 'type'),
+        Index('ix_transactions_transaction_at_id', 'transaction_at', 'id'),
+        Index('ix_transactions_source_id', 'source_id', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, index=True, comment="主键ID")
     amount = Column(String(50), nullable=False, index=True, comment="交易金额")
@@ -12,6 +45,9 @@ class Transaction(Base):
     publisher = Column(String(100), nullable=False, index=True, comment="发布者")
     remark = Column(String(100), nullable=True, index=True, comment="备注")
     type = Column(String(10), nullable=True, index=True, comment="类型")
+    amount_cents = Column(Integer, nullable=True, comment="交易金额（分）")
+    transaction_at = Column(DateTime, nullable=True, comment="交易时间（可排序、可范围查询）")
+    source_id = Column(String(32), nullable=True, comment="来源消息在原始消息日志中的标识(接收时间戳-CRC32)")
 
     def __repr__(self):
-        return f"<Transaction(id={self.id}, amount={self.amount}, time={self.transaction_time}, publisher={self.publisher})>" 
\ No newline at end of file
+        return f"<Transaction(id={self.id}, amount={self.amount}, time={self.transaction_time}, publisher={self.publisher})>"
@@ -1,7 +1,10 @@
-from typing import TypeVar, Type, Optional, List, Any, Dict, Generic
+from typing import TypeVar, Type, Optional, List, Any, Dict, Generic, Iterator, Tuple
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, Select
+from sqlalchemy.dialects.sqlite import insert
+from db.models.table_version import TableVersion
 from db.session import get_db
+from util.metrics import metrics
 
 # 定义泛型类型
 ModelType = TypeVar("ModelType")
@@ -15,14 +18,75 @@ class BaseDBService(Generic[ModelType]):
             super().__init__(UserModel)
     """
     
+    # 为True时update/delete会先读出修改前的记录传给on_change
+    track_changes = False
+    # 为True时create/update/delete在同一事务中给table_versions中的版本号加一，用于判断缓存是否失效
+    track_version = False
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
+
+    @property
+    def version(self) -> int:
+        """当前表持久化的版本号，包括其他进程（重放、迁移）提交的修改，需要track_version为True"""
+        return self.get_table_version()[0]
+
+    def _bump_table_version(self, db: Session, rewrite: bool) -> None:
+        """在调用方的事务中给当前表的持久化版本号加一，rewrite表示修改或删除了已有记录"""
+        if not self.track_version:
+            return
+        stmt = insert(TableVersion).values(name=self.model.__tablename__, version=1, rewrites=int(rewrite))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TableVersion.name],
+            set_={
+                'version': TableVersion.version + 1,
+                'rewrites': TableVersion.rewrites + stmt.excluded.rewrites,
+            }
+        )
+        db.execute(stmt)
+
+    def get_table_version(self) -> Tuple[int, int]:
+        """
+        读取当前表持久化的版本号，包括其他进程提交的修改
+
+        Returns:
+            Tuple[int, int]: (版本号, 修改或删除的次数)，从未修改过时为(0, 0)
+        """
+        with get_db() as db:
+            row = db.get(TableVersion, self.model.__tablename__)
+            return (row.version, row.rewrites) if row is not None else (0, 0)
+
+    def _write_timer(self, op: str):
+        """写操作的耗时，包括on_change和提交"""
+        return metrics.timer("db_write_seconds", "数据库写入耗时", table=self.model.__tablename__, op=op)
+
+    def on_change(self, db: Session, before: Optional[ModelType], after: Optional[ModelType]) -> None:
+        """
+        记录创建、更新或删除后、提交前调用，子类可以在同一事务中维护派生数据
+
+        Args:
+            db: 当前会话
+            before: 修改前的记录，创建时为None
+            after: 修改后的记录，删除时为None
+        """
+
+    def _load_before(self, db: Session, id: Any) -> Optional[ModelType]:
+        """读取修改前的记录并脱离会话，避免被后续的update同步修改"""
+        if not self.track_changes:
+            return None
+        before = db.get(self.model, id)
+        if before is not None:
+            db.expunge(before)
+        return before
     
     def create(self, obj_in: Dict[str, Any]) -> ModelType:
         """创建记录"""
-        with get_db() as db:
+        with self._write_timer("create"), get_db() as db:
             db_obj = self.model(**obj_in)
             db.add(db_obj)
+            db.flush()
+            self.on_change(db, None, db_obj)
+            self._bump_table_version(db, rewrite=False)
             db.commit()  # 使用commit替代flush
             db.refresh(db_obj)  # 刷新对象以加载所有属性
             return db_obj
@@ -30,23 +94,48 @@ class BaseDBService(Generic[ModelType]):
     def get(self, id: Any) -> Optional[ModelType]:
         """根据ID获取记录"""
         with get_db() as db:
-            obj = db.get(self.model, id)
-            if obj:
-                db.refresh(obj)  # 刷新对象以加载所有属性
-            return obj
+            # 会话关闭后不会过期属性(expire_on_commit=False)，查询出的对象已完整加载，无需再refresh
+            return db.get(self.model, id)
     
     def get_multi(self, *, skip: int = 0, limit: int = 100) -> List[ModelType]:
         """获取多条记录"""
+        stmt = select(self.model).offset(skip).limit(limit)
+        return self.load_all(stmt)
+
+    def load_all(self, stmt: Select) -> List[ModelType]:
+        """
+        一次查询加载全部结果，返回的对象在会话关闭后可以直接访问
+
+        Args:
+            stmt: 查询语句
+        Returns:
+            List[ModelType]: 完整加载的记录列表
+        """
         with get_db() as db:
-            stmt = select(self.model).offset(skip).limit(limit)
-            result = list(db.scalars(stmt))
-            for obj in result:
-                db.refresh(obj)  # 刷新每个对象以加载所有属性
-            return result
+            return list(db.scalars(stmt).all())
+
+    def iter_all(self, stmt: Select, chunk_size: int = 1000) -> Iterator[ModelType]:
+        """
+        分批流式读取查询结果，每次只从数据库取chunk_size行，适合大批量导出
+
+        Args:
+            stmt: 查询语句
+            chunk_size: 每批读取的行数
+        Returns:
+            Iterator[ModelType]: 记录迭代器，迭代期间会占用一个数据库会话
+        """
+        with get_db() as db:
+            result = db.scalars(stmt.execution_options(yield_per=chunk_size))
+            for partition in result.partitions():
+                for obj in partition:
+                    # 交出前脱离会话，避免identity map随导出行数增长
+                    db.expunge(obj)
+                    yield obj
     
     def update(self, id: Any, obj_in: Dict[str, Any]) -> Optional[ModelType]:
         """更新记录"""
-        with get_db() as db:
+        with self._write_timer("update"), get_db() as db:
+            before = self._load_before(db, id)
             stmt = (
                 update(self.model)
                 .where(self.model.id == id)
@@ -54,17 +143,27 @@ class BaseDBService(Generic[ModelType]):
                 .returning(self.model)
             )
             result = db.execute(stmt)
-            db.commit()  # 使用commit替代flush
+            # RETURNING的结果需要在提交前读取，否则SQLite会报SQL statements in progress
             obj = result.scalar_one_or_none()
+            if obj is not None and self.track_changes:
+                self.on_change(db, before, obj)
+            if obj is not None:
+                self._bump_table_version(db, rewrite=True)
+            db.commit()  # 使用commit替代flush
             if obj:
                 db.refresh(obj)  # 刷新对象以加载所有属性
             return obj
     
     def delete(self, id: Any) -> bool:
         """删除记录"""
-        with get_db() as db:
+        with self._write_timer("delete"), get_db() as db:
+            before = self._load_before(db, id)
             stmt = delete(self.model).where(self.model.id == id)
             result = db.execute(stmt)
+            if result.rowcount > 0 and self.track_changes:
+                self.on_change(db, before, None)
+            if result.rowcount > 0:
+                self._bump_table_version(db, rewrite=True)
             db.commit()  # 使用commit替代flush
             return result.rowcount > 0
     
@@ -1,3 +1,6 @@
 from db.services.transaction_service import TransactionService
+from db.services.llm_cache_service import LLMCacheService
+from db.services.sheet_outbox_service import SheetOutboxService
+from db.services.daily_rollup_service import DailyRollupService
 
-__all__ = ['TransactionService'] 
\ No newline at end of file
+__all__ = ['TransactionService', 'LLMCacheService', 'SheetOutboxService', 'DailyRollupService']
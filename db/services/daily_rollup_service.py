@@ -0,0 +1,66 @@
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from db.models import DailyRollup
+from db.service import BaseDBService
+from db.session import get_db
+
+
+class DailyRollupService(BaseDBService[DailyRollup]):
+    def __init__(self):
+        super().__init__(DailyRollup)
+
+    def apply(self, db: Session, day: date, type_: Optional[str], cents: int, count: int) -> None:
+        """在调用方的事务中累加某天某类型的金额和笔数，记录不存在时创建
+
+        Args:
+            db: 交易记录所在的会话，与交易记录一起提交或回滚
+            day: 交易日期
+            type_: 交易类型
+            cents: 金额增量（分）
+            count: 笔数增量
+        """
+        stmt = insert(self.model).values(day=day, type=type_ or '', total_cents=cents, count=count)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.model.day, self.model.type],
+            set_={
+                'total_cents': self.model.total_cents + stmt.excluded.total_cents,
+                'count': self.model.count + stmt.excluded.count,
+            }
+        )
+        db.execute(stmt)
+
+    def get_totals(self, days: Iterable[date]) -> Dict[Tuple[date, str], int]:
+        """获取指定日期按类型的总金额
+
+        Args:
+            days: 日期列表
+        Returns:
+            Dict[Tuple[date, str], int]: (日期, 类型) -> 总金额（分），没有交易的日期不包含在内
+        """
+        stmt = select(self.model).where(self.model.day.in_(list(days)))
+        return {(row.day, row.type): row.total_cents for row in self.load_all(stmt)}
+
+    def rebuild(self) -> int:
+        """根据transactions表全量重建汇总表，在一个事务中完成
+
+        Returns:
+            int: 汇总记录数
+        """
+        with get_db() as db:
+            db.execute(text("DELETE FROM daily_rollups"))
+            db.execute(text(
+                "INSERT INTO daily_rollups (day, type, total_cents, count) "
+                "SELECT date(transaction_at), COALESCE(type, ''), COALESCE(SUM(amount_cents), 0), COUNT(*) "
+                "FROM transactions WHERE transaction_at IS NOT NULL "
+                "GROUP BY date(transaction_at), COALESCE(type, '')"
+            ))
+            return db.scalar(text("SELECT COUNT(*) FROM daily_rollups"))
+
+    def is_empty(self) -> bool:
+        """汇总表是否为空"""
+        with get_db() as db:
+            return db.scalar(select(self.model.day).limit(1)) is None
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, delete, func
+
+from config import LLM_CACHE_TTL_DAYS, LLM_CACHE_MAX_ENTRIES
+from db.models import LLMCache
+from db.service import BaseDBService
+from db.session import get_db
+
+
+class LLMCacheService(BaseDBService[LLMCache]):
+    def __init__(self, ttl_days: int = LLM_CACHE_TTL_DAYS, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        super().__init__(LLMCache)
+        self.ttl = timedelta(days=ttl_days)
+        self.max_entries = max_entries
+
+    def get_content(self, key: str) -> Optional[str]:
+        """获取未过期的缓存内容，命中时更新命中次数和时间
+
+        Args:
+            key: 缓存键
+        Returns:
+            Optional[str]: 缓存的模型返回内容，未命中或已过期返回None
+        """
+        with get_db() as db:
+            obj = db.get(self.model, key)
+            if obj is None:
+                return None
+            now = datetime.now()
+            if obj.created_at < now - self.ttl:
+                db.delete(obj)
+                return None
+            obj.hit_count += 1
+            obj.last_hit_at = now
+            return obj.content
+
+    def put(self, key: str, prompt_version: str, content: str) -> None:
+        """写入缓存，超出TTL或容量的记录会被淘汰
+
+        Args:
+            key: 缓存键
+            prompt_version: 系统提示词版本
+            content: 模型返回内容
+        """
+        with get_db() as db:
+            now = datetime.now()
+            db.merge(self.model(id=key, prompt_version=prompt_version, content=content,
+                                created_at=now, last_hit_at=now, hit_count=0))
+            db.flush()
+            self._evict(db, now)
+
+    def _evict(self, db, now: datetime) -> None:
+        """淘汰过期记录，超出容量时按最近命中时间淘汰最旧的记录"""
+        db.execute(delete(self.model).where(self.model.created_at < now - self.ttl))
+        total = db.scalar(select(func.count()).select_from(self.model))
+        overflow = total - self.max_entries
+        if overflow > 0:
+            oldest = select(self.model.id).order_by(self.model.last_hit_at.asc()).limit(overflow)
+            db.execute(delete(self.model).where(self.model.id.in_(oldest)))
@@ -0,0 +1,64 @@
+import json
+from datetime import datetime
+from typing import List
+from sqlalchemy import select, update, delete, func
+
+from db.models import SheetOutbox
+from db.service import BaseDBService
+from db.session import get_db
+
+
+class SheetOutboxService(BaseDBService[SheetOutbox]):
+    def __init__(self):
+        super().__init__(SheetOutbox)
+
+    def enqueue(self, rows: List[list]) -> None:
+        """写入待发送的数据行，提交后才返回，保证进程退出或飞书不可用时数据不丢失"""
+        with get_db() as db:
+            now = datetime.now()
+            db.add_all([
+                self.model(values=json.dumps(row, ensure_ascii=False), created_at=now, next_attempt_at=now)
+                for row in rows
+            ])
+
+    def fetch_due(self, limit: int) -> List[SheetOutbox]:
+        """按写入顺序获取队首的数据行，队首还没到重试时间时返回空列表，保证表格中的写入顺序；已标记失败的行不再返回"""
+        stmt = select(self.model).where(self.model.failed.is_(False)).order_by(self.model.id.asc()).limit(limit)
+        rows = self.load_all(stmt)
+        now = datetime.now()
+        if not rows or rows[0].next_attempt_at > now:
+            return []
+        return [row for row in rows if row.next_attempt_at <= now]
+
+    def count_pending(self) -> int:
+        """待发送的数据行数，不包括已标记失败的行"""
+        with get_db() as db:
+            return db.scalar(select(func.count()).select_from(self.model).where(self.model.failed.is_(False)))
+
+    def count_failed(self) -> int:
+        """重试次数用尽、已标记失败的数据行数"""
+        with get_db() as db:
+            return db.scalar(select(func.count()).select_from(self.model).where(self.model.failed.is_(True)))
+
+    def remove(self, ids: List[int]) -> None:
+        """删除已成功写入的数据行"""
+        with get_db() as db:
+            db.execute(delete(self.model).where(self.model.id.in_(ids)))
+
+    def mark_failed(self, ids: List[int], error: str, next_attempt_at: datetime) -> None:
+        """记录失败，推迟到next_attempt_at再重试"""
+        with get_db() as db:
+            db.execute(
+                update(self.model)
+                .where(self.model.id.in_(ids))
+                .values(attempts=self.model.attempts + 1, last_error=error[:500], next_attempt_at=next_attempt_at)
+            )
+
+    def park(self, ids: List[int], error: str) -> None:
+        """标记为失败，之后不再重试，队列中后面的数据可以继续写入；需要时可根据last_error处理后把failed改回0重新写入"""
+        with get_db() as db:
+            db.execute(
+                update(self.model)
+                .where(self.model.id.in_(ids))
+                .values(attempts=self.model.attempts + 1, last_error=error[:500], failed=True)
+            )
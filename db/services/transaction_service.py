@@ -1,7 +1,10 @@
-from typing import List
-from sqlalchemy import select, and_
+from datetime import datetime, timedelta
+from typing import List, Iterator, Dict, Any, Optional, Tuple
+from sqlalchemy import select, update, and_, tuple_
 from db.models import Transaction
+from db.models.transaction import to_cents, parse_time
 from db.service import BaseDBService
+from db.services.daily_rollup_service import DailyRollupService
 from db.session import get_db
 from sqlalchemy import func
 
@@ -9,32 +12,149 @@ from config import TEMPLATE_ID
 from feishu.template import TemplateVariable, Template, TemplateData
 from util.date_util import get_date
 
+# 日期参数支持的格式
+DATE_FORMATS = ('%Y年%m月%d日', '%Y%m%d', '%Y-%m-%d')
+
 
 class TransactionService(BaseDBService[Transaction]):
+    # 修改和删除时需要修改前的记录来扣减每日汇总
+    track_changes = True
+    # 本地账本快照根据持久化的版本号判断是否需要同步
+    track_version = True
+
     def __init__(self):
         super().__init__(Transaction)
+        self.rollups = DailyRollupService()
+
+    def on_change(self, db, before: Optional[Transaction], after: Optional[Transaction]) -> None:
+        """在交易记录所在的事务中同步更新每日汇总表"""
+        if before is not None and before.transaction_at is not None:
+            self.rollups.apply(db, before.transaction_at.date(), before.type, -(before.amount_cents or 0), -1)
+        if after is not None and after.transaction_at is not None:
+            self.rollups.apply(db, after.transaction_at.date(), after.type, after.amount_cents or 0, 1)
 
     def get_all_transactions(self, desc: bool=True) -> List[Transaction]:
         """获取全部的交易记录"""
+        stmt = (
+            select(self.model)
+            .order_by(self.model.transaction_time.desc() if desc else self.model.transaction_time.asc())
+        )
+        return self.load_all(stmt)
+
+    def iter_transactions(self, desc: bool = False, chunk_size: int = 1000) -> Iterator[Transaction]:
+        """流式读取全部交易记录，按chunk_size分批从数据库读取，适合大批量导出
+
+        Args:
+            desc: 是否倒序输出
+            chunk_size: 每批读取的行数
+        Returns:
+            Iterator[Transaction]: 交易记录迭代器
+        """
+        stmt = (
+            select(self.model)
+            .order_by(self.model.transaction_time.desc() if desc else self.model.transaction_time.asc())
+        )
+        return self.iter_all(stmt, chunk_size=chunk_size)
+
+
+    def get_ledger_stamp(self) -> Tuple[int, int]:
+        """
+        账本的变化标识(版本号, 修改或删除的次数)，只按主键读取一行，用于判断本地快照是否需要更新
+        只有版本号变化时说明只新增了交易，修改或删除的次数变化时快照需要重建
+        """
+        return self.get_table_version()
+
+    def get_ledger_rows(self, after_id: int = 0) -> List[tuple]:
+        """按ID顺序获取after_id之后的交易，只返回(id, 交易时间, 类型, 金额分, 备注)元组，不构建ORM对象
+
+        Args:
+            after_id: 起始ID（不包含）
+        Returns:
+            List[tuple]: 交易数据元组列表
+        """
         with get_db() as db:
             stmt = (
-                select(self.model)
-                .order_by(self.model.transaction_time.desc() if desc else self.model.transaction_time.asc())
+                select(
+                    self.model.id,
+                    self.model.transaction_at,
+                    self.model.type,
+                    self.model.amount_cents,
+                    self.model.remark
+                )
+                .where(and_(self.model.id > after_id, self.model.transaction_at.is_not(None)))
+                .order_by(self.model.id.asc())
             )
-            result = list(db.scalars(stmt))
-            for obj in result:
-                db.refresh(obj)  # 刷新每个对象以加载所有属性
-            return result
+            return [tuple(row) for row in db.execute(stmt).all()]
 
+    @property
+    def ledger_version(self) -> int:
+        """当前的账本版本号，交易记录每次新增、修改或删除后加一，其他进程的写入也会反映出来"""
+        return self.version
 
+    @staticmethod
+    def encode_cursor(transaction: Transaction) -> str:
+        """把交易记录编码为翻页游标，格式为"交易时间|ID"，交易时间为ISO格式"""
+        return f"{transaction.transaction_at.isoformat()}|{transaction.id}"
 
-    def transfer_template(self, transactions: List[Transaction], template_id: str = TEMPLATE_ID, version: str = "1.0.4") -> Template:
+    @staticmethod
+    def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+        """解析翻页游标，为空或格式错误（例如旧卡片中只有ID的游标）时返回None，从第一页开始"""
+        if not cursor:
+            return None
+        at, _, id_ = str(cursor).partition('|')
+        try:
+            return datetime.fromisoformat(at), int(id_)
+        except ValueError:
+            return None
+
+    def get_transactions_page(self, start_date: str = None, end_date: str = None, cursor: str = None,
+                              direction: str = 'next', page_size: int = 20) -> Tuple[List[Transaction], bool, bool]:
+        """按(交易时间, ID)游标分页获取交易记录，新的在前，每次只查询一页
+        交易的ID不一定按时间递增（例如重放补录的旧交易），因此按交易时间排序，时间相同时按ID排序；
+        没有交易时间的记录无法排序，不包含在内
+
+        Args:
+            start_date: 开始日期，不传则不限日期
+            end_date: 结束日期，规则同get_transactions_by_date
+            cursor: 游标，由encode_cursor生成，向后翻页时为当前页最后一条，向前翻页时为第一条，不传则为第一页
+            direction: 'next'向后翻页（更早的记录），'prev'向前翻页（更新的记录）
+            page_size: 每页条数
+        Returns:
+            Tuple[List[Transaction], bool, bool]: (本页记录, 是否有上一页, 是否有下一页)
+        """
+        conditions = [self.model.transaction_at.is_not(None)]
+        if start_date:
+            conditions.append(self._date_range(start_date, end_date))
+        key = self.decode_cursor(cursor)
+        backward = direction == 'prev' and key is not None
+        if key is not None:
+            position = tuple_(self.model.transaction_at, self.model.id)
+            conditions.append(position > tuple_(*key) if backward else position < tuple_(*key))
+        order = (self.model.transaction_at.asc(), self.model.id.asc()) if backward else \
+            (self.model.transaction_at.desc(), self.model.id.desc())
+        stmt = (
+            select(self.model)
+            .where(*conditions)
+            .order_by(*order)
+            .limit(page_size + 1)
+        )
+        rows = self.load_all(stmt)
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backward:
+            # 向前翻页时按升序取出，恢复为新的在前
+            return list(reversed(rows)), more, True
+        return rows, key is not None, more
+
+    def transfer_template(self, transactions: List[Transaction], template_id: str = TEMPLATE_ID, version: str = "1.0.4",
+                          page: Dict[str, Any] = None) -> Template:
         """将交易记录转换为模板对象
 
         Args:
             transactions: 交易记录列表
             template_id: 模板ID
             version: 模板版本
+            page: 分页变量，会与transactions一起传给模板
 
         Returns:
             Template: 转换后的模板对象
@@ -54,84 +174,126 @@ class TransactionService(BaseDBService[Transaction]):
                 template_id=template_id,
                 template_version_name=version,
                 template_variable=TemplateVariable(
-                    transactions=transaction_list
+                    transactions=transaction_list,
+                    page=page
                 )
             )
         )
 
+    def create(self, obj_in: Dict[str, Any]) -> Transaction:
+        """创建交易记录，同时写入以分为单位的金额和可范围查询的交易时间"""
+        return super().create(self.with_typed_fields(obj_in))
+
+    def update(self, id: Any, obj_in: Dict[str, Any]) -> Optional[Transaction]:
+        """更新交易记录，金额或时间变化时同步更新类型化的列"""
+        return super().update(id, self.with_typed_fields(obj_in))
+
+    @staticmethod
+    def with_typed_fields(obj_in: Dict[str, Any]) -> Dict[str, Any]:
+        """根据amount和transaction_time补充amount_cents和transaction_at"""
+        obj_in = dict(obj_in)
+        if 'amount' in obj_in:
+            obj_in['amount_cents'] = to_cents(obj_in['amount'])
+        if 'transaction_time' in obj_in:
+            obj_in['transaction_at'] = parse_time(obj_in['transaction_time'])
+        return obj_in
+
+    @staticmethod
+    def parse_date(date_str: str) -> datetime:
+        """解析日期参数，支持'YYYY年MM月DD日'、'YYYYMMDD'和'YYYY-MM-DD'"""
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(date_str, fmt)
+            except ValueError:
+                continue
+        raise ValueError(f"日期格式错误: {date_str}")
+
+    def _date_range(self, start_date: str, end_date: str = None):
+        """把日期参数转换为transaction_at上的半开区间[start, end)
+
+        end_date为None时为start_date当天，否则为start_date当天0点到end_date当天0点
+        """
+        start = self.parse_date(start_date)
+        end = self.parse_date(end_date) if end_date is not None else start + timedelta(days=1)
+        return and_(self.model.transaction_at >= start, self.model.transaction_at < end)
+
     def get_transactions_by_date(self, start_date: str, end_date: str = None, desc: bool=True) -> List[Transaction]:
         """获取指定日期范围的交易记录
         
         Args:
             start_date: 开始日期，格式为'YYYY年MM月DD日'
-            end_date: 结束日期，格式为'YYYY年MM月DD日'，如果不传则只查询start_date当天的数据
+            end_date: 结束日期，格式为'YYYY年MM月DD日'，如果不传则只查询start_date当天的数据（不包含end_date当天）
             desc: 是否倒序输出
         Returns:
             List[Transaction]: 交易记录列表
         """
+        stmt = (
+            select(self.model)
+            .where(self._date_range(start_date, end_date))
+            .order_by(self.model.transaction_at.desc() if desc else self.model.transaction_at.asc())
+        )
+        return self.load_all(stmt)
+
+    def match_existing(self, obj_in: Dict[str, Any], window: timedelta) -> bool:
+        """重放时判断交易是否已入库，用于去重
+
+        按source_id精确匹配来源消息；没有记录来源的旧交易按一对一认领：
+        交易时间相差不超过window，且类型、金额、发布者和备注都相同的旧交易中，取时间最接近的一笔写入source_id，
+        被认领过的交易不会再匹配其他消息，因此相同金额的多笔交易不会被合并
+
+        Args:
+            obj_in: 交易数据，格式与create相同，需要包含source_id
+            window: 旧交易允许的交易时间误差
+        Returns:
+            bool: 是否已入库
+        """
+        typed = self.with_typed_fields(obj_in)
+        source_id = typed.get('source_id')
         with get_db() as db:
-            if end_date is None:
-                # 如果没有传入end_date，则查询start_date当天的数据
-                stmt = (
-                    select(self.model)
-                    .where(self.model.transaction_time.like(f"{start_date}%"))
-                    .order_by(self.model.transaction_time.desc() if desc else self.model.transaction_time.asc())
-                )
-            else:
-                # 查询日期范围内的数据
-                stmt = (
-                    select(self.model)
-                    .where(
-                        and_(
-                            self.model.transaction_time > start_date,
-                            self.model.transaction_time < end_date
-                        )
-                    )
-                    .order_by(self.model.transaction_time.desc())
+            if source_id and db.execute(select(self.model.id).where(self.model.source_id == source_id)).first():
+                return True
+            at = typed.get('transaction_at')
+            if at is None:
+                return False
+            stmt = (
+                select(self.model.id)
+                .where(
+                    self.model.source_id.is_(None),
+                    self.model.transaction_at >= at - window,
+                    self.model.transaction_at <= at + window,
+                    self.model.type == typed.get('type'),
+                    self.model.amount_cents == typed.get('amount_cents'),
+                    self.model.publisher == typed.get('publisher'),
+                    self.model.remark == typed.get('remark'),
                 )
-            
-            result = list(db.scalars(stmt))
-            for obj in result:
-                db.refresh(obj)
-            return result
+                .order_by(func.abs(func.julianday(self.model.transaction_at) - func.julianday(at)))
+                .limit(1)
+            )
+            legacy_id = db.execute(stmt).scalar()
+            if legacy_id is None or not source_id:
+                return legacy_id is not None
+            # 只写入来源标识，账本的列没有变化，不需要更新版本号
+            db.execute(update(self.model).where(self.model.id == legacy_id).values(source_id=source_id))
+            return True
 
-    def get_transactions_summary_by_date(self, start_date: str = get_date(), end_date: str = None) -> List[dict]:
-        """获取指定日期范围内按类型分组的交易汇总
+    def get_transactions_summary_by_date(self, start_date: str = None, end_date: str = None) -> List[dict]:
+        """获取指定日期范围内按类型分组的交易汇总，从每日汇总表读取，不扫描交易记录
 
         Args:
-            start_date: 开始日期，格式为'YYYY年MM月DD日'
+            start_date: 开始日期，格式为'YYYY年MM月DD日'，不传则为当天
             end_date: 结束日期，格式为'YYYY年MM月DD日'，如果不传则只查询start_date当天的数据
 
         Returns:
             List[dict]: 包含类型和总金额的字典列表
         """
+        start = self.parse_date(start_date or get_date()).date()
+        end = self.parse_date(end_date).date() if end_date is not None else start + timedelta(days=1)
+        rollup = self.rollups.model
         with get_db() as db:
-            from sqlalchemy import func, cast, Float
-
-            base_query = select(
-                self.model.type,
-                func.sum(cast(self.model.amount, Float)).label('total_amount')
+            stmt = (
+                select(rollup.type, func.sum(rollup.total_cents).label('total_cents'))
+                .where(and_(rollup.day >= start, rollup.day < end, rollup.count > 0))
+                .group_by(rollup.type)
             )
-
-            if end_date is None:
-                # 如果没有传入end_date，则查询start_date当天的数据
-                stmt = (
-                    base_query
-                    .where(self.model.transaction_time.like(f"{start_date}%"))
-                    .group_by(self.model.type)
-                )
-            else:
-                # 查询日期范围内的数据
-                stmt = (
-                    base_query
-                    .where(
-                        and_(
-                            self.model.transaction_time > start_date,
-                            self.model.transaction_time < end_date
-                        )
-                    )
-                    .group_by(self.model.type)
-                )
-
             results = db.execute(stmt).all()
-            return [{"type": type_, "amount": float(total_amount)} for type_, total_amount in results]
+            return [{"type": type_ or None, "amount": (total_cents or 0) / 100} for type_, total_cents in results]
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from config import AI_BATCH_SIZE, AI_BATCH_WAIT_MS
+from util.metrics import metrics
+from util.stats import StageStats
+
+_STOP = object()
+
+
+class ExtractionBatcher:
+    """
+    大模型解析的微批处理器
+    调用方只负责提交待解析的XML并立即返回，后台线程攒够max_items条或等待max_wait秒后合并为一次解析，
+    再按提交顺序逐条回调；回调时带上提交时记录的接收时间，入库的交易时间不受攒批和解析耗时的影响
+    """
+
+    def __init__(self,
+                 extract_func: Callable[[List[str]], List[Optional[dict]]],
+                 on_result: Callable[[str, Optional[dict], datetime], Any],
+                 max_items: int = AI_BATCH_SIZE,
+                 max_wait: float = AI_BATCH_WAIT_MS / 1000,
+                 name: str = "ExtractBatch"):
+        """
+        Args:
+            extract_func: 批量解析函数，参数为XML列表，返回一一对应的解析结果，失败的条目为None
+            on_result: 每条消息解析完成后的回调，参数为(XML, 解析结果, 接收时间)
+            max_items: 单批最多解析的消息数
+            max_wait: 收到第一条消息后最多等待的秒数
+            name: 处理线程名
+        """
+        self.extract_func = extract_func
+        self.on_result = on_result
+        self.max_items = max(1, max_items)
+        self.max_wait = max(0.0, max_wait)
+        self.name = name
+        self.logger = logging.getLogger(name)
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._latency = StageStats()
+        self._counters = {"submitted": 0, "batches": 0, "extracted": 0, "failed": 0}
+        metrics.register_gauge("queue_depth", self._queue.qsize, "队列中等待处理的数量", queue=name)
+
+    def start(self) -> None:
+        """启动处理线程"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, content: str, received_at: datetime = None) -> Future:
+        """
+        提交待解析的XML，立即返回
+
+        Args:
+            content: XML内容
+            received_at: 消息的接收时间，默认为提交时间
+        Returns:
+            Future: 回调执行完成后结果为解析结果，解析失败时为None
+        """
+        future = Future()
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        with self._lock:
+            self._counters["submitted"] += 1
+        self._queue.put((content, received_at or datetime.now(), future))
+        return future
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            batch = [entry]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    # 先处理完已攒的消息再退出
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._process(batch)
+
+    def _process(self, batch: List[tuple]) -> None:
+        contents = [content for content, _, _ in batch]
+        started = time.perf_counter()
+        try:
+            results = list(self.extract_func(contents))
+        except Exception as e:
+            self.logger.error(f"批量解析{len(contents)}条消息异常: {e}")
+            results = []
+        results += [None] * (len(batch) - len(results))
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._counters["batches"] += 1
+            self._latency.record(elapsed)
+        metrics.observe("llm_batch_seconds", elapsed, "大模型批量解析耗时")
+        metrics.incr("llm_batch_items_total", len(batch), "大模型批量解析的消息数")
+        print(f"批量解析{len(batch)}条消息，耗时{round(elapsed * 1000)}ms")
+
+        for (content, received_at, future), data in zip(batch, results):
+            with self._lock:
+                self._counters["extracted" if data is not None else "failed"] += 1
+            try:
+                self.on_result(content, data, received_at)
+            except Exception as e:
+                self.logger.error(f"处理解析结果异常: {e}")
+            future.set_result(data)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息，包括每批的解析耗时和当前排队的消息数"""
+        with self._lock:
+            result = dict(self._counters)
+            result["latency"] = self._latency.to_dict()
+            result["avg_batch_size"] = round(
+                (result["extracted"] + result["failed"]) / result["batches"], 2) if result["batches"] else 0.0
+        result["queue_depth"] = self._queue.qsize()
+        return result
+
+    def close(self, timeout: float = 30.0) -> None:
+        """停止处理线程，已提交的消息会先解析完"""
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import FEISHU_CARD_PAGE_SIZE, FEISHU_CARD_CACHE_SIZE
+from feishu.template import Template
+
+# 翻页按钮回传值中的action
+PAGE_ACTION = "transactions_page"
+
+
+class TransactionCardPager:
+    """
+    交易卡片分页器
+    按(交易时间, ID)游标每次只查询一页交易记录并渲染为卡片模板，已渲染的页面按LRU缓存，账本版本变化后整体失效
+
+    卡片模板中的翻页按钮需要配置回传值:
+        {"action": "transactions_page", "direction": "next", "cursor": "${next_cursor}",
+         "page": "${page}", "start_date": "${start_date}", "end_date": "${end_date}"}
+    上一页按钮的direction为prev，cursor为${prev_cursor}，可用${has_prev}/${has_next}控制按钮是否显示
+    """
+
+    def __init__(self, service, page_size: int = FEISHU_CARD_PAGE_SIZE, cache_size: int = FEISHU_CARD_CACHE_SIZE):
+        """
+        Args:
+            service: 交易记录服务
+            page_size: 每页条数
+            cache_size: 最多缓存的页数
+        """
+        self.service = service
+        self.page_size = max(1, page_size)
+        self.cache_size = max(1, cache_size)
+        self._cache: OrderedDict = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def render(self, start_date: str = None, end_date: str = None, cursor: Optional[str] = None,
+               direction: str = 'next', page: int = 1) -> Template:
+        """
+        渲染一页交易卡片
+
+        Args:
+            start_date: 开始日期，不传则为全部交易
+            end_date: 结束日期
+            cursor: 翻页游标，不传则为第一页
+            direction: next/prev
+            page: 要渲染的页码，只用于显示
+        Returns:
+            Template: 卡片模板
+        """
+        key = (start_date or '', end_date or '', cursor, direction, page)
+        version = self.service.ledger_version
+        with self._lock:
+            if version != self._version:
+                self._cache.clear()
+                self._version = version
+            template = self._cache.get(key)
+            if template is not None:
+                self._cache.move_to_end(key)
+                return template
+
+        transactions, has_prev, has_next = self.service.get_transactions_page(
+            start_date, end_date, cursor=cursor, direction=direction, page_size=self.page_size)
+        template = self.service.transfer_template(transactions, page={
+            "page": page,
+            "has_prev": has_prev,
+            "has_next": has_next,
+            "prev_cursor": self.service.encode_cursor(transactions[0]) if transactions else '',
+            "next_cursor": self.service.encode_cursor(transactions[-1]) if transactions else '',
+            "start_date": start_date or '',
+            "end_date": end_date or '',
+        })
+
+        with self._lock:
+            # 查询期间账本有变化时不缓存，避免缓存旧数据
+            if version == self._version:
+                self._cache[key] = template
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return template
+
+    def handle_action(self, value: Dict[str, Any]) -> Optional[Template]:
+        """
+        处理卡片翻页按钮的回传值
+
+        Args:
+            value: 按钮的回传值
+        Returns:
+            Optional[Template]: 新的一页卡片，不是翻页操作时返回None
+        """
+        if not value or value.get('action') != PAGE_ACTION:
+            return None
+        direction = 'prev' if value.get('direction') == 'prev' else 'next'
+        cursor = value.get('cursor') or None
+        page = int(value.get('page') or 1)
+        page = max(1, page - 1) if direction == 'prev' else page + 1
+        return self.render(value.get('start_date') or None, value.get('end_date') or None,
+                           cursor=cursor, direction=direction, page=page)
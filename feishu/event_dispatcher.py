@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+from config import FEISHU_EVENT_WORKERS, FEISHU_EVENT_QUEUE_SIZE
+from util.stats import StageStats
+from worker_pool import OrderedWorkerPool, POLICY_DROP
+
+
+class FeishuEventDispatcher:
+    """
+    飞书机器人菜单事件的异步分发器
+    websocket回调只负责把事件放入队列并立即返回，由后台线程调用处理器；
+    同一用户的事件按顺序处理，处理器复用AppContext中的服务。
+    处理器直接在分发线程中执行，耗时超过处理器的超时时间时只记录告警和次数，不会打乱顺序；
+    卡住的处理器最多占用workers个线程，期间积压的事件超过队列长度后被丢弃
+    """
+
+    def __init__(self, service, msg_sender, pager=None,
+                 workers: int = FEISHU_EVENT_WORKERS,
+                 queue_size: int = FEISHU_EVENT_QUEUE_SIZE):
+        """
+        Args:
+            service: 交易记录服务
+            msg_sender: 飞书消息发送器
+            pager: 交易卡片分页器，各处理器共用同一个页面缓存
+            workers: 处理线程数
+            queue_size: 每个处理线程的队列长度，队列满时丢弃新事件
+        """
+        self.service = service
+        self.msg_sender = msg_sender
+        self.pager = pager
+        self.logger = logging.getLogger("FeishuEvent")
+        self.pool = OrderedWorkerPool(self._dispatch, size=workers, queue_size=queue_size,
+                                      policy=POLICY_DROP, name="FeishuEvent")
+        self._handlers: Dict[str, Any] = {}
+        self._latency: Dict[str, StageStats] = {}
+        self._timeouts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, event_key: str, open_id: str) -> bool:
+        """
+        提交菜单事件，立即返回
+
+        Args:
+            event_key: 菜单事件的key
+            open_id: 操作者的open_id
+        Returns:
+            bool: 是否进入了处理队列
+        """
+        return self.pool.submit(open_id, (event_key, open_id))
+
+    def _get_handler(self, event_key: str):
+        """同一种事件复用同一个处理器实例"""
+        with self._lock:
+            handler = self._handlers.get(event_key)
+            if handler is None:
+                from feishu.message_handlers import MessageHandlerFactory
+                handler = MessageHandlerFactory.get_handler(event_key, self.service, self.msg_sender, self.pager)
+                self._handlers[event_key] = handler
+            return handler
+
+    def _dispatch(self, item) -> None:
+        event_key, open_id = item
+        try:
+            handler = self._get_handler(event_key)
+        except ValueError as e:
+            print(f"错误: {str(e)}")
+            return
+        start = time.perf_counter()
+        try:
+            handler.handle(open_id)
+        except Exception as e:
+            print(f"处理消息时发生错误: {str(e)}")
+        finally:
+            elapsed = time.perf_counter() - start
+            timed_out = elapsed > handler.timeout
+            with self._lock:
+                self._latency.setdefault(event_key, StageStats()).record(elapsed)
+                if timed_out:
+                    self._timeouts[event_key] = self._timeouts.get(event_key, 0) + 1
+            if timed_out:
+                self.logger.warning(f"处理事件超时({handler.timeout}秒)，实际耗时{round(elapsed, 3)}秒: {event_key}")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取队列深度、各处理器的耗时和超时次数"""
+        result = self.pool.stats()
+        with self._lock:
+            result["handlers"] = {
+                key: dict(stats.to_dict(), timeouts=self._timeouts.get(key, 0))
+                for key, stats in self._latency.items()
+            }
+            for key, count in self._timeouts.items():
+                result["handlers"].setdefault(key, dict(StageStats().to_dict(), timeouts=count))
+        return result
+
+    def shutdown(self, wait: bool = True) -> None:
+        """停止接收事件，已入队的事件会先处理完"""
+        self.pool.shutdown(wait=wait)
@@ -0,0 +1,140 @@
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import FEISHU_HTTP_POOL_SIZE, FEISHU_HTTP_TIMEOUT
+
+FEISHU_HOST = "https://open.feishu.cn"
+TOKEN_PATH = "/open-apis/auth/v3/tenant_access_token/internal"
+# tenant_access_token无效或过期的错误码
+TOKEN_INVALID_CODES = {99991661, 99991663, 99991668}
+
+
+class TenantTokenCache:
+    """
+    线程安全的tenant_access_token缓存
+    在过期前refresh_ahead秒主动刷新，并发调用时只会有一个线程去请求新的令牌
+    """
+
+    def __init__(self, app_id: str, app_secret: str, session: requests.Session,
+                 refresh_ahead: float = 300, timeout: float = FEISHU_HTTP_TIMEOUT):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.session = session
+        self.refresh_ahead = refresh_ahead
+        self.timeout = timeout
+        self._token: Optional[str] = None
+        self._expire_at = 0.0
+        self._lock = threading.Lock()
+
+    def _valid(self) -> bool:
+        return self._token is not None and time.monotonic() < self._expire_at - self.refresh_ahead
+
+    def get(self) -> str:
+        """获取有效的令牌，快过期时刷新"""
+        if self._valid():
+            return self._token
+        with self._lock:
+            # 等锁期间其他线程可能已经刷新过
+            if not self._valid():
+                self._refresh()
+            return self._token
+
+    def invalidate(self, token: str) -> None:
+        """令牌被服务端判定无效时调用，只作废当前仍在使用的同一个令牌"""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+                self._expire_at = 0.0
+
+    def _refresh(self) -> None:
+        response = self.session.post(
+            FEISHU_HOST + TOKEN_PATH,
+            headers={"Content-Type": "application/json"},
+            json={"app_id": self.app_id, "app_secret": self.app_secret},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        if data.get("code", 0) != 0:
+            raise RuntimeError(f"获取tenant_access_token失败: {data}")
+        self._token = data["tenant_access_token"]
+        # expire单位为秒，有效期一般为2小时
+        self._expire_at = time.monotonic() + data.get("expire", 7200)
+
+
+class FeishuHttpClient:
+    """
+    飞书开放平台共享的HTTP客户端
+    同一个应用复用一个带连接池的keep-alive会话和令牌缓存，表格、云文档和消息接口都通过它调用
+    """
+    _instances: Dict[str, 'FeishuHttpClient'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, app_id: str, app_secret: str,
+                 pool_size: int = FEISHU_HTTP_POOL_SIZE, timeout: float = FEISHU_HTTP_TIMEOUT):
+        self.app_id = app_id
+        self.timeout = timeout
+        self.session = requests.Session()
+        # 只对建立连接失败的请求重试，避免重复写入
+        retry = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.tokens = TenantTokenCache(app_id, app_secret, self.session, timeout=timeout)
+
+    @classmethod
+    def get_instance(cls, app_id: str, app_secret: str) -> 'FeishuHttpClient':
+        """获取应用对应的共享客户端"""
+        client = cls._instances.get(app_id)
+        if client is None:
+            with cls._instances_lock:
+                client = cls._instances.get(app_id)
+                if client is None:
+                    client = cls(app_id, app_secret)
+                    cls._instances[app_id] = client
+        return client
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        发送带tenant_access_token的请求，令牌失效时刷新后重试一次
+
+        Args:
+            method: HTTP方法
+            path: 以/open-apis开头的路径或完整URL
+            **kwargs: 透传给requests的参数
+        Returns:
+            requests.Response: 响应
+        """
+        url = path if path.startswith("http") else FEISHU_HOST + path
+        kwargs.setdefault("timeout", self.timeout)
+        extra_headers = kwargs.pop("headers", None) or {}
+        for attempt in range(2):
+            token = self.tokens.get()
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json; charset=utf-8",
+            }
+            headers.update(extra_headers)
+            response = self.session.request(method, url, headers=headers, **kwargs)
+            if attempt == 0 and self._token_invalid(response):
+                self.tokens.invalidate(token)
+                continue
+            return response
+        return response
+
+    @staticmethod
+    def _token_invalid(response: requests.Response) -> bool:
+        if "json" not in response.headers.get("Content-Type", ""):
+            return False
+        try:
+            return response.json().get("code") in TOKEN_INVALID_CODES
+        except ValueError:
+            return False
+
+    def request_json(self, method: str, path: str, **kwargs) -> Dict:
+        """发送请求并返回JSON响应"""
+        return self.request(method, path, **kwargs).json()
@@ -1,7 +1,9 @@
-import requests
 import json
 from typing import Dict, Optional, Union
 
+from feishu.http_client import FeishuHttpClient
+
+
 class FeishuMessageSender:
     """飞书消息发送器"""
     
@@ -15,33 +17,9 @@ class FeishuMessageSender:
         """
         self.app_id = app_id
         self.app_secret = app_secret
-        self.base_url = "https://open.feishu.cn/open-apis/im/v1/messages?receive_id_type=open_id"
-        self._token = None
-
-    def _get_tenant_access_token(self) -> str:
-        """获取tenant_access_token"""
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-        headers = {
-            "Content-Type": "application/json"
-        }
-        data = {
-            "app_id": self.app_id,
-            "app_secret": self.app_secret
-        }
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        return response.json()["tenant_access_token"]
-
-    def _get_headers(self) -> Dict:
-        """获取请求头"""
-        if not self._token:
-            self._token = self._get_tenant_access_token()
-            
-        return {
-            "Authorization": f"Bearer {self._token}",
-            "Content-Type": "application/json; charset=utf-8"
-        }
+        self.base_url = "/open-apis/im/v1/messages"
+        # 与表格接口共用keep-alive会话和令牌缓存
+        self.http = FeishuHttpClient.get_instance(app_id, app_secret)
 
     def send_message(
         self,
@@ -69,10 +47,9 @@ class FeishuMessageSender:
             "content": content
         }
         
-        response = requests.post(
+        return self.http.request_json(
+            "POST",
             self.base_url,
-            headers=self._get_headers(),
+            params={"receive_id_type": receive_id_type},
             json=data
         )
-        # response.raise_for_status()
-        return response.json()
\ No newline at end of file
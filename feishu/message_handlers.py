@@ -1,40 +1,44 @@
 from abc import ABC, abstractmethod
 from typing import Dict
+from config import FEISHU_EVENT_TIMEOUT
 from db.services import TransactionService
+from feishu.card_pager import TransactionCardPager
 from feishu.message import FeishuMessageSender
 from util.date_util import get_date
 class MessageHandler(ABC):
-    def __init__(self, service: TransactionService, msg_sender: FeishuMessageSender):
+    # 处理超时时间（秒），处理耗时超过该时间时分发器记录告警
+    timeout: float = FEISHU_EVENT_TIMEOUT
+
+    def __init__(self, service: TransactionService, msg_sender: FeishuMessageSender,
+                 pager: TransactionCardPager = None):
         self.service = service
         self.msg_sender = msg_sender
+        self.pager = pager or TransactionCardPager(service)
     
     @abstractmethod
     def handle(self, open_id: str, **kwargs) -> None:
         pass
 
+    def send_first_page(self, open_id: str, start_date: str = None, end_date: str = None) -> None:
+        """发送第一页交易卡片，之后通过卡片上的翻页按钮按需加载"""
+        template = self.pager.render(start_date, end_date)
+        self.msg_sender.send_message(open_id, 'interactive', template.to_json())
+
 class AllTransactionsHandler(MessageHandler):
     def handle(self, open_id: str, **kwargs) -> None:
-        transactions = self.service.get_all_transactions()
-        template = self.service.transfer_template(transactions)
-        self.msg_sender.send_message(open_id, 'interactive', template.to_json())
+        self.send_first_page(open_id)
 
 class YesterdayTransactionsHandler(MessageHandler):
     def handle(self, open_id: str, **kwargs) -> None:
-        transactions = self.service.get_transactions_by_date(get_date(-1))
-        template = self.service.transfer_template(transactions)
-        self.msg_sender.send_message(open_id, 'interactive', template.to_json())
+        self.send_first_page(open_id, get_date(-1))
 
 class TodayTransactionsHandler(MessageHandler):
     def handle(self, open_id: str, **kwargs) -> None:
-        transactions = self.service.get_transactions_by_date(get_date())
-        template = self.service.transfer_template(transactions)
-        self.msg_sender.send_message(open_id, 'interactive', template.to_json())
+        self.send_first_page(open_id, get_date())
 
 class DateRangeTransactionsHandler(MessageHandler):
     def handle(self, open_id: str, **kwargs) -> None:
-        transactions = self.service.get_transactions_by_date(kwargs['start_date'], kwargs['end_date'])
-        template = self.service.transfer_template(transactions)
-        self.msg_sender.send_message(open_id, 'interactive', template.to_json())
+        self.send_first_page(open_id, kwargs['start_date'], kwargs['end_date'])
 
 class MessageHandlerFactory:
     _handlers: Dict[str, type[MessageHandler]] = {
@@ -45,8 +49,9 @@ class MessageHandlerFactory:
     }
 
     @classmethod
-    def get_handler(cls, key: str, service: TransactionService, msg_sender: FeishuMessageSender) -> MessageHandler:
+    def get_handler(cls, key: str, service: TransactionService, msg_sender: FeishuMessageSender,
+                    pager: TransactionCardPager = None) -> MessageHandler:
         handler_class = cls._handlers.get(key)
         if not handler_class:
             raise ValueError(f'未知的操作类型: {key}')
-        return handler_class(service, msg_sender) 
\ No newline at end of file
+        return handler_class(service, msg_sender, pager) 
\ No newline at end of file
@@ -0,0 +1,155 @@
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List
+
+from config import FEISHU_BATCH_SIZE, FEISHU_FLUSH_INTERVAL, FEISHU_RETRY_MAX_BACKOFF, FEISHU_RETRY_MAX_ATTEMPTS
+from util.metrics import metrics
+
+
+class BufferedSheetWriter:
+    """
+    飞书表格的缓冲写入器
+    数据行先写入SQLite发件箱，由后台线程按行数或时间间隔合并为一次请求写入表格，
+    写入失败时保留在发件箱中按指数退避重试，重试max_attempts次后逐行写入一次，
+    仍然失败的行标记为失败不再重试，避免一行无法写入的数据阻塞后面所有的数据
+    """
+
+    def __init__(self, table, outbox=None,
+                 batch_size: int = FEISHU_BATCH_SIZE,
+                 flush_interval: float = FEISHU_FLUSH_INTERVAL,
+                 max_backoff: float = FEISHU_RETRY_MAX_BACKOFF,
+                 max_attempts: int = FEISHU_RETRY_MAX_ATTEMPTS):
+        """
+        Args:
+            table: 飞书表格(FeishuTable)
+            outbox: 发件箱服务，默认使用SheetOutboxService
+            batch_size: 满多少行立即写入，同时也是单次请求的最大行数
+            flush_interval: 最长等待多少秒写入一次
+            max_backoff: 重试的最大间隔秒数
+            max_attempts: 整批写入最多尝试的次数
+        """
+        if outbox is None:
+            from db.services import SheetOutboxService
+            outbox = SheetOutboxService()
+        self.table = table
+        self.outbox = outbox
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max(1, max_attempts)
+        self.logger = logging.getLogger("SheetWriter")
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        metrics.register_gauge("queue_depth", self.outbox.count_pending, "队列中等待处理的数量", queue="SheetOutbox")
+        metrics.register_gauge("sheet_outbox_failed", self.outbox.count_failed, "重试次数用尽、未写入飞书表格的行数")
+
+    def start(self) -> None:
+        """启动后台写入线程，启动时会先写入上次遗留在发件箱中的数据"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="SheetWriter", daemon=True)
+        self._thread.start()
+
+    def append(self, values: List[list]) -> None:
+        """
+        追加数据行，写入发件箱后立即返回
+
+        Args:
+            values: 数据行列表，每行为[时间, 类型, 金额, 备注]
+        """
+        self.outbox.enqueue(values)
+        with self._pending_lock:
+            self._pending += len(values)
+            full = self._pending >= self.batch_size
+        if full:
+            self._wakeup.set()
+        self.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"写入飞书表格失败: {e}")
+
+    def flush(self) -> int:
+        """
+        把发件箱中已到期的数据写入表格，直到没有可写入的数据或写入失败
+
+        Returns:
+            int: 成功写入的行数
+        """
+        written = 0
+        with self._flush_lock:
+            with self._pending_lock:
+                self._pending = 0
+            while True:
+                rows = self.outbox.fetch_due(self.batch_size)
+                if not rows:
+                    break
+                ids = [row.id for row in rows]
+                # 表格采用头部插入，最新的数据在最上面
+                values = [json.loads(row.values) for row in reversed(rows)]
+                error = self._insert(values)
+                if error:
+                    attempts = max(row.attempts for row in rows) + 1
+                    if attempts >= self.max_attempts:
+                        written += self._write_each(rows, error)
+                        continue
+                    backoff = min(self.max_backoff, self.flush_interval * (2 ** attempts))
+                    self.outbox.mark_failed(ids, error, datetime.now() + timedelta(seconds=backoff))
+                    self.logger.warning(f"写入飞书表格失败，{backoff}秒后重试: {error}")
+                    break
+                self.outbox.remove(ids)
+                written += len(ids)
+                if len(rows) < self.batch_size:
+                    break
+        return written
+
+    def _write_each(self, rows, error: str) -> int:
+        """
+        整批重试次数用尽后逐行写入一次，找出无法写入的行并标记为失败
+
+        Returns:
+            int: 成功写入的行数
+        """
+        written = 0
+        for row in rows:
+            row_error = self._insert([json.loads(row.values)])
+            if row_error:
+                self.outbox.park([row.id], row_error)
+                self.logger.error(f"写入飞书表格失败{row.attempts + 1}次，已放弃: {row.values}, {row_error}")
+            else:
+                self.outbox.remove([row.id])
+                written += 1
+        return written
+
+    def _insert(self, values: List[list]) -> str:
+        """调用飞书接口写入，成功返回空字符串，失败返回错误信息"""
+        try:
+            response = self.table.insert_data(values)
+        except Exception as e:
+            return str(e)
+        if not isinstance(response, dict) or response.get('code') != 0:
+            return json.dumps(response, ensure_ascii=False) if isinstance(response, dict) else str(response)
+        return ''
+
+    def close(self, timeout: float = 5.0) -> None:
+        """停止后台线程，并尝试写入剩余数据"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            self.logger.error(f"关闭时写入飞书表格失败: {e}")
@@ -3,14 +3,13 @@ import threading
 import time
 from pathlib import Path
 
-import requests
-from typing import Dict
+from typing import Dict, Optional
 import lark_oapi as lark
-from lark_oapi.api.drive.v1 import *
-from lark_oapi.api.sheets.v3 import GetSpreadsheetRequest, GetSpreadsheetResponse, QuerySpreadsheetSheetRequest, \
-    QuerySpreadsheetSheetResponse
+from lark_oapi.core.utils.files import Files
 
 from config import SHEET_TOKEN, WORK_TABLE
+from feishu.http_client import FeishuHttpClient
+from util.metrics import metrics
 from util.common_util import find_project_root
 
 
@@ -27,39 +26,11 @@ class FeishuTable:
         """
         self.app_id = app_id
         self.app_secret = app_secret
-        self.base_url = f"https://open.feishu.cn/open-apis/sheets/v2/spreadsheets/{token}/values_prepend"
-        self._access_token = None
+        self.base_url = f"/open-apis/sheets/v2/spreadsheets/{token}/values_prepend"
         self.sheet_token = token
-        self.client = lark.Client.builder() \
-            .app_id(app_id) \
-            .app_secret(app_secret) \
-            .log_level(lark.LogLevel.INFO) \
-            .build()
-
-    def _get_tenant_access_token(self) -> str:
-        """获取tenant_access_token"""
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-        headers = {
-            "Content-Type": "application/json"
-        }
-        data = {
-            "app_id": self.app_id,
-            "app_secret": self.app_secret
-        }
-
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        return response.json()["tenant_access_token"]
-
-    def _get_headers(self) -> Dict:
-        """获取请求头"""
-        if not self._access_token:
-            self._access_token = self._get_tenant_access_token()
-
-        return {
-            "Authorization": f"Bearer {self._access_token}",
-            "Content-Type": "application/json; charset=utf-8"
-        }
+        # 表格、云文档接口共用一个keep-alive会话和令牌缓存
+        self.http = FeishuHttpClient.get_instance(app_id, app_secret)
+        self._file_path = None
 
     def insert_data(
             self,
@@ -69,51 +40,48 @@ class FeishuTable:
         插入数据
 
         Args:
-            values: 指定工作表中的范围和在该范围中插入的数据。
+            values: 指定工作表中的范围和在该范围中插入的数据，支持一次插入多行。
         Returns:
             Dict: 发送结果
         """
 
+        # 多行数据一次插入，范围行数与数据行数一致
         data = {"valueRange": {
-            "range": f"{WORK_TABLE}!A2:D2",
+            "range": f"{WORK_TABLE}!A2:D{len(values) + 1}",
             "values": values
         }}
-        response = requests.post(
-            self.base_url,
-            headers=self._get_headers(),
-            json=data
-        )
-        # response.raise_for_status()
-        return response.json()
+        metrics.incr("feishu_insert_rows_total", len(values), "写入飞书表格的行数")
+        with metrics.timer("feishu_insert_seconds", "飞书表格写入耗时"):
+            return self.http.request_json("POST", self.base_url, json=data)
 
-    def get_table_name(self) -> Optional[str]:
-        # 构造请求对象
-        request: GetSpreadsheetRequest = GetSpreadsheetRequest.builder() \
-            .spreadsheet_token(self.sheet_token) \
-            .user_id_type("open_id") \
-            .build()
+    @staticmethod
+    def _log_error(action: str, response: Dict) -> None:
+        lark.logger.error(
+            f"{action} failed, code: {response.get('code')}, msg: {response.get('msg')}, resp: \n{json.dumps(response, indent=4, ensure_ascii=False)}")
 
+    def get_table_name(self) -> Optional[str]:
         # 发起请求
-        response: GetSpreadsheetResponse = self.client.sheets.v3.spreadsheet.get(request)
+        response = self.http.request_json(
+            "GET",
+            f"/open-apis/sheets/v3/spreadsheets/{self.sheet_token}",
+            params={"user_id_type": "open_id"}
+        )
 
         # 处理失败返回
-        if not response.success():
-            lark.logger.error(
-                f"client.sheets.v3.spreadsheet.get failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}, resp: \n{json.dumps(json.loads(response.raw.content), indent=4, ensure_ascii=False)}")
+        if response.get("code") != 0:
+            self._log_error("sheets.v3.spreadsheet.get", response)
             return None
 
         # 处理业务结果
-        return response.data.spreadsheet.title
+        return response["data"]["spreadsheet"]["title"]
 
     def get_sheet_name(self) -> Optional[str]:
-        # 构造请求对象
-        request: QuerySpreadsheetSheetRequest = QuerySpreadsheetSheetRequest.builder() \
-            .spreadsheet_token(self.sheet_token) \
-            .build()
-
         # 发起请求
-        response: QuerySpreadsheetSheetResponse = self.client.sheets.v3.spreadsheet_sheet.query(request)
-        return response.data.sheets[0].title
+        response = self.http.request_json("GET", f"/open-apis/sheets/v3/spreadsheets/{self.sheet_token}/sheets/query")
+        if response.get("code") != 0:
+            self._log_error("sheets.v3.spreadsheet_sheet.query", response)
+            return None
+        return response["data"]["sheets"][0]["title"]
 
     def async_export_table(self):
         thread = threading.Thread(target=self.export_table)
@@ -126,72 +94,65 @@ class FeishuTable:
             self._download_file(file_token)
 
     def _create_export_task(self) -> Optional[str]:
-        request: CreateExportTaskRequest = CreateExportTaskRequest.builder() \
-            .request_body(ExportTask.builder()
-                          .file_extension("csv")
-                          .token(self.sheet_token)
-                          .type("sheet")
-                          .sub_id(WORK_TABLE)
-                          .build()) \
-            .build()
+        body = {
+            "file_extension": "csv",
+            "token": self.sheet_token,
+            "type": "sheet",
+            "sub_id": WORK_TABLE,
+        }
 
         # 发起请求
-        response: CreateExportTaskResponse = self.client.drive.v1.export_task.create(request)
+        response = self.http.request_json("POST", "/open-apis/drive/v1/export_tasks", json=body)
 
         # 处理失败返回
-        if not response.success():
-            lark.logger.error(
-                f"client.drive.v1.export_task.create failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}, resp: \n{json.dumps(json.loads(response.raw.content), indent=4, ensure_ascii=False)}")
+        if response.get("code") != 0:
+            self._log_error("drive.v1.export_task.create", response)
             return None
 
         # 处理业务结果
-        lark.logger.info(lark.JSON.marshal(response.data, indent=4))
-        return response.data.ticket
+        lark.logger.info(json.dumps(response.get("data"), indent=4, ensure_ascii=False))
+        return response["data"]["ticket"]
 
     def _query_task(self, ticket: Optional[str] = None) -> Optional[str]:
-        # 构造请求对象
         for i in range(10):
-            request: GetExportTaskRequest = GetExportTaskRequest.builder() \
-                .ticket(ticket) \
-                .token(self.sheet_token) \
-                .build()
-
             # 发起请求
-            response: GetExportTaskResponse = self.client.drive.v1.export_task.get(request)
-            if not response.success():
-                lark.logger.error(
-                    f"查询导出任务异常, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}, resp: \n{json.dumps(json.loads(response.raw.content), indent=4, ensure_ascii=False)}")
+            response = self.http.request_json(
+                "GET",
+                f"/open-apis/drive/v1/export_tasks/{ticket}",
+                params={"token": self.sheet_token}
+            )
+            if response.get("code") != 0:
+                self._log_error("查询导出任务异常", response)
                 return None
-            result = response.data.result
-            if result.job_status == 0:
-                return result.file_token
-            if result.job_status != 1 and result.job_status != 2:
-                print(f'查询导出任务job异常, job_status: {result.job_status}, msg: {result.job_error_msg}')
+            result = response["data"]["result"]
+            if result.get("job_status") == 0:
+                return result.get("file_token")
+            if result.get("job_status") not in (1, 2):
+                print(f'查询导出任务job异常, job_status: {result.get("job_status")}, msg: {result.get("job_error_msg")}')
                 return None
             time.sleep(1)
         return None
 
     def _download_file(self, file_token: str) -> None:
-        # 构造请求对象
-        request: DownloadExportTaskRequest = DownloadExportTaskRequest.builder() \
-            .file_token(file_token) \
-            .build()
-
         # 发起请求
-        response: DownloadExportTaskResponse = self.client.drive.v1.export_task.download(request)
+        response = self.http.request("GET", f"/open-apis/drive/v1/export_tasks/file/{file_token}/download")
 
         # 处理失败返回
-        if not response.success():
-            lark.logger.error(
-                f"client.drive.v1.export_task.download failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}, resp: \n{json.dumps(json.loads(response.raw.content), indent=4, ensure_ascii=False)}")
+        if response.status_code != 200 or "json" in response.headers.get("Content-Type", ""):
+            try:
+                error = response.json()
+            except ValueError:
+                error = {"code": response.status_code, "msg": response.text[:200]}
+            self._log_error("drive.v1.export_task.download", error)
             return
-        file_path = f'{find_project_root()}/{response.file_name}'
+        file_path = f'{find_project_root()}/{Files.parse_file_name(response.headers)}'
         Path(file_path).unlink(missing_ok=True)
         # 处理业务结果
-        f = open(f"{file_path}", "wb")
-        f.write(response.file.read())
-        f.close()
-        pass
+        with open(file_path, "wb") as f:
+            f.write(response.content)
 
     def get_file_path(self):
-        return f'{find_project_root()}/{self.get_table_name()}-{self.get_sheet_name()}.csv'
\ No newline at end of file
+        """导出的CSV文件路径，表格名称只查询一次"""
+        if self._file_path is None:
+            self._file_path = f'{find_project_root()}/{self.get_table_name()}-{self.get_sheet_name()}.csv'
+        return self._file_path
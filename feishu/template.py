@@ -1,15 +1,20 @@
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
 
 @dataclass
 class TemplateVariable:
     transactions: List[Any]
+    # 分页变量(page、has_prev、has_next、prev_cursor、next_cursor等)，不分页时为None
+    page: Optional[Dict[str, Any]] = None
 
     def to_dict(self) -> Dict[str, Any]:
-        return {
+        result = {
             "transactions": self.transactions
         }
+        if self.page:
+            result.update(self.page)
+        return result
 
 @dataclass
 class TemplateData:
@@ -45,13 +50,16 @@ class Template:
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Template':
         template_data = data["data"]
+        variables = dict(template_data["template_variable"])
+        transactions = variables.pop("transactions")
         return cls(
             type=data["type"],
             data=TemplateData(
                 template_id=template_data["template_id"],
                 template_version_name=template_data["template_version_name"],
                 template_variable=TemplateVariable(
-                    transactions=template_data["template_variable"]["transactions"]
+                    transactions=transactions,
+                    page=variables or None
                 )
             )
         )
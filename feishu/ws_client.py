@@ -1,6 +1,7 @@
 import lark_oapi as lark
 import threading
 from lark_oapi.api.application.v6 import P2ApplicationBotMenuV6
+from lark_oapi.event.callback.model.p2_card_action_trigger import P2CardActionTrigger, P2CardActionTriggerResponse
 
 
 from config import APP_ID, APP_SECRET
@@ -13,32 +14,32 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
     print(
         f'[ do_p2_im_message_receive_v1 access ], data: {lark.JSON.marshal(data.event.sender.sender_id.open_id, indent=4)}')
 
-#
+# 菜单事件交给后台线程处理，回调立即返回，避免慢查询阻塞后续事件的接收
 def do_message_event(data: P2ApplicationBotMenuV6) -> None:
-    from db.services import TransactionService
-    from feishu.message import FeishuMessageSender
-    from feishu.message_handlers import MessageHandlerFactory
-    service = TransactionService()
-    msg_sender = FeishuMessageSender(APP_ID, APP_SECRET)
+    from app_context import AppContext
     print(f'[do_message_event access] key: {data.event.event_key}')
+    if not AppContext().feishu_events.submit(data.event.event_key, data.event.operator.operator_id.open_id):
+        print(f"事件队列已满，丢弃事件: {data.event.event_key}")
+
+
+# 卡片翻页按钮回调，只查询一页数据，直接在响应中返回新的卡片替换原卡片
+def do_card_action(data: P2CardActionTrigger) -> P2CardActionTriggerResponse:
+    from app_context import AppContext
+    value = data.event.action.value if data.event and data.event.action else None
     try:
-        handler = MessageHandlerFactory.get_handler(
-            data.event.event_key,
-            service,
-            msg_sender
-        )
-        handler.handle(data.event.operator.operator_id.open_id)
-    except ValueError as e:
-        print(f"错误: {str(e)}")
-        # 可以在这里处理未知key的情况，比如发送错误提示消息
+        template = AppContext().card_pager.handle_action(value)
     except Exception as e:
-        print(f"处理消息时发生错误: {str(e)}")
-        # 可以在这里处理其他异常情况
+        print(f"处理卡片翻页时发生错误: {str(e)}")
+        return P2CardActionTriggerResponse({"toast": {"type": "error", "content": "加载失败，请稍后重试"}})
+    if template is None:
+        return P2CardActionTriggerResponse()
+    return P2CardActionTriggerResponse({"card": template.to_dict()})
 
 
 event_handler = lark.EventDispatcherHandler.builder("", "") \
     .register_p2_im_message_receive_v1(do_p2_im_message_receive_v1) \
     .register_p2_application_bot_menu_v6(do_message_event) \
+    .register_p2_card_action_trigger(do_card_action) \
     .build()
 
 
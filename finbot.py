@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
 
+import json
 import logging
+import os
 import time
+from concurrent.futures import Future
 from queue import Empty
 from threading import Thread
+from typing import Optional
 
 import schedule
 
-from wcferry import Wcf, WxMsg
-
 from config import WX_ID
+from send_queue import OutboundQueue
+from worker_pool import OrderedWorkerPool
+from wx_transport import SimMsg, WxTransport, WcfTransport
+
+# 队列满且策略为spill时，溢出的消息写入该文件，每行一条JSON，下次开始接收消息时重新处理
+SPILL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spill.jsonl')
 
 
 class FinBot:
@@ -17,23 +25,28 @@ class FinBot:
     _instance = None
     _initialized = False
 
-    def __new__(cls, wcf=None):
+    def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self) -> None:
+    def __init__(self, transport: WxTransport = None, msg_parser=None) -> None:
+        """
+        Args:
+            transport: 微信传输层，默认通过wcferry连接微信客户端，只在第一次创建单例时生效
+            msg_parser: 消息解析器，默认使用AppContext中的共享实例
+        """
         if not self._initialized:
             print('FinBot.__init__()')
-            self.wcf = Wcf(debug=True)
+            self.wcf = transport or WcfTransport()
+            self.msg_parser = msg_parser
             self.LOG = logging.getLogger("Robot")
             self.wxid = self.wcf.get_self_wxid() if self.wcf else None
+            self.pool = OrderedWorkerPool(self.processMsg, spill_handler=self._spill_msg, name="ProcessMsg")
+            self.outbox = OutboundQueue(self._send_now)
             self._initialized = True
 
-    def processMsg(self, msg: WxMsg) -> None:
-        from message_parser import MessageParser
-
-        msg_parser = MessageParser()
+    def processMsg(self, msg) -> None:
         """当接收到消息的时候，会调用本方法。如果不实现本方法，则打印原始消息。
         此处可进行自定义发送的内容,如通过 msg.content 关键字自动获取当前天气信息，并发送到对应的群组@发送者
         群号：msg.roomid  微信ID：msg.sender  消息内容：msg.content
@@ -41,18 +54,23 @@ class FinBot:
         receivers = msg.roomid
         self.sendTextMsg(content, receivers, msg.sender)
         """
+        msg_parser = self.msg_parser
+        if msg_parser is None:
+            from app_context import AppContext
+            msg_parser = AppContext().msg_parser
         if msg.type == 1 and msg.sender == WX_ID:
             msg_parser.parse_msg_self(msg.content)
         if msg.type == 49:
             msg_parser.parse_msg_xml(msg.content)
 
     def enableReceivingMsg(self) -> None:
-        def innerProcessMsg(wcf: Wcf):
+        def innerProcessMsg(wcf: WxTransport):
+            # 接收线程只负责取消息，处理交给线程池，同一会话的消息保持顺序
             while wcf.is_receiving_msg():
                 try:
                     msg = wcf.get_msg()
                     # self.LOG.info(msg)
-                    self.processMsg(msg)
+                    self.pool.submit(msg.roomid or msg.sender, msg)
                 except Empty:
                     continue  # Empty message
                 except Exception as e:
@@ -60,10 +78,58 @@ class FinBot:
 
         # print(f'消息类型: ${self.wcf.get_msg_types()}')
         self.wcf.enable_receiving_msg()
-
+        self.pool.start()
+        # 先提交上次溢出的消息，再开始接收新消息，同一会话内的顺序不变
+        self.drain_spill()
 
         Thread(target=innerProcessMsg, name="GetMessage", args=(self.wcf,), daemon=True).start()
 
+    def _spill_msg(self, msg) -> None:
+        """队列已满时把消息写入溢出文件"""
+        record = {
+            "id": msg.id,
+            "ts": msg.ts,
+            "type": msg.type,
+            "sender": msg.sender,
+            "roomid": msg.roomid,
+            "content": msg.content,
+            "xml": msg.xml,
+        }
+        with open(SPILL_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def drain_spill(self, path: str = SPILL_FILE) -> int:
+        """
+        把溢出文件中的消息重新提交到线程池
+        处理前先把文件改名，中途退出时下次会从改名后的文件继续，提交时再次溢出的消息写入新的溢出文件
+
+        Args:
+            path: 溢出文件路径
+        Returns:
+            int: 重新提交的消息数
+        """
+        draining = path + '.draining'
+        if not os.path.exists(draining):
+            if not os.path.exists(path):
+                return 0
+            os.replace(path, draining)
+        count = 0
+        with open(draining, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 写入时被中断的最后一行
+                    self.LOG.warning(f"跳过无法解析的溢出消息: {line[:100]}")
+                    continue
+                msg = SimMsg(**record)
+                self.pool.submit(msg.roomid or msg.sender, msg)
+                count += 1
+        os.remove(draining)
+        if count:
+            print(f"已重新提交 {count} 条溢出消息")
+        return count
+
     def getAllContacts(self) -> dict:
         """
         获取联系人（包括好友、公众号、服务号、群成员……）
@@ -80,17 +146,27 @@ class FinBot:
             schedule.run_pending()
             time.sleep(1)
 
-    def send_text_msg(self, content: str, retry: int=3) -> None:
+    def send_text_msg(self, content: str, retry: int=3, receiver: str = WX_ID) -> Optional[Future]:
+        """
+        发送文本消息，放入发送队列后立即返回，由发送线程限速发送并在失败时重试
+
+        Args:
+            content: 消息内容
+            retry: 最多发送次数
+            receiver: 接收者，默认为自己
+        Returns:
+            Optional[Future]: 发送结果，成功时为True；wcf没有初始化时返回None
+        """
         if self.wcf:
-            cnt = 0
-            while cnt < retry:
-                result = self.wcf.send_text(content, WX_ID)
-                if result == 0:
-                    return
-                time.sleep(1)
-                cnt += 1
-        else:
-            print('wcf没有初始化')
+            return self.outbox.send(content, receiver, max_attempts=retry)
+        print('wcf没有初始化')
+        return None
+
+    def _send_now(self, content: str, receiver: str) -> bool:
+        """在发送线程中调用wcf发送"""
+        return self.wcf.send_text(content, receiver) == 0
 
     def clean(self):
+        self.pool.shutdown()
+        self.outbox.close()
         self.wcf.cleanup()
\ No newline at end of file
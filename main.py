@@ -2,21 +2,25 @@ import signal
 
 from wcferry import Wcf
 
+from app_context import AppContext
 from db import init_db
 from finbot import FinBot
 from feishu import start_feishu_bot
 from scheduler.jobs.daily_summary_task import DailySummaryTask
 from scheduler.jobs.update_csv_task import UpdateCsvTask
 from scheduler.task_manager import TaskManager
+from util.metrics import start_metrics_server
 
 init_db()
 start_feishu_bot()
+start_metrics_server()
 def start_fin_bot():
     robot = FinBot()
     task_manager = TaskManager()
     def handler(sig, frame):
         task_manager.shutdown()
         robot.clean()
+        AppContext().shutdown()
         exit(0)
 
     task_manager.register_task(DailySummaryTask())
@@ -0,0 +1,80 @@
+import re
+from typing import Dict, Iterable, Optional
+
+from config import BANK_ACCOUNTS, BANK_MSG_TITLES
+
+# appmsg中用于判断来源和标题的字段
+APPMSG_FIELDS = ('title', 'des', 'sourcedisplayname', 'appname', 'nickname', 'fromusername', 'sourceusername')
+# 可以表示消息来源的字段
+SOURCE_FIELDS = ('sourcedisplayname', 'appname', 'nickname', 'fromusername', 'sourceusername')
+
+_FIELD_PATTERNS = {
+    field: re.compile(rf'<{field}>\s*(?:<!\[CDATA\[(.*?)\]\]>|([^<]*?))\s*</{field}>', re.S)
+    for field in APPMSG_FIELDS
+}
+
+
+def extract_appmsg_fields(content: str, fields: Iterable[str] = APPMSG_FIELDS) -> Dict[str, str]:
+    """
+    用正则从XML中提取appmsg的字段，不构建完整的DOM，每个字段只取第一次出现的值
+
+    Args:
+        content: 原始XML内容
+        fields: 需要提取的字段
+    Returns:
+        Dict[str, str]: 字段名到文本值的映射，不存在的字段不会出现在结果中
+    """
+    result = {}
+    if not content:
+        return result
+    for field in fields:
+        pattern = _FIELD_PATTERNS.get(field)
+        if pattern is None:
+            continue
+        match = pattern.search(content)
+        if match:
+            value = match.group(1) if match.group(1) is not None else match.group(2)
+            result[field] = value.strip()
+    return result
+
+
+class BankMessageFilter:
+    """银行交易提醒的预过滤器，在调用大模型之前丢弃无关的分享、文件、小程序、文章等消息"""
+
+    def __init__(self, accounts: Iterable[str] = BANK_ACCOUNTS, titles: Iterable[str] = BANK_MSG_TITLES):
+        """
+        Args:
+            accounts: 银行服务号白名单（名称或gh_原始ID），为空时按名称以"银行"结尾判断
+            titles: 允许的消息标题，为空时不校验标题
+        """
+        self.accounts = set(accounts or [])
+        self.titles = set(titles or [])
+
+    def classify(self, content: str) -> Optional[str]:
+        """
+        判断是否为需要解析的银行交易提醒
+
+        Args:
+            content: 原始XML内容
+        Returns:
+            Optional[str]: 命中的银行来源，不是银行交易提醒时返回None
+        """
+        if not content or '<appmsg' not in content:
+            return None
+        fields = extract_appmsg_fields(content, ('title',) + SOURCE_FIELDS)
+        if self.titles and fields.get('title') not in self.titles:
+            return None
+        for field in SOURCE_FIELDS:
+            source = fields.get(field)
+            if not source:
+                continue
+            if self.accounts:
+                if source in self.accounts:
+                    return source
+            elif source.endswith('银行'):
+                return source
+        return None
+
+    def accept(self, content: str) -> bool:
+        """是否放行该消息"""
+        return self.classify(content) is not None
@@ -1,19 +1,48 @@
-from datetime import datetime
-import json
+import threading
+from datetime import datetime, timedelta
+from typing import List
 
+from sqlalchemy.exc import IntegrityError
 
 from analysis import FinanceAnalyzer
+from bank_extractor import BankExtractor
 from db.services import TransactionService
-from config import APP_ID, APP_SECRET, WX_ID
+from extraction_batcher import ExtractionBatcher
+from config import APP_ID, APP_SECRET, WX_ID, WX_MSG_MAX_BYTES, REPLAY_DEDUP_WINDOW
+from feishu.sheet_writer import BufferedSheetWriter
 from feishu.table import FeishuTable
+from message_filter import BankMessageFilter
+from raw_log import RawMessageLog, RawRecord, record_id
+from send_queue import pack_lines
+from util.metrics import metrics
 from util.date_util import get_date
 
 
 class MessageParser:
-    def __init__(self):
-        self.analyzer = FinanceAnalyzer()
-        self.service = TransactionService()
-        self.feishu_table = FeishuTable(APP_ID, APP_SECRET)
+    def __init__(self, analyzer: FinanceAnalyzer = None, service: TransactionService = None,
+                 feishu_table: FeishuTable = None, sheet_writer: BufferedSheetWriter = None,
+                 batcher: ExtractionBatcher = None, raw_log: RawMessageLog = None):
+        """
+        初始化消息解析器，未传入的依赖会新建，常驻进程内应通过AppContext获取共享实例
+
+        Args:
+            analyzer: 财务分析器
+            service: 交易记录服务
+            feishu_table: 飞书表格
+            sheet_writer: 飞书表格的缓冲写入器
+            batcher: 大模型批量解析器，默认新建，解析结果交给_on_extracted入库
+            raw_log: 原始消息日志，默认新建
+        """
+        self.feishu_table = feishu_table or FeishuTable(APP_ID, APP_SECRET)
+        self.sheet_writer = sheet_writer or BufferedSheetWriter(self.feishu_table)
+        self.analyzer = analyzer or FinanceAnalyzer()
+        self.service = service or TransactionService()
+        self.msg_filter = BankMessageFilter()
+        self.extractor = BankExtractor()
+        self.batcher = batcher or ExtractionBatcher(self._batch_extract, self._on_extracted)
+        self.raw_log = raw_log or RawMessageLog()
+        # 重放时去重和写入需要串行，避免并发的批次重复写入同一笔交易
+        self._replay_lock = threading.Lock()
 
     def clean_text(self, text):
         """清理文本内容"""
@@ -22,32 +51,130 @@ class MessageParser:
         return text.strip()
     
     def insert_feishu(self, values):
-        """向飞书表格插入数据"""
-        self.feishu_table.insert_data(values)
+        """向飞书表格插入数据，先写入发件箱，由后台线程批量写入"""
+        self.sheet_writer.append(values)
     
-    def parse_msg_xml(self, content):
-        from ai.services.manager import AIManager
-        """解析XML消息内容"""
-        try:
-            with open('./msg.xml', 'a+', encoding='utf-8') as f:
-                f.write(content + '\n')
-            ai_manager = AIManager()
-            response = ai_manager.simple_chat(content)
-            data = json.loads(response.content)
-            print("response:", response.content)
-            if data['publisher'] and data['publisher'].endswith('银行') and data['标题'] == '交易提醒':
-                data['transaction_time'] = datetime.now().strftime('%Y年%m月%d日 %H:%M:%S')
-                data.pop('标题')
-                self.service.create(data)
-                values = [[data['transaction_time'], data['type'], data['amount'], data['remark']]]
-                self.insert_feishu(values)
-                return data
-            print("不符合条件，跳过解析。")
+    def parse_msg_xml(self, content, msg_type: int = 49):
+        """
+        解析XML消息内容
+        模板能解析的消息直接入库并返回结果；需要大模型解析的消息提交给批量解析器后返回None，
+        解析完成后由_on_extracted入库。两种消息都以这里记录的接收时间作为交易时间，
+        大模型解析的交易虽然入库较晚，按交易时间排序时仍然在它之后到达的消息之前
+        """
+        received_at = datetime.now()
+        # 先做预过滤，非银行交易提醒直接丢弃，不再调用大模型
+        if not self.msg_filter.accept(content):
+            metrics.incr("messages_total", help="收到的消息数，按处理路径区分", path="filtered")
             return None
-    
+        try:
+            # 保存原始消息，之后可以通过replay.py重放
+            self.raw_log.append(content, msg_type, ts=received_at.timestamp())
+            # 优先使用模板解析，已知格式不需要调用大模型
+            data = self.extractor.extract(content)
+            if data is None:
+                # 重连后银行会集中推送大量提醒，攒批后一次请求解析
+                metrics.incr("messages_total", help="收到的消息数，按处理路径区分", path="llm")
+                self.batcher.submit(content, received_at)
+                return None
+            print("template:", data)
+            metrics.incr("messages_total", help="收到的消息数，按处理路径区分", path="template")
+            return self._save_transaction(data, received_at, record_id(content, received_at.timestamp()))
         except Exception as e:
             print(f"Error with : {str(e)}")
             return None
+
+    @staticmethod
+    def _batch_extract(contents):
+        from ai.services.manager import AIManager
+        return AIManager().batch_extract(contents)
+
+    def _on_extracted(self, content, data, received_at: datetime = None):
+        """大模型解析完成后的回调，在批量解析线程中按消息到达的顺序调用，交易时间为消息的接收时间"""
+        if data is None:
+            print("大模型解析失败，跳过。")
+            return None
+        print("response:", data)
+        if self._is_transaction(data):
+            self.extractor.propose_template(content, data)
+        source_id = record_id(content, received_at.timestamp()) if received_at else None
+        return self._save_transaction(data, received_at, source_id)
+
+    def _save_transaction(self, data, received_at: datetime = None, source_id: str = None,
+                          dedup: bool = False, sync_feishu: bool = True):
+        """
+        交易提醒写入数据库和飞书表格
+
+        Args:
+            data: 解析结果
+            received_at: 消息的接收时间，作为交易时间，默认为当前时间
+            source_id: 来源消息在原始消息日志中的标识，重放时据此去重
+            dedup: 是否跳过已入库的交易
+            sync_feishu: 是否写入飞书表格
+        Returns:
+            写入的交易，非交易提醒或已存在时返回None
+        """
+        if not self._is_transaction(data):
+            print("不符合条件，跳过解析。")
+            return None
+        data['transaction_time'] = (received_at or datetime.now()).strftime('%Y年%m月%d日 %H:%M:%S')
+        data.pop('标题')
+        data['source_id'] = source_id
+        if dedup:
+            if self.service.match_existing(data, timedelta(seconds=REPLAY_DEDUP_WINDOW)):
+                return None
+            try:
+                self.service.create(data)
+            except IntegrityError:
+                # 机器人在另一个进程中刚写入了同一条消息
+                return None
+        else:
+            self.service.create(data)
+        if sync_feishu:
+            values = [[data['transaction_time'], data['type'], data['amount'], data['remark']]]
+            self.insert_feishu(values)
+        return data
+
+    def replay(self, records: List[RawRecord], sync_feishu: bool = True) -> int:
+        """
+        重放一批原始消息，以消息的接收时间作为交易时间，已入库的交易会跳过
+        需要大模型解析的消息合并为一次批量请求，在调用线程中同步完成，可以由多个线程并发调用
+
+        Args:
+            records: 原始消息
+            sync_feishu: 是否写入飞书表格
+        Returns:
+            int: 新写入的交易数
+        """
+        from ai.services.manager import AIManager
+
+        parsed = []
+        pending = []
+        for record in records:
+            if not self.msg_filter.accept(record.content):
+                continue
+            data = self.extractor.extract(record.content)
+            if data is None:
+                pending.append(len(parsed))
+            parsed.append([record, data])
+        if pending:
+            results = AIManager(notify=False).batch_extract([parsed[i][0].content for i in pending])
+            for i, data in zip(pending, results):
+                parsed[i][1] = data
+
+        saved = 0
+        for record, data in parsed:
+            if data is None:
+                continue
+            with self._replay_lock:
+                if self._save_transaction(data, datetime.fromtimestamp(record.ts), record.id,
+                                          dedup=True, sync_feishu=sync_feishu):
+                    saved += 1
+        return saved
+
+    @staticmethod
+    def _is_transaction(data: dict) -> bool:
+        """解析结果是否为银行交易提醒"""
+        return bool(data.get('publisher')) and data['publisher'].endswith('银行') and data.get('标题') == '交易提醒'
     
     def parse_msg_self(self, content: str):
         if content.startswith('#') is False and content.startswith('@AI') is False:
@@ -56,6 +183,10 @@ class MessageParser:
         """解析自定义消息内容"""
         data = []
         finBot = FinBot()
+        if content == '#状态':
+            self._send_status(finBot)
+            return
+
         # 处理AI对话
         if content.startswith('@AI'):
             self.analyzer.chat_with_ai(content.split(" ")[1])
@@ -83,25 +214,20 @@ class MessageParser:
         # 分批发送数据
         self._send_batch_data(data, finBot)
     
-    def _send_batch_data(self, data, finBot):
-        """分批发送数据"""
-        batch_size = 3  # 每批包含的交易数量
-        start_index = 0
-        
-        while start_index < len(data):
-            current_batch = data[start_index:start_index + batch_size]
-            batch_messages = []
-            
-            # 获取当前批次的数据
-            for transaction in current_batch:
-                transaction_lines = self._format_transaction(transaction)
-                batch_messages.append("\n".join(transaction_lines))
-                
-            msg = "\n".join(batch_messages)
+    def _send_status(self, finBot):
+        """发送各阶段耗时的p50/p95/p99、计数和队列深度"""
+        lines = metrics.format_status()
+        if not lines:
+            finBot.send_text_msg('暂无指标数据')
+            return
+        for msg in pack_lines(['FinBot状态'] + lines, WX_MSG_MAX_BYTES):
             finBot.send_text_msg(msg)
 
-            # 更新start_index以指向下一个批次的起始位置
-            start_index += batch_size
+    def _send_batch_data(self, data, finBot):
+        """按字节数把多笔交易合并为尽量少的消息，放入发送队列"""
+        blocks = ["\n".join(self._format_transaction(transaction)) for transaction in data]
+        for msg in pack_lines(blocks, WX_MSG_MAX_BYTES):
+            finBot.send_text_msg(msg)
     
     def _format_transaction(self, transaction):
         """格式化交易数据"""
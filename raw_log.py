@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterator, List
+
+from config import RAW_LOG_SEGMENT_BYTES, RAW_LOG_COMPRESS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 原始消息日志目录，替代原来的msg.xml
+RAW_LOG_DIR = os.path.join(BASE_DIR, 'raw_log')
+INDEX_FILE = 'index.json'
+
+# 记录头: 内容长度(uint32) | 内容的CRC32(uint32) | 接收时间戳(float64) | 消息类型(uint16)，小端
+HEADER = struct.Struct('<IIdH')
+_SEGMENT_NAME = re.compile(r'^segment-(\d{8})\.log(\.gz)?$')
+
+
+@dataclass
+class RawRecord:
+    """一条原始消息"""
+    ts: float
+    msg_type: int
+    content: str
+    # 内容的CRC32，读取日志时从记录头获得
+    crc: int = 0
+
+    @property
+    def id(self) -> str:
+        """记录标识，与入库交易的source_id对应"""
+        return f'{self.ts:.6f}-{self.crc:08x}'
+
+
+def record_id(content: str, ts: float) -> str:
+    """
+    计算消息写入日志后的记录标识(接收时间戳-CRC32)，交易以此记录来源的消息，重放时据此去重
+
+    Args:
+        content: 消息内容
+        ts: 接收时间戳，与append时传入的相同
+    """
+    return RawRecord(ts, 0, content, zlib.crc32(content.encode('utf-8'))).id
+
+
+def _segment_name(seq: int) -> str:
+    return f'segment-{seq:08d}.log'
+
+
+def encode_record(content: str, msg_type: int, ts: float) -> bytes:
+    payload = content.encode('utf-8')
+    return HEADER.pack(len(payload), zlib.crc32(payload), ts, msg_type) + payload
+
+
+def read_records(f) -> Iterator[RawRecord]:
+    """从文件对象中依次读取记录，遇到不完整或校验失败的记录时停止"""
+    while True:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        length, crc, ts, msg_type = HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        yield RawRecord(ts, msg_type, payload.decode('utf-8'), crc)
+
+
+class RawMessageLog:
+    """
+    分段的原始消息日志
+    每条记录带长度前缀、CRC校验、接收时间和消息类型，只追加写入当前段；
+    当前段超过segment_bytes后切换到新段，关闭的段在后台压缩为.gz；
+    index.json记录每段的时间范围和记录数，重放时可以跳过不需要的段
+    """
+
+    def __init__(self, path: str = RAW_LOG_DIR, segment_bytes: int = RAW_LOG_SEGMENT_BYTES,
+                 compress: bool = RAW_LOG_COMPRESS, read_only: bool = False):
+        """
+        Args:
+            path: 日志目录
+            segment_bytes: 单个段的最大字节数
+            compress: 是否压缩已关闭的段
+            read_only: 只读打开，不截断末尾不完整的记录，用于机器人运行时在另一个进程中重放
+        """
+        self.path = path
+        self.read_only = read_only
+        self.segment_bytes = max(HEADER.size + 1, segment_bytes)
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._file = None
+        self._seq = 0
+        self._index: Dict[str, dict] = {}
+        self._compressors: List[threading.Thread] = []
+        # 目录在第一次写入时才创建，只解析不写日志的场景（例如基准测试）不会留下空目录
+        self._load_index()
+
+    def _load_index(self) -> None:
+        try:
+            with open(os.path.join(self.path, INDEX_FILE), 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+        # 以目录中实际存在的段为准，索引缺失的段重新扫描
+        segments = self.segments()
+        names = {self._base_name(name) for name in segments}
+        self._index = {name: entry for name, entry in self._index.items() if name in names}
+        for name in segments:
+            base = self._base_name(name)
+            if base not in self._index or (not name.endswith('.gz') and name == segments[-1]):
+                self._index[base] = self._scan(name)
+        if segments:
+            self._seq = int(_SEGMENT_NAME.match(segments[-1]).group(1))
+
+    @staticmethod
+    def _base_name(name: str) -> str:
+        return name[:-3] if name.endswith('.gz') else name
+
+    def segments(self) -> List[str]:
+        """按顺序列出所有段的文件名"""
+        if not os.path.isdir(self.path):
+            return []
+        names = [name for name in os.listdir(self.path) if _SEGMENT_NAME.match(name)]
+        by_seq = {}
+        for name in names:
+            seq = int(_SEGMENT_NAME.match(name).group(1))
+            # 压缩未完成时同时存在.log和.log.gz，以未压缩的为准
+            if seq not in by_seq or not name.endswith('.gz'):
+                by_seq[seq] = name
+        return [by_seq[seq] for seq in sorted(by_seq)]
+
+    def _open(self, name: str):
+        full = os.path.join(self.path, name)
+        return gzip.open(full, 'rb') if name.endswith('.gz') else open(full, 'rb')
+
+    def _scan(self, name: str) -> dict:
+        """扫描段的记录数和时间范围，未压缩的段会截掉末尾不完整的记录"""
+        entry = {"count": 0, "first_ts": None, "last_ts": None, "bytes": 0}
+        with self._open(name) as f:
+            for record in read_records(f):
+                entry["count"] += 1
+                entry["bytes"] += HEADER.size + len(record.content.encode('utf-8'))
+                if entry["first_ts"] is None:
+                    entry["first_ts"] = record.ts
+                entry["last_ts"] = record.ts
+        if not name.endswith('.gz') and not self.read_only:
+            full = os.path.join(self.path, name)
+            if os.path.getsize(full) > entry["bytes"]:
+                print(f"原始消息日志{name}末尾有不完整的记录，已截断")
+                with open(full, 'r+b') as f:
+                    f.truncate(entry["bytes"])
+        return entry
+
+    def _save_index(self) -> None:
+        tmp = os.path.join(self.path, INDEX_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.path, INDEX_FILE))
+
+    def append(self, content: str, msg_type: int = 49, ts: float = None) -> None:
+        """
+        追加一条消息
+
+        Args:
+            content: 消息内容
+            msg_type: 微信消息类型
+            ts: 接收时间戳，默认为当前时间
+        """
+        if self.read_only:
+            raise RuntimeError("原始消息日志以只读方式打开")
+        ts = time.time() if ts is None else ts
+        record = encode_record(content, msg_type, ts)
+        with self._lock:
+            if self._file is None:
+                self._open_active()
+            name = _segment_name(self._seq)
+            entry = self._index[name]
+            if entry["bytes"] and entry["bytes"] + len(record) > self.segment_bytes:
+                self._rotate()
+                name = _segment_name(self._seq)
+                entry = self._index[name]
+            self._file.write(record)
+            self._file.flush()
+            entry["count"] += 1
+            entry["bytes"] += len(record)
+            if entry["first_ts"] is None:
+                entry["first_ts"] = ts
+            entry["last_ts"] = ts
+
+    def _open_active(self) -> None:
+        """打开最后一个未压缩的段继续写入，没有时新建一段，调用方需持有锁"""
+        os.makedirs(self.path, exist_ok=True)
+        segments = self.segments()
+        name = _segment_name(self._seq)
+        if not self._seq or name not in segments:
+            self._seq += 1
+            name = _segment_name(self._seq)
+            self._index[name] = {"count": 0, "first_ts": None, "last_ts": None, "bytes": 0}
+        self._file = open(os.path.join(self.path, name), 'ab')
+        if self.compress:
+            # 上次退出前没有压缩完的段
+            for closed in segments:
+                if closed != name and not closed.endswith('.gz'):
+                    self._start_compress(closed)
+
+    def _rotate(self) -> None:
+        """关闭当前段并切换到新段，调用方需持有锁"""
+        closed = _segment_name(self._seq)
+        self._file.close()
+        self._seq += 1
+        name = _segment_name(self._seq)
+        self._index[name] = {"count": 0, "first_ts": None, "last_ts": None, "bytes": 0}
+        self._file = open(os.path.join(self.path, name), 'ab')
+        self._save_index()
+        if self.compress:
+            self._start_compress(closed)
+
+    def _start_compress(self, name: str) -> None:
+        thread = threading.Thread(target=self._compress, args=(name,), name="RawLogCompress", daemon=True)
+        thread.start()
+        self._compressors = [t for t in self._compressors if t.is_alive()] + [thread]
+
+    def _compress(self, name: str) -> None:
+        """压缩已关闭的段，先写临时文件再替换，压缩过程中重放仍读取未压缩的段"""
+        full = os.path.join(self.path, name)
+        tmp = full + '.gz.tmp'
+        try:
+            with open(full, 'rb') as src, gzip.open(tmp, 'wb') as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            os.replace(tmp, full + '.gz')
+            os.remove(full)
+        except OSError as e:
+            print(f"压缩原始消息日志{name}失败: {str(e)}")
+
+    def replay(self, since: float = None, until: float = None) -> Iterator[RawRecord]:
+        """
+        按写入顺序逐条读取消息，不会一次加载整个段
+
+        Args:
+            since: 只读取接收时间不早于该时间戳的消息
+            until: 只读取接收时间早于该时间戳的消息
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            index = {name: dict(entry) for name, entry in self._index.items()}
+        for name in self.segments():
+            entry = index.get(self._base_name(name))
+            if entry and entry["count"]:
+                # 根据索引跳过时间范围之外的段
+                if since is not None and entry["last_ts"] < since:
+                    continue
+                if until is not None and entry["first_ts"] >= until:
+                    continue
+            try:
+                f = self._open(name)
+            except FileNotFoundError:
+                # 读取前刚好压缩完成
+                f = self._open(name + '.gz')
+            with f:
+                for record in read_records(f):
+                    if since is not None and record.ts < since:
+                        continue
+                    if until is not None and record.ts >= until:
+                        continue
+                    yield record
+
+    def stats(self) -> Dict[str, int]:
+        """段数、记录数和未压缩的总字节数"""
+        with self._lock:
+            return {
+                "segments": len(self._index),
+                "records": sum(entry["count"] for entry in self._index.values()),
+                "bytes": sum(entry["bytes"] for entry in self._index.values()),
+            }
+
+    def close(self) -> None:
+        """关闭当前段并保存索引，等待后台压缩完成"""
+        if self.read_only:
+            return
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.isdir(self.path):
+                self._save_index()
+            compressors = list(self._compressors)
+        for thread in compressors:
+            thread.join()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+from config import AI_BATCH_SIZE, REPLAY_WORKERS
+from raw_log import RAW_LOG_DIR, RawMessageLog, RawRecord
+
+
+def _chunks(records: Iterable[RawRecord], size: int) -> Iterator[List[RawRecord]]:
+    it = iter(records)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def replay(log: RawMessageLog, parser, since: float = None, until: float = None,
+           workers: int = REPLAY_WORKERS, batch_size: int = AI_BATCH_SIZE, sync_feishu: bool = True) -> dict:
+    """
+    按写入顺序读取原始消息日志，分批交给消息解析器重新入库，多个批次并发解析
+
+    Args:
+        log: 原始消息日志
+        parser: MessageParser
+        since: 只重放接收时间不早于该时间戳的消息
+        until: 只重放接收时间早于该时间戳的消息
+        workers: 并发处理的批数
+        batch_size: 每批的消息数，需要大模型解析的消息每批合并为一次请求
+        sync_feishu: 是否写入飞书表格
+    Returns:
+        dict: 读取的消息数、新写入的交易数和耗时
+    """
+    workers = max(1, workers)
+    started = time.perf_counter()
+    records = saved = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Replay") as executor:
+        futures = deque()
+        for chunk in _chunks(log.replay(since, until), max(1, batch_size)):
+            records += len(chunk)
+            futures.append(executor.submit(parser.replay, chunk, sync_feishu))
+            # 限制在途的批数，日志再大也只占用少量内存
+            while len(futures) >= workers * 2:
+                saved += futures.popleft().result()
+        while futures:
+            saved += futures.popleft().result()
+    return {"records": records, "saved": saved, "elapsed_s": round(time.perf_counter() - started, 3)}
+
+
+def _timestamp(date_str: str) -> float:
+    return datetime.strptime(date_str, '%Y-%m-%d').timestamp()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="重放原始消息日志，重建或补齐账本")
+    arg_parser.add_argument('--path', default=RAW_LOG_DIR, help="原始消息日志目录")
+    arg_parser.add_argument('--since', help="起始日期（含），格式YYYY-MM-DD")
+    arg_parser.add_argument('--until', help="结束日期（不含），格式YYYY-MM-DD")
+    arg_parser.add_argument('--workers', type=int, default=REPLAY_WORKERS, help="并发处理的批数")
+    arg_parser.add_argument('--batch-size', type=int, default=AI_BATCH_SIZE, help="每批的消息数")
+    arg_parser.add_argument('--no-feishu', action='store_true', help="只写入数据库，不写入飞书表格")
+    args = arg_parser.parse_args()
+
+    from app_context import AppContext
+    from db import init_db
+    from message_parser import MessageParser
+
+    init_db()
+    context = AppContext()
+    # 机器人可能正在另一个进程中写入日志，只读打开，不截断末尾的记录
+    raw_log = RawMessageLog(args.path, read_only=True)
+    msg_parser = MessageParser(
+        analyzer=context.analyzer,
+        service=context.transaction_service,
+        feishu_table=context.feishu_table,
+        sheet_writer=context.sheet_writer,
+        raw_log=raw_log
+    )
+    result = replay(
+        raw_log, msg_parser,
+        since=_timestamp(args.since) if args.since else None,
+        until=_timestamp(args.until) if args.until else None,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        sync_feishu=not args.no_feishu,
+    )
+    context.shutdown()
+    print(f"重放完成: 读取{result['records']}条消息，新写入{result['saved']}笔交易，耗时{result['elapsed_s']}秒")
@@ -4,6 +4,8 @@ import logging
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 
+from util.metrics import metrics
+
 
 class BaseTask(ABC):
     """
@@ -78,7 +80,8 @@ class BaseTask(ABC):
             Any: 任务执行结果
         """
         try:
-            result = self.execute(*args, **kwargs)
+            with metrics.timer("job_seconds", "定时任务耗时", task=self.task_id):
+                result = self.execute(*args, **kwargs)
             self.on_success(result)
             return result
         except Exception as e:
@@ -17,11 +17,11 @@ class DailySummaryTask(BaseTask):
 
         
     def execute(self, *args, **kwargs):
-        from message_parser import MessageParser
-        msg_parser = MessageParser()
         """
         执行任务，发送每日汇总信息
         """
+        from app_context import AppContext
+        msg_parser = AppContext().msg_parser
         # 获取前一天的日期
         date = get_date(count=-1, format='%Y%m%d')
         content = f'#汇总@{date}'
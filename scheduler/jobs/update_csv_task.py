@@ -1,16 +1,19 @@
 from typing import Any, Dict
 
-from config import APP_ID, APP_SECRET
-from feishu.table import FeishuTable
 from scheduler.base_task import BaseTask
 
 
 class UpdateCsvTask(BaseTask):
+    """
+    每日重建本地账本快照
+    账本数据以data.db为准，新交易在查询时会增量追加到快照中，
+    这里每天全量重建一次，用于整理快照并纠正修改或删除带来的差异
+    """
 
     def __init__(self):
         super().__init__(
             task_id="update_csv",
-            description="每日更新CSV数据"
+            description="每日重建本地账本快照"
         )
 
     def get_cron_config(self):
@@ -23,6 +26,8 @@ class UpdateCsvTask(BaseTask):
         }
 
     def execute(self, *args, **kwargs):
-        table = FeishuTable(APP_ID, APP_SECRET)
-        table.export_table()
-        return f"已经更新最新的CSV数据"
+        from app_context import AppContext
+        analyzer = AppContext().analyzer
+        analyzer.store.rebuild()
+        analyzer.load_store()
+        return f"已经重建本地账本快照，共{len(analyzer.store)}条交易"
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List
+
+from config import WX_SEND_RATE, WX_SEND_BURST, WX_SEND_QUEUE_SIZE, WX_SEND_RETRY, WX_SEND_RETRY_BACKOFF
+from util.metrics import metrics
+from util.stats import StageStats
+
+_STOP = object()
+
+
+def pack_lines(blocks: Iterable[str], max_bytes: int, separator: str = "\n") -> List[str]:
+    """
+    把多段文本按UTF-8字节数合并为尽量少的消息，每条消息不超过max_bytes
+
+    Args:
+        blocks: 文本段，例如每笔交易格式化后的内容
+        max_bytes: 单条消息的最大字节数
+        separator: 文本段之间的分隔符
+    Returns:
+        List[str]: 合并后的消息，超长的单段会按字符切分
+    """
+    messages = []
+    current: List[str] = []
+    size = 0
+    sep_size = len(separator.encode("utf-8"))
+    for block in blocks:
+        block_size = len(block.encode("utf-8"))
+        if block_size > max_bytes:
+            if current:
+                messages.append(separator.join(current))
+                current, size = [], 0
+            messages.extend(_split_block(block, max_bytes))
+            continue
+        extra = block_size + (sep_size if current else 0)
+        if current and size + extra > max_bytes:
+            messages.append(separator.join(current))
+            current, size, extra = [], 0, block_size
+        current.append(block)
+        size += extra
+    if current:
+        messages.append(separator.join(current))
+    return messages
+
+
+def _split_block(block: str, max_bytes: int) -> List[str]:
+    """按字符切分超长文本，不会切断多字节字符"""
+    parts, current, size = [], [], 0
+    for char in block:
+        char_size = len(char.encode("utf-8"))
+        if current and size + char_size > max_bytes:
+            parts.append("".join(current))
+            current, size = [], 0
+        current.append(char)
+        size += char_size
+    if current:
+        parts.append("".join(current))
+    return parts
+
+
+class TokenBucket:
+    """令牌桶限流，每秒补充rate个令牌，最多积累burst个"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        取一个令牌
+
+        Returns:
+            float: 还需要等待的秒数，为0时表示已经取到令牌
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class OutboundQueue:
+    """
+    微信发送队列
+    调用方只负责入队并立即返回，由单独的发送线程按令牌桶限速、按入队顺序发送，
+    发送失败时由发送线程退避重试，最终结果通过Future和统计信息反馈
+    """
+
+    def __init__(self,
+                 send_func: Callable[[str, str], bool],
+                 rate: float = WX_SEND_RATE,
+                 burst: int = WX_SEND_BURST,
+                 queue_size: int = WX_SEND_QUEUE_SIZE,
+                 max_attempts: int = WX_SEND_RETRY,
+                 retry_backoff: float = WX_SEND_RETRY_BACKOFF,
+                 name: str = "WxSender"):
+        """
+        Args:
+            send_func: 实际发送的函数，参数为(内容, 接收者)，成功返回True
+            rate: 每秒最多发送的消息数
+            burst: 允许突发发送的消息数
+            queue_size: 队列长度，队列满时新消息直接失败
+            max_attempts: 每条消息默认的最多发送次数
+            retry_backoff: 首次重试的等待秒数，之后每次翻倍
+            name: 发送线程名
+        """
+        self.send_func = send_func
+        self.bucket = TokenBucket(rate, burst)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.name = name
+        self.logger = logging.getLogger(name)
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._latency = StageStats()
+        self._counters = {"queued": 0, "sent": 0, "failed": 0, "retried": 0, "rejected": 0}
+        metrics.register_gauge("queue_depth", self._queue.qsize, "队列中等待处理的数量", queue=name)
+
+    def start(self) -> None:
+        """启动发送线程"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def send(self, content: str, receiver: str, max_attempts: int = None) -> Future:
+        """
+        消息入队，立即返回
+
+        Args:
+            content: 消息内容
+            receiver: 接收者
+            max_attempts: 最多发送次数，不传则使用默认值
+        Returns:
+            Future: 发送完成后结果为True，最终失败或队列已满时为False
+        """
+        future = Future()
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        entry = (time.perf_counter(), content, receiver, max_attempts or self.max_attempts, future)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._incr("rejected")
+            self.logger.error(f"发送队列已满，丢弃消息: {content[:50]}")
+            future.set_result(False)
+            return future
+        self._incr("queued")
+        return future
+
+    def _run(self) -> None:
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            self._deliver(*entry)
+
+    def _deliver(self, enqueued_at: float, content: str, receiver: str, max_attempts: int, future: Future) -> None:
+        backoff = self.retry_backoff
+        for attempt in range(1, max_attempts + 1):
+            wait = self.bucket.reserve()
+            while wait > 0:
+                time.sleep(wait)
+                wait = self.bucket.reserve()
+            started = time.perf_counter()
+            try:
+                ok = bool(self.send_func(content, receiver))
+            except Exception as e:
+                ok = False
+                self.logger.warning(f"发送消息异常: {e}")
+            metrics.observe("send_call_seconds", time.perf_counter() - started, "单次发送调用耗时", queue=self.name)
+            if ok:
+                latency = time.perf_counter() - enqueued_at
+                with self._lock:
+                    self._counters["sent"] += 1
+                    self._latency.record(latency)
+                metrics.observe("send_latency_seconds", latency, "从入队到发送成功的耗时", queue=self.name)
+                metrics.incr("send_total", help="发送结果", queue=self.name, result="sent")
+                future.set_result(True)
+                return
+            if attempt < max_attempts:
+                self._incr("retried")
+                metrics.incr("send_total", help="发送结果", queue=self.name, result="retried")
+                # 关闭时不再等待退避，尽快把剩余消息发完
+                self._stop.wait(backoff)
+                backoff *= 2
+        self._incr("failed")
+        metrics.incr("send_total", help="发送结果", queue=self.name, result="failed")
+        self.logger.error(f"发送消息失败，已尝试{max_attempts}次: {content[:50]}")
+        future.set_result(False)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取发送统计，包括从入队到发送成功的耗时和当前队列深度"""
+        with self._lock:
+            result = dict(self._counters)
+            result["latency"] = self._latency.to_dict()
+        result["queue_depth"] = self._queue.qsize()
+        return result
+
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        停止发送线程，队列中已有的消息会先发送
+
+        Args:
+            timeout: 最多等待的秒数，包括等待队列腾出位置放入停止标记的时间；
+                     超时后仍未发送的消息随守护线程一起丢弃
+        """
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=max(0.0, timeout))
+        except queue.Full:
+            self.logger.warning(f"发送队列已满，未能按时停止，剩余{self._queue.qsize()}条消息")
+            return
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            self.logger.warning(f"发送线程未能在{timeout}秒内结束，剩余{self._queue.qsize()}条消息")
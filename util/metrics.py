@@ -0,0 +1,259 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import METRICS_HOST, METRICS_PORT, METRICS_WINDOW
+
+# 指标名统一加上的前缀
+PREFIX = "finbot_"
+# 耗时直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Histogram:
+    """单个标签组合的直方图：累计分桶计数用于导出，最近window个样本用于计算当前分位数"""
+
+    def __init__(self, buckets: Tuple[float, ...], window: int):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentiles(self, qs=(0.5, 0.95, 0.99)) -> List[float]:
+        ordered = sorted(self.recent)
+        if not ordered:
+            return [0.0 for _ in qs]
+        return [ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in qs]
+
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表，支持计数器、耗时直方图和按需读取的仪表（例如队列深度）
+    所有方法都是线程安全的，记录一次指标只需要一次加锁
+    """
+
+    def __init__(self, window: int = METRICS_WINDOW, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.window = max(1, window)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, Callable[[], float]]] = {}
+        self._help: Dict[str, str] = {}
+
+    def incr(self, name: str, value: float = 1, help: str = "", **labels) -> None:
+        """计数器加value"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name: str, seconds: float, help: str = "", **labels) -> None:
+        """记录一次耗时（秒）"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets, self.window)
+            histogram.observe(seconds)
+            if help:
+                self._help.setdefault(name, help)
+
+    @contextmanager
+    def timer(self, name: str, help: str = "", **labels) -> Iterator[None]:
+        """
+        计时上下文，退出时记录耗时；抛出异常时同时给{name}_errors_total计数
+
+        示例:
+            with metrics.timer("db_write_seconds", table="transactions"):
+                ...
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.incr(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, help, **labels)
+
+    def timed(self, name: str, help: str = "", **labels) -> Callable:
+        """计时装饰器，用法同timer"""
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, help, **labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def register_gauge(self, name: str, func: Callable[[], float], help: str = "", **labels) -> None:
+        """
+        注册仪表，导出时调用func读取当前值，例如队列深度；名称和标签都相同的仪表会被替换
+
+        Args:
+            name: 指标名
+            func: 返回当前值的函数
+            help: 说明
+            labels: 标签
+        """
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = func
+            if help:
+                self._help.setdefault(name, help)
+
+    def _read_gauges(self) -> Dict[str, Dict[LabelKey, float]]:
+        with self._lock:
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+        result = {}
+        for name, series in gauges.items():
+            for key, func in series.items():
+                try:
+                    value = func()
+                except Exception as e:
+                    print(f"读取指标{name}失败: {str(e)}")
+                    continue
+                if value is not None:
+                    result.setdefault(name, {})[key] = float(value)
+        return result
+
+    def render_prometheus(self) -> str:
+        """导出为Prometheus文本格式"""
+        gauges = self._read_gauges()
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                metric = PREFIX + name
+                lines.append(f"# HELP {metric} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in self._counters[name].items():
+                    lines.append(f"{metric}{_format_labels(key)} {value}")
+            for name in sorted(self._histograms):
+                metric = PREFIX + name
+                lines.append(f"# HELP {metric} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in self._histograms[name].items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{metric}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+            help_text = dict(self._help)
+        for name in sorted(gauges):
+            metric = PREFIX + name
+            lines.append(f"# HELP {metric} {help_text.get(name, name)}")
+            lines.append(f"# TYPE {metric} gauge")
+            for key, value in gauges[name].items():
+                lines.append(f"{metric}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def format_status(self) -> List[str]:
+        """
+        当前状态的文本，用于#状态指令
+
+        Returns:
+            List[str]: 每个指标一行，耗时为最近样本的p50/p95/p99（毫秒）
+        """
+        gauges = self._read_gauges()
+        lines = []
+        with self._lock:
+            for name in sorted(self._histograms):
+                for key, histogram in self._histograms[name].items():
+                    p50, p95, p99 = (round(v * 1000, 1) for v in histogram.percentiles())
+                    lines.append(f"{name}{_format_labels(key)}: n={histogram.count} "
+                                 f"p50={p50}ms p95={p95}ms p99={p99}ms")
+            for name in sorted(self._counters):
+                for key, value in self._counters[name].items():
+                    lines.append(f"{name}{_format_labels(key)}: {value:g}")
+        for name in sorted(gauges):
+            for key, value in gauges[name].items():
+                lines.append(f"{name}{_format_labels(key)}: {value:g}")
+        return lines
+
+    def reset(self) -> None:
+        """清空计数器和直方图，仪表保留"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# 进程内共享的注册表
+metrics = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = metrics
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 抓取请求很频繁，不打印访问日志
+        pass
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT,
+                         registry: MetricsRegistry = metrics) -> Optional[ThreadingHTTPServer]:
+    """
+    在后台线程启动Prometheus文本格式的指标接口，port为0时不启动
+
+    Returns:
+        Optional[ThreadingHTTPServer]: 服务实例，调用shutdown()停止；未启动或端口被占用时返回None
+    """
+    if not port:
+        return None
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        print(f"启动指标接口失败: {str(e)}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="Metrics", daemon=True).start()
+    print(f"指标接口已启动: http://{host}:{port}/metrics")
+    return server
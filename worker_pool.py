@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+from config import WORKER_POOL_SIZE, WORKER_QUEUE_SIZE, WORKER_FULL_POLICY
+from util.metrics import metrics
+from util.stats import StageStats
+
+POLICY_BLOCK = "block"
+POLICY_DROP = "drop"
+POLICY_SPILL = "spill"
+
+_STOP = object()
+
+
+class OrderedWorkerPool:
+    """
+    有界的有序线程池
+    按key把任务分配到固定的处理线程，保证同一个key（发送者/群）的任务按提交顺序执行，
+    不同key之间互不阻塞
+    """
+
+    def __init__(self,
+                 handler: Callable[[Any], None],
+                 size: int = WORKER_POOL_SIZE,
+                 queue_size: int = WORKER_QUEUE_SIZE,
+                 policy: str = WORKER_FULL_POLICY,
+                 spill_handler: Optional[Callable[[Any], None]] = None,
+                 name: str = "Worker"):
+        """
+        Args:
+            handler: 处理单个任务的函数
+            size: 处理线程数
+            queue_size: 每个处理线程的队列长度
+            policy: 队列满时的策略，block/drop/spill
+            spill_handler: policy为spill时接收溢出任务的函数
+            name: 线程名前缀
+        """
+        if policy not in (POLICY_BLOCK, POLICY_DROP, POLICY_SPILL):
+            raise ValueError(f"未知的队列策略: {policy}")
+        if policy == POLICY_SPILL and spill_handler is None:
+            raise ValueError("spill策略需要提供spill_handler")
+        self.handler = handler
+        self.size = max(1, size)
+        self.policy = policy
+        self.spill_handler = spill_handler
+        self.name = name
+        self.logger = logging.getLogger(name)
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(self.size)]
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._queue_wait = StageStats()
+        self._process = StageStats()
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "dropped": 0, "spilled": 0}
+        self._started = False
+        metrics.register_gauge("queue_depth", lambda: sum(q.qsize() for q in self._queues),
+                               "队列中等待处理的数量", queue=name)
+
+    def start(self) -> None:
+        """启动处理线程"""
+        with self._lock:
+            if self._started:
+                return
+            for i, q in enumerate(self._queues):
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", args=(q,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._started = True
+
+    def _lane(self, key: Any) -> queue.Queue:
+        return self._queues[zlib.crc32(str(key).encode("utf-8")) % self.size]
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def submit(self, key: Any, item: Any) -> bool:
+        """
+        提交任务
+
+        Args:
+            key: 排序键，相同key的任务按顺序执行
+            item: 任务参数，会原样传给handler
+        Returns:
+            bool: 是否进入了处理队列，被丢弃或溢出时返回False
+        """
+        if not self._started:
+            self.start()
+        lane = self._lane(key)
+        entry = (time.perf_counter(), item)
+        if self.policy == POLICY_BLOCK:
+            lane.put(entry)
+            self._incr("submitted")
+            return True
+        try:
+            lane.put_nowait(entry)
+            self._incr("submitted")
+            return True
+        except queue.Full:
+            pass
+        if self.policy == POLICY_DROP:
+            self._incr("dropped")
+            self.logger.warning(f"队列已满，丢弃消息: {key}")
+            return False
+        self._incr("spilled")
+        try:
+            self.spill_handler(item)
+        except Exception as e:
+            self.logger.error(f"写入溢出消息失败: {e}")
+        return False
+
+    def _work(self, q: queue.Queue) -> None:
+        while True:
+            entry = q.get()
+            if entry is _STOP:
+                break
+            enqueued_at, item = entry
+            started_at = time.perf_counter()
+            failed = False
+            try:
+                self.handler(item)
+            except Exception as e:
+                failed = True
+                self.logger.error(f"处理消息失败: {e}")
+            finished_at = time.perf_counter()
+            with self._lock:
+                self._queue_wait.record(started_at - enqueued_at)
+                self._process.record(finished_at - started_at)
+                self._counters["failed" if failed else "completed"] += 1
+            metrics.observe("queue_wait_seconds", started_at - enqueued_at, "任务在队列中的等待耗时", queue=self.name)
+            metrics.observe("process_seconds", finished_at - started_at, "任务处理耗时", queue=self.name)
+            if failed:
+                metrics.incr("process_errors_total", help="任务处理失败次数", queue=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取线程池统计信息，包括各阶段耗时和当前队列深度"""
+        with self._lock:
+            result = dict(self._counters)
+            result["queue_wait"] = self._queue_wait.to_dict()
+            result["process"] = self._process.to_dict()
+        result["policy"] = self.policy
+        result["queue_depth"] = [q.qsize() for q in self._queues]
+        return result
+
+    def shutdown(self, wait: bool = True, timeout: float = 5.0) -> None:
+        """
+        停止处理线程，已入队的任务会先处理完
+
+        Args:
+            wait: 是否等待处理线程退出
+            timeout: 最多等待的秒数，包括等待队列腾出位置放入停止标记的时间；
+                     超时后仍未停止的线程是守护线程，会随进程退出
+        """
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+            threads, self._threads = self._threads, []
+        deadline = time.monotonic() + timeout
+        for i, q in enumerate(self._queues):
+            try:
+                if wait:
+                    q.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+                else:
+                    q.put_nowait(_STOP)
+            except queue.Full:
+                self.logger.warning(f"{self.name}-{i}的队列已满，未能按时停止，剩余{q.qsize()}条任务")
+        if wait:
+            for thread in threads:
+                thread.join(max(0.0, deadline - time.monotonic()))
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+class WxTransport(ABC):
+    """微信收发消息的传输层，FinBot只通过这些方法与微信客户端交互"""
+
+    @abstractmethod
+    def get_self_wxid(self) -> str:
+        pass
+
+    @abstractmethod
+    def enable_receiving_msg(self) -> bool:
+        """开始接收消息"""
+        pass
+
+    @abstractmethod
+    def is_receiving_msg(self) -> bool:
+        pass
+
+    @abstractmethod
+    def get_msg(self, block: bool = True) -> Any:
+        """
+        取一条消息，没有消息时抛出queue.Empty
+
+        Returns:
+            与wcferry.WxMsg属性一致的消息对象
+        """
+        pass
+
+    @abstractmethod
+    def send_text(self, msg: str, receiver: str, aters: str = "") -> int:
+        """发送文本消息，成功返回0"""
+        pass
+
+    @abstractmethod
+    def query_sql(self, db: str, sql: str) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    def cleanup(self) -> None:
+        pass
+
+
+class WcfTransport(WxTransport):
+    """通过wcferry连接Windows微信客户端"""
+
+    def __init__(self, debug: bool = True):
+        from wcferry import Wcf
+        self.wcf = Wcf(debug=debug)
+
+    def get_self_wxid(self) -> str:
+        return self.wcf.get_self_wxid()
+
+    def enable_receiving_msg(self) -> bool:
+        return self.wcf.enable_receiving_msg()
+
+    def is_receiving_msg(self) -> bool:
+        return self.wcf.is_receiving_msg()
+
+    def get_msg(self, block: bool = True) -> Any:
+        return self.wcf.get_msg(block)
+
+    def send_text(self, msg: str, receiver: str, aters: str = "") -> int:
+        return self.wcf.send_text(msg, receiver, aters)
+
+    def query_sql(self, db: str, sql: str) -> List[Dict]:
+        return self.wcf.query_sql(db, sql)
+
+    def cleanup(self) -> None:
+        self.wcf.cleanup()
+
+
+@dataclass
+class SimMsg:
+    """模拟的微信消息，属性与wcferry.WxMsg一致"""
+    type: int
+    content: str
+    sender: str
+    roomid: str = ""
+    id: int = 0
+    ts: int = 0
+    xml: str = ""
+    # 消息进入接收队列的时间（perf_counter），用于统计端到端延迟
+    delivered_at: float = field(default=0.0, compare=False)
+
+    def from_self(self) -> bool:
+        return False
+
+    def from_group(self) -> bool:
+        return bool(self.roomid)
+
+
+class SimulatedTransport(WxTransport):
+    """
+    进程内的模拟传输层，用于在没有微信客户端的机器上压测消息处理链路
+    按设定的速率把消息放入接收队列，发送的消息只记录不外发
+    """
+
+    def __init__(self, messages: Iterable[SimMsg] = (), rate: float = 0, wxid: str = "wxid_sim",
+                 send_latency: float = 0, send_fail_rate: float = 0, contacts: Dict[str, str] = None):
+        """
+        Args:
+            messages: 待投递的消息，开始接收后依次投递
+            rate: 每秒投递的消息数，为0时不限速
+            wxid: 机器人自己的微信ID
+            send_latency: 每次发送消息的模拟耗时（秒）
+            send_fail_rate: 发送失败的比例，按发送次序均匀分布
+            contacts: query_sql查询联系人时返回的{wxid: 昵称}
+        """
+        self.messages = list(messages)
+        self.rate = rate
+        self.wxid = wxid
+        self.send_latency = send_latency
+        self.send_fail_rate = send_fail_rate
+        self.contacts = contacts or {}
+        self.sent: List[Tuple[str, str]] = []
+        self._inbox: queue.Queue = queue.Queue()
+        self._receiving = threading.Event()
+        self._delivered = threading.Event()
+        self._lock = threading.Lock()
+        self._send_count = count(1)
+        self._thread = None
+
+    @classmethod
+    def from_raw_log(cls, records: Iterable, sender: str = "gh_sim_bank", **kwargs) -> "SimulatedTransport":
+        """
+        用原始消息日志中录制的消息构造，按录制顺序投递
+
+        Args:
+            records: RawMessageLog.replay()读取的记录
+            sender: 消息的发送者
+        """
+        messages = [SimMsg(type=record.msg_type, content=record.content, sender=sender, id=i, ts=int(record.ts))
+                    for i, record in enumerate(records, 1)]
+        return cls(messages, **kwargs)
+
+    def get_self_wxid(self) -> str:
+        return self.wxid
+
+    def enable_receiving_msg(self) -> bool:
+        if self._receiving.is_set():
+            return True
+        self._receiving.set()
+        self._thread = threading.Thread(target=self._deliver, name="SimDeliver", daemon=True)
+        self._thread.start()
+        return True
+
+    def _deliver(self) -> None:
+        started = time.perf_counter()
+        for i, msg in enumerate(self.messages):
+            if not self._receiving.is_set():
+                break
+            if self.rate > 0:
+                wait = started + i / self.rate - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            msg.delivered_at = time.perf_counter()
+            self._inbox.put(msg)
+        self._delivered.set()
+
+    def wait_delivered(self, timeout: float = None) -> bool:
+        """等待全部消息投递到接收队列"""
+        return self._delivered.wait(timeout)
+
+    def is_receiving_msg(self) -> bool:
+        return self._receiving.is_set()
+
+    def get_msg(self, block: bool = True) -> SimMsg:
+        # 与wcferry一致，阻塞时最多等待1秒，以便接收线程检查是否需要退出
+        return self._inbox.get(timeout=1) if block else self._inbox.get_nowait()
+
+    def pending(self) -> int:
+        """接收队列中尚未取走的消息数"""
+        return self._inbox.qsize()
+
+    def send_text(self, msg: str, receiver: str, aters: str = "") -> int:
+        if self.send_latency:
+            time.sleep(self.send_latency)
+        n = next(self._send_count)
+        if self.send_fail_rate and int(n * self.send_fail_rate) != int((n - 1) * self.send_fail_rate):
+            return -1
+        with self._lock:
+            self.sent.append((receiver, msg))
+        return 0
+
+    def query_sql(self, db: str, sql: str) -> List[Dict]:
+        if "Contact" in sql:
+            return [{"UserName": wxid, "NickName": name} for wxid, name in self.contacts.items()]
+        return []
+
+    def cleanup(self) -> None:
+        self._receiving.clear()